@@ -0,0 +1,74 @@
+"""
+# Atomic replacement of index, cache, state and archive files
+
+A file is written to a temporary file of its own in the same directory and
+then moved into place with os.replace, so readers never see it half written
+and concurrent writers never share a temporary file. The temporary file is
+removed if writing fails.
+
+A write that depends on what was read before it (a read-merge-write) also
+needs exclusive_lock, so that two processes don't each merge into the same
+old file and lose one another's changes.
+"""
+
+import os
+import json
+import fcntl
+import tempfile
+from contextlib import contextmanager
+
+# The process umask, read once (os.umask can only be read by setting it)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+@contextmanager
+def atomic_path(path):
+    """
+    Yields the name of a new, empty temporary file next to path. Once the
+    caller has written it, it replaces path; if the caller raises, it is removed.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(dir=directory, prefix=os.path.basename(path) + ".",
+                                     suffix=".tmp", delete=False) as fid:
+        tmp_path = fid.name
+    try:
+        yield tmp_path
+        # Temporary files are private; give it the permissions open() would have
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_json(path, obj):
+    """
+    Writes obj to path as JSON, replacing the file atomically.
+    """
+    with atomic_path(path) as tmp_path:
+        with open(tmp_path, "w") as fid:
+            json.dump(obj, fid)
+
+
+@contextmanager
+def exclusive_lock(lock_path, blocking=True):
+    """
+    Holds an exclusive flock on lock_path (created if needed) for the duration
+    of the block. The lock file is separate from the files it guards, as those
+    are replaced rather than rewritten. With blocking=False, yields False
+    straight away if another process holds the lock, otherwise True.
+    """
+    with open(lock_path, "a") as fid:
+        try:
+            fcntl.flock(fid, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fid, fcntl.LOCK_UN)
@@ -0,0 +1,81 @@
+"""
+# Growable column buffers for reading a day of samples of unknown length
+
+The generate_netcdf_* functions read samples row by row (or a file at a time)
+into arrays indexed by a running count n. A ColumnBuffer holds those arrays
+as named, typed columns sharing one number of rows, grows all of them
+geometrically when a row beyond the end is reserved, and hands back trimmed
+contiguous copies once reading is done, so memory follows the amount of data
+rather than a fixed worst case.
+"""
+
+import numpy as np
+
+INITIAL_ROWS = 4096
+GROWTH_FACTOR = 2
+
+
+class ColumnBuffer:
+    """
+    Named columns with a shared, growable number of rows.
+
+    Parameters:
+        initial_rows (int): Rows allocated before the first growth.
+    """
+
+    def __init__(self, initial_rows=INITIAL_ROWS):
+        self.capacity = max(1, int(initial_rows))
+        self.names = []
+        self.columns = {}
+        self.fill_values = {}
+        self._arrays = ()
+
+    def add_column(self, name, width=None, dtype=np.float64, fill_value=0):
+        """
+        Adds a column: 1-D if width is None, otherwise 2-D with width values per
+        row, of any dtype (e.g. np.int8 for flags, np.float32 for values).
+        Rows not yet written hold fill_value, which for a 2-D column can also be
+        one value per position in the row.
+
+        Returns:
+            numpy.ndarray: The column's current array.
+        """
+        if name in self.columns:
+            raise ValueError(f"Column {name} already exists")
+        shape = (self.capacity,) if width is None else (self.capacity, width)
+        self.names.append(name)
+        self.columns[name] = np.full(shape, fill_value, dtype=dtype)
+        self.fill_values[name] = fill_value
+        self._arrays = tuple(self.columns[name] for name in self.names)
+        return self.columns[name]
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def reserve(self, rows):
+        """
+        Makes sure every column has at least rows rows, growing them by
+        GROWTH_FACTOR (or to rows, if more) and keeping the values already
+        written. The arrays are replaced when they grow, so use the ones
+        returned rather than any taken before.
+
+        Returns:
+            tuple: The column arrays, in the order they were added.
+        """
+        if rows > self.capacity:
+            capacity = max(int(rows), GROWTH_FACTOR * self.capacity)
+            for name in self.names:
+                old = self.columns[name]
+                new = np.full((capacity,) + old.shape[1:], self.fill_values[name], dtype=old.dtype)
+                new[:self.capacity] = old
+                self.columns[name] = new
+            self.capacity = capacity
+            self._arrays = tuple(self.columns[name] for name in self.names)
+        return self._arrays
+
+    def trimmed(self, n):
+        """
+        Returns contiguous copies of the first n rows of each column, in the
+        order they were added, so the buffer itself can be released.
+        """
+        return tuple(np.array(self.columns[name][0:n]) for name in self.names)
@@ -1,34 +1,52 @@
 #!/usr/bin/env python3
 
 import os
-import xarray as xr
-import numpy as np
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from qc_summary import find_netcdf_files, file_flag_counts
 
-# --- Parse command-line argument for directory ---
-parser = argparse.ArgumentParser(description="Count qc_flag_air_temperature == 3 in NetCDF files")
-parser.add_argument('-d', '--directory', required=True, help="Directory containing NetCDF files")
-args = parser.parse_args()
-
-# --- Scan and process files ---
-total_flagged = 0
-file_count = 0
-
-for root, _, files in os.walk(args.directory):
-    for file in files:
-        if file.endswith('.nc'):
-            path = os.path.join(root, file)
-            try:
-                ds = xr.open_dataset(path)
-                if 'qc_flag_air_temperature' in ds:
-                    count = int((ds['qc_flag_air_temperature'] == 3).sum())
-                    print(f"{file}: {count} flagged samples")
-                    total_flagged += count
-                    file_count += 1
-                else:
-                    print(f"{file}: variable 'qc_flag_air_temperature' not found")
-            except Exception as e:
-                print(f"Failed to process {file}: {e}")
-
-print(f"\nProcessed {file_count} files")
-print(f"Total qc_flag_air_temperature == 3: {total_flagged}")
\ No newline at end of file
+FLAG_PURGE = 3
+
+
+def count_purge_flags(path):
+    """
+    Returns (file, count) of qc_flag_air_temperature == 3 in a file, count being
+    None if the variable isn't there, or (file, error message) if the file can't be read.
+    """
+    rows = file_flag_counts(path, variables=["qc_flag_air_temperature"])
+    if "error" in rows:
+        return os.path.basename(path), rows["error"]
+    if not rows["count"]:
+        return os.path.basename(path), None
+    return os.path.basename(path), sum(count for value, count in zip(rows["flag_value"], rows["count"])
+                                       if value == FLAG_PURGE)
+
+
+def main():
+    # --- Parse command-line argument for directory ---
+    parser = argparse.ArgumentParser(description="Count qc_flag_air_temperature == 3 in NetCDF files")
+    parser.add_argument('-d', '--directory', required=True, help="Directory containing NetCDF files")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="Number of worker processes (default: number of CPUs)")
+    args = parser.parse_args()
+
+    # --- Scan and process files ---
+    total_flagged = 0
+    file_count = 0
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for file, count in executor.map(count_purge_flags, find_netcdf_files(args.directory), chunksize=16):
+            if isinstance(count, str):
+                print(f"Failed to process {count}")
+            elif count is None:
+                print(f"{file}: variable 'qc_flag_air_temperature' not found")
+            else:
+                print(f"{file}: {count} flagged samples")
+                total_flagged += count
+                file_count += 1
+
+    print(f"\nProcessed {file_count} files")
+    print(f"Total qc_flag_air_temperature == 3: {total_flagged}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import os
+import json
+from bisect import bisect_left, bisect_right
+from atomic_write import atomic_write_json
+
+INDEX_SUFFIX = ".dayidx"
+INDEX_VERSION = 1
+HEADER_LINES = 4
+
+_index_cache = {}
+
+
+def day_index_path(dat_file):
+    """
+    Returns the path of the sidecar day index stored next to a cumulative .dat file.
+    """
+    return dat_file + INDEX_SUFFIX
+
+
+def _line_date(line):
+    """
+    Returns the YYYYMMDD date of a TOA5 data line, whose quoted timestamp starts at byte 1.
+    """
+    return line[1:11].decode("ascii", "replace").replace("-", "")
+
+
+def _read_header(fid):
+    """
+    Reads the TOA5 header lines, returning the offset of the first data line and that line.
+    """
+    fid.seek(0)
+    for _ in range(HEADER_LINES):
+        fid.readline()
+    data_start = fid.tell()
+    first_line = fid.readline()
+    return data_start, first_line
+
+
+def _new_index(data_start, first_line):
+    return {
+        "version": INDEX_VERSION,
+        "data_start": data_start,
+        "first_line": first_line.decode("utf-8", "replace"),
+        "size": data_start,
+        "last_date": None,
+        "monotonic": True,
+        "days": {}
+    }
+
+
+def _load_index(dat_file):
+    if dat_file in _index_cache:
+        return _index_cache[dat_file]
+    try:
+        with open(day_index_path(dat_file), "r") as fid:
+            index = json.load(fid)
+    except (OSError, ValueError):
+        return None
+    if index.get("version") != INDEX_VERSION:
+        return None
+    return index
+
+
+def _save_index(dat_file, index):
+    path = day_index_path(dat_file)
+    try:
+        atomic_write_json(path, index)
+    except OSError as e:
+        print(f"WARNING: Could not write day index {path}: {e}")
+
+
+def update_day_index(dat_file):
+    """
+    Brings the day index of a cumulative datalogger file up to date and returns it.
+
+    The index maps each YYYYMMDD date to the byte offset of its first data line.
+    Only bytes appended since the last update are scanned. The index is rebuilt
+    from scratch if the file has been truncated or rewritten (for example when
+    old data are removed to reduce its size).
+    """
+    size = os.path.getsize(dat_file)
+
+    with open(dat_file, "rb") as fid:
+        data_start, first_line = _read_header(fid)
+        index = _load_index(dat_file)
+        if (index is None or size < index["size"] or index["data_start"] != data_start
+                or index["first_line"] != first_line.decode("utf-8", "replace")):
+            index = _new_index(data_start, first_line)
+
+        if size == index["size"]:
+            _index_cache[dat_file] = index
+            return index
+
+        days = index["days"]
+        last_date = index["last_date"]
+        offset = index["size"]
+        fid.seek(offset)
+        for line in fid:
+            if not line.endswith(b"\n"):	# Line still being written, pick it up next time
+                break
+            if line.startswith(b'"'):
+                date = _line_date(line)
+                if date != last_date:
+                    if last_date is not None and date < last_date:
+                        index["monotonic"] = False
+                    if date not in days:
+                        days[date] = offset
+                    last_date = date
+            offset += len(line)
+
+    index["size"] = offset
+    index["last_date"] = last_date
+    _index_cache[dat_file] = index
+    _save_index(dat_file, index)
+    return index
+
+
+def read_day_lines(dat_file, first_date, last_date):
+    """
+    Reads the header and the data lines dated first_date to last_date (YYYYMMDD, inclusive)
+    from a cumulative datalogger file, plus the line that follows them, which is the
+    midnight record closing last_date.
+
+    Returns (header_lines, data_lines), or None if the file is not in time order
+    and has to be scanned in full.
+    """
+    index = update_day_index(dat_file)
+    if not index["monotonic"]:
+        print(f"WARNING: {dat_file} is not in time order, day index not used")
+        return None
+
+    dates = sorted(index["days"])
+    offsets = [index["days"][date] for date in dates]
+    start_pos = bisect_left(dates, first_date)
+    end_pos = bisect_right(dates, last_date)
+    start = offsets[start_pos] if start_pos < len(offsets) else index["size"]
+    end = offsets[end_pos] if end_pos < len(offsets) else index["size"]
+
+    with open(dat_file, "rb") as fid:
+        header = [fid.readline() for _ in range(HEADER_LINES)]
+        fid.seek(start)
+        data = fid.read(end - start)
+        if end < index["size"]:
+            data += fid.readline()
+
+    header_lines = [line.decode("utf-8", "replace").replace("\r\n", "\n") for line in header]
+    data_lines = data.decode("utf-8", "replace").replace("\r\n", "\n").splitlines(keepends=True)
+    return header_lines, data_lines
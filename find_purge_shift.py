@@ -4,6 +4,7 @@ import xarray as xr
 import pandas as pd
 import argparse
 import numpy as np
+from run_length import true_runs
 
 # Define QC flag for purge periods
 FLAG_PURGE = 3
@@ -20,17 +21,8 @@ def get_purge_intervals(nc_file):
         purge_mask = ds["qc_flag_air_temperature"] == FLAG_PURGE
         times = pd.to_datetime(ds["time"].values)
 
-        intervals = []
-        start = None
-        for i, val in enumerate(purge_mask.values):
-            if val and start is None:
-                start = times[i]
-            elif not val and start is not None:
-                end = times[i - 1]
-                intervals.append((start, end))
-                start = None
-        if start is not None:
-            intervals.append((start, times[-1]))
+        starts, ends = true_runs(purge_mask.values)
+        intervals = list(zip(times[starts], times[ends - 1]))
 
         return intervals
 
@@ -3,6 +3,7 @@
 import argparse
 import numpy as np
 from netCDF4 import Dataset
+from qc_flag_writer import qc_flag_variable
 
 # Define QC flag values (consistent with manual_flag_purge_times.py)
 FLAG_GOOD = 1
@@ -21,27 +22,8 @@ def flag_low_temperature(nc_file, temp_threshold=245):
     """
     with Dataset(nc_file, mode="r+") as ds:
         # Ensure QC flags exist for air_temperature and relative_humidity
-        if "qc_flag_air_temperature" not in ds.variables:
-            qc_flag_air_temp = ds.createVariable("qc_flag_air_temperature", "i1", ds.variables["air_temperature"].dimensions)
-            qc_flag_air_temp[:] = FLAG_GOOD
-            qc_flag_air_temp.units = "1"
-            qc_flag_air_temp.long_name = "Data Quality flag: Air Temperature"
-            qc_flag_air_temp.standard_name = "quality_flag"
-            qc_flag_air_temp.flag_values = np.array([0, 1, 2, 3], dtype=np.int8)
-            qc_flag_air_temp.flag_meanings = "not_used good_data bad_data_measurement_suspect bad_data_purge_cycle_value_fixed_as_start_of_purge"
-        else:
-            qc_flag_air_temp = ds.variables["qc_flag_air_temperature"]
-
-        if "qc_flag_relative_humidity" not in ds.variables:
-            qc_flag_rh = ds.createVariable("qc_flag_relative_humidity", "i1", ds.variables["relative_humidity"].dimensions)
-            qc_flag_rh[:] = FLAG_GOOD
-            qc_flag_rh.units = "1"
-            qc_flag_rh.long_name = "Data Quality flag: Relative Humidity"
-            qc_flag_rh.standard_name = "quality_flag"
-            qc_flag_rh.flag_values = np.array([0, 1, 2, 3, 4], dtype=np.int8)
-            qc_flag_rh.flag_meanings = "not_used good_data bad_data_measurement_suspect bad_data_purge_cycle_value_fixed_as_start_of_purge recovery_in_rh_after_purge"
-        else:
-            qc_flag_rh = ds.variables["qc_flag_relative_humidity"]
+        qc_flag_air_temp = qc_flag_variable(ds, "qc_flag_air_temperature")
+        qc_flag_rh = qc_flag_variable(ds, "qc_flag_relative_humidity")
 
         # Identify points where air_temperature is below the threshold
         air_temperature = ds.variables["air_temperature"][:]
@@ -5,19 +5,12 @@ import numpy as np
 import argparse
 from netCDF4 import Dataset
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 from datetime import datetime
-
-# Parse command-line argument
-parser = argparse.ArgumentParser(description='Detect purge cycles in Vaisala HMP155 data and update QC flags in the NetCDF file.')
-parser.add_argument('-f', '--file', required=True, help='Path to CF-compliant NetCDF file')
-parser.add_argument('-p', '--previous_file', required=False, help='Path to the previous day\'s NetCDF file for purge time consistency check')
-parser.add_argument('--corr_file_temperature', type=str, default=None, help='Correction file with BADDATA intervals for air temperature')
-parser.add_argument('--corr_file_rh', type=str, default=None, help='Correction file with BADDATA intervals for relative humidity')
-args = parser.parse_args()
-filename = args.file
-previous_filename = args.previous_file
-corr_file_temperature = args.corr_file_temperature
-corr_file_rh = args.corr_file_rh
+from qc_flag_writer import QC_FLAG_ATTRS, time_order, write_qc_flags
+from purge_drift import load_predicted_windows, read_predicted_windows
+from purge_stream import PurgeStreamDetector, load_detector, save_detector
+from run_length import true_runs, expand_runs, long_runs, runs_to_mask, rolling_std
 
 # Parameters
 window_minutes = 8
@@ -40,10 +33,9 @@ def detect_flat(data, window, threshold):
         xarray.DataArray: A boolean mask indicating flat regions.
     """
     # Apply a rolling standard deviation directly to the raw data
-    rolling_std = data.rolling(time=window, center=True).std()
-    flat_points = (rolling_std < threshold)
+    flat_points = rolling_std(data.values, window) < threshold
 
-    return flat_points
+    return xr.DataArray(flat_points, coords=data.coords, dims=data.dims)
 
 
 def detect_rh_dips(rh_data, time_data, drop_thresh=3.0, recovery_time=360, flat_window=5, flat_threshold=0.1):
@@ -61,30 +53,43 @@ def detect_rh_dips(rh_data, time_data, drop_thresh=3.0, recovery_time=360, flat_
     Returns:
         list of tuples: List of (start, end) indices for detected RH dips.
     """
-    rh = rh_data.values
-    time = pd.to_datetime(time_data.values)
-    dips = []
+    rh = np.asarray(rh_data.values, dtype=np.float64)
+    time_ns = np.asarray(time_data.values).astype('datetime64[ns]').view(np.int64)
+    n = len(rh)
+    if n < 14:
+        return []
 
     # Detect flat regions with a less strict criterion
     flat_mask = detect_flat(rh_data, flat_window, flat_threshold).values
 
-    for i in range(3, len(rh) - 10):
-        # Check if there is a preceding flat region
-        if not np.any(flat_mask[max(0, i - flat_window):i]):
-            continue
-
-        # Detect RH dip
-        max_before = max(rh[i - 3:i])
-        delta_down = max_before - rh[i]
-        if delta_down >= drop_thresh:
-            for j in range(i + 1, min(i + 20, len(rh))):
-                delta_up = rh[j] - rh[i]
-                t_elapsed = (time[j] - time[i]).total_seconds()
-                if delta_up >= delta_down and t_elapsed <= recovery_time:
-                    dips.append((i, j))  # Dip starts at i, not earlier
-                    break
+    # Candidate dip points i, 3 <= i < n - 10
+    i = np.arange(3, n - 10)
+
+    # Check if there is a preceding flat region in flat_mask[max(0, i - flat_window):i]
+    flat_count = np.concatenate(([0], np.cumsum(flat_mask)))
+    preceded_by_flat = flat_count[i] > flat_count[np.maximum(0, i - flat_window)]
+
+    # Detect RH dip: the maximum of the 3 preceding samples, taken the way Python's
+    # max() does it (a later sample only replaces the maximum if it is greater, so NaN
+    # is kept if it comes first and skipped otherwise)
+    before = sliding_window_view(rh, 3)[i - 3]
+    max_before = before[:, 0]
+    for k in (1, 2):
+        max_before = np.where(before[:, k] > max_before, before[:, k], max_before)
+    delta_down = max_before - rh[i]
+    candidates = preceded_by_flat & (delta_down >= drop_thresh)
+    i, delta_down = i[candidates], delta_down[candidates]
+
+    # Look for recovery in the following samples j, i < j < min(i + 20, n)
+    rh_ahead = sliding_window_view(np.concatenate((rh, np.full(19, np.nan))), 20)[i, 1:]
+    time_ahead = sliding_window_view(np.concatenate((time_ns, np.zeros(19, dtype=np.int64))), 20)[i, 1:]
+    recovered = ((rh_ahead - rh[i, None] >= delta_down[:, None]) &
+                 (time_ahead - time_ns[i, None] <= recovery_time * 1e9))
+    found = recovered.any(axis=1)
+    j = i + 1 + np.argmax(recovered, axis=1)
 
-    return dips
+    # Dip starts at i, not earlier
+    return list(zip(i[found].tolist(), j[found].tolist()))
 
 
 def check_purge_consistency(previous_purge_times, current_purge_times):
@@ -117,33 +122,22 @@ def filter_short_events(mask, min_samples):
     Returns:
         xarray.DataArray: A boolean mask with expanded regions.
     """
-    mask_np = mask.values
-    filtered = np.zeros_like(mask_np, dtype=bool)
-
-    start = None
-    for i, val in enumerate(mask_np):
-        if val:
-            if start is None:
-                start = i
-        elif start is not None:
-            if i - start >= min_samples:
-                # Expand the region to ensure it lasts at least min_samples
-                filtered[max(0, start - min_samples):min(len(mask_np), i + min_samples)] = True
-            start = None
-    if start is not None and len(mask_np) - start >= min_samples:
-        filtered[max(0, start - min_samples):] = True
+    n = len(mask)
+    starts, ends = long_runs(*true_runs(mask.values), min_samples)
+    # Expand the regions to ensure they last at least min_samples
+    filtered = runs_to_mask(*expand_runs(starts, ends, min_samples, min_samples, n), n)
 
     return xr.DataArray(filtered, coords=mask.coords, dims=mask.dims)
 
-def set_time_units_to_seconds_since_epoch(nc_file):
+def set_time_units_to_seconds_since_epoch(nc):
     """
-    Reopen the NetCDF file using netCDF4 and set the time units to 'seconds since 1970-01-01 00:00:00'.
+    Set the time units to 'seconds since 1970-01-01 00:00:00' in a NetCDF file
+    already open with netCDF4 in 'r+' mode.
     """
-    with Dataset(nc_file, mode='r+') as ds:
-        if 'time' in ds.variables:
-            time_var = ds.variables['time']
-            time_var.setncattr('units', 'seconds since 1970-01-01 00:00:00')
-            print(f"Updated time units to 'seconds since 1970-01-01 00:00:00' in {nc_file}")
+    if 'time' in nc.variables:
+        time_var = nc.variables['time']
+        time_var.setncattr('units', 'seconds since 1970-01-01 00:00:00')
+        print(f"Updated time units to 'seconds since 1970-01-01 00:00:00' in {nc.filepath()}")
 
 def read_bad_intervals(corr_file):
     bad_intervals = []
@@ -168,191 +162,268 @@ def flag_bad_data_xr(ds, bad_intervals, flag_var):
         qc[mask] = 2
     ds[flag_var].values[:] = qc
 
-# Open the dataset in read/write mode
-with xr.open_dataset(filename, mode='r+') as ds:
-    # Sort by time to ensure proper processing
-    ds = ds.sortby('time')
-
-    # Estimate sampling interval and rolling window size
-    time_diff = np.median(np.diff(ds['time'].values).astype('timedelta64[s]').astype(int))
-    window_size = int((window_minutes * 60) / time_diff)
-    min_duration_samples = int((8 * 60) / time_diff)  # 8 minutes in samples
-
-    # Detect low-variance periods in each variable
-    purge_temp = detect_flat(ds['air_temperature'], window_size, std_threshold_temp)
-    purge_rh = detect_flat(ds['relative_humidity'], window_size, std_threshold_rh)
-    purge_rh = exclude_high_rh(ds['relative_humidity'], purge_rh, max_rh=99.5)
-
-    # Require both signals to be flat
-    combined_purge = purge_temp & purge_rh
-
-    # Identify distinct purge periods
-    purge_periods = []
-    purge_mask = combined_purge.values
-    start = None
-    for i, val in enumerate(purge_mask):
-        if val and start is None:
-            start = i
-        elif not val and start is not None:
-            # Expand the purge region to ensure it lasts at least 8 minutes
-            expanded_start = max(0, start - min_duration_samples // 2)
-            expanded_end = min(len(purge_mask), i + min_duration_samples // 2)
-            purge_periods.append((expanded_start, expanded_end))
-            start = None
-    if start is not None:
-        expanded_start = max(0, start - min_duration_samples // 2)
-        expanded_end = min(len(purge_mask), len(purge_mask))
-        purge_periods.append((expanded_start, expanded_end))
-
-    # Calculate the standard deviation of RH for each purge period
-    purge_periods_with_std = []
-    for start, end in purge_periods:
-        rh_std = ds['relative_humidity'][start:end].std().item()
-        purge_periods_with_std.append((start, end, rh_std))
-
-    # Sort purge periods by RH standard deviation (ascending) and keep the flattest
-    purge_periods_with_std.sort(key=lambda x: x[2])  # Sort by the third element (std)
-
-    # For dates from 2018-03-13 onwards, only keep the single flattest purge period
-    dataset_date = pd.to_datetime(ds['time'].values[0]).date()
-    if dataset_date >= pd.to_datetime("2018-03-13").date():
-        purge_periods = [(start, end) for start, end, _ in purge_periods_with_std[:1]]  # Keep only the flattest period
-    else:
-        # For earlier dates, keep the two flattest purge periods
-        purge_periods = [(start, end) for start, end, _ in purge_periods_with_std[:2]]
-
-    # If only one purge period is found and the date is before 2018-03-13, flag an equivalent period 12 hours earlier or later
-    if len(purge_periods) == 1 and dataset_date < pd.to_datetime("2018-03-13").date():
-        start, end = purge_periods[0]
-        duration = end - start  # Duration of the purge period in samples
-
-        # Determine the start time of the initial purge period
-        purge_start_time = pd.to_datetime(ds['time'].values[start])
-        midday = purge_start_time.replace(hour=12, minute=0, second=0)
-
-        if purge_start_time < midday:
-            # Flag a period 12 hours later
-            later_start = start + int((12 * 60 * 60) / time_diff)  # 12 hours after the start
-            later_end = later_start + duration
-            if later_end <= len(purge_mask):  # Ensure the indices are within bounds
-                purge_periods.append((later_start, later_end))
+def expected_purge_windows(prev_ds, window_size):
+    """
+    Find the purge windows (time of day) in the previous day's data, used to
+    decide which of today's RH dips are flagged.
+
+    Parameters:
+        prev_ds (xarray.Dataset): Previous day's air_temperature and relative_humidity.
+        window_size (int): The rolling window size (in samples) for detecting flat regions.
+
+    Returns:
+        list of tuples: (start, end) of each window as timedeltas since midnight.
+    """
+    windows = []
+    prev_ds = prev_ds.sortby('time')
+    purge_mask_prev = (detect_flat(prev_ds['air_temperature'], window_size, std_threshold_temp) &
+                       exclude_high_rh(prev_ds['relative_humidity'],
+                                       detect_flat(prev_ds['relative_humidity'], window_size, std_threshold_rh),
+                                       max_rh=99.9))
+    times = pd.to_datetime(prev_ds['time'].values)
+    starts, ends = true_runs(purge_mask_prev.values)
+    for start, end in zip(times[starts], times[ends - 1]):
+        t0 = start.replace(hour=0, minute=0, second=0)
+        windows.append((start - t0, end - t0))
+    return windows
+
+def read_day_data(filename):
+    """
+    Read a day's time, air_temperature and relative_humidity into memory, sorted by
+    time, to pass as previous_ds when flagging the next day.
+    """
+    with xr.open_dataset(filename) as ds:
+        return ds[['air_temperature', 'relative_humidity']].sortby('time').load()
+
+def flag_purge_times(filename, previous_filename=None, corr_file_temperature=None, corr_file_rh=None, previous_ds=None,
+                     state_file=None, windows_table=None):
+    """
+    Detect purge cycles in a day's NetCDF file and write the QC flags to it.
+
+    Parameters:
+        filename (str): Path to CF-compliant NetCDF file.
+        previous_filename (str): Previous day's NetCDF file for the purge time consistency check.
+        corr_file_temperature (str): Correction file with BADDATA intervals for air temperature.
+        corr_file_rh (str): Correction file with BADDATA intervals for relative humidity.
+        previous_ds (xarray.Dataset): Previous day's data already in memory, used instead of
+            previous_filename (as returned by this function for the previous day).
+        state_file (str): Streaming purge detector state file (see purge_stream.py). The day is
+            added to the detector and the purge windows it learned for the previous day are used,
+            instead of previous_ds or previous_filename. The file is created if it doesn't exist.
+            If the state has no windows for the previous day (a new state, or one that could
+            not be read or was saved with another window size), previous_ds/previous_filename
+            are used if given. A day not after the last one added is flagged from the windows
+            the state still holds and the state is not changed.
+        windows_table (str or dict): Table of predicted purge windows from purge_drift.py, or
+            the table already loaded with load_predicted_windows (to load it only once when
+            flagging many days). The windows predicted for the day are used instead of those
+            from the previous day.
+
+    Returns:
+        xarray.Dataset: The day's time, air_temperature and relative_humidity, loaded in memory,
+        to pass as previous_ds when flagging the next day.
+    """
+    # Open the file once with netCDF4 in read/write mode, reading it through xarray and
+    # writing only the QC flags back
+    with Dataset(filename, mode='r+') as nc:
+        ds = xr.open_dataset(xr.backends.NetCDF4DataStore(nc))
+
+        # Sort by time to ensure proper processing, unless the file is already in time order
+        order = time_order(ds['time'].values)
+        if order is not None:
+            ds = ds.sortby('time')
+
+        # Keep the day's data in memory for the next day's purge time consistency check
+        day_data = ds[['air_temperature', 'relative_humidity']].load().copy(deep=True)
+
+        # Estimate sampling interval and rolling window size
+        time_diff = np.median(np.diff(ds['time'].values).astype('timedelta64[s]').astype(int))
+        window_size = int((window_minutes * 60) / time_diff)
+        min_duration_samples = int((8 * 60) / time_diff)  # 8 minutes in samples
+
+        # Detect low-variance periods in each variable
+        purge_temp = detect_flat(ds['air_temperature'], window_size, std_threshold_temp)
+        purge_rh = detect_flat(ds['relative_humidity'], window_size, std_threshold_rh)
+        purge_rh = exclude_high_rh(ds['relative_humidity'], purge_rh, max_rh=99.5)
+
+        # Require both signals to be flat
+        combined_purge = purge_temp & purge_rh
+
+        # Identify distinct purge periods, expanded to ensure they last at least 8 minutes
+        purge_mask = combined_purge.values
+        starts, ends = expand_runs(*true_runs(purge_mask), min_duration_samples // 2,
+                                   min_duration_samples // 2, len(purge_mask))
+        purge_periods = list(zip(starts.tolist(), ends.tolist()))
+
+        # Calculate the standard deviation of RH for each purge period
+        purge_periods_with_std = []
+        for start, end in purge_periods:
+            rh_std = ds['relative_humidity'][start:end].std().item()
+            purge_periods_with_std.append((start, end, rh_std))
+
+        # Sort purge periods by RH standard deviation (ascending) and keep the flattest
+        purge_periods_with_std.sort(key=lambda x: x[2])  # Sort by the third element (std)
+
+        # For dates from 2018-03-13 onwards, only keep the single flattest purge period
+        dataset_date = pd.to_datetime(ds['time'].values[0]).date()
+        if dataset_date >= pd.to_datetime("2018-03-13").date():
+            purge_periods = [(start, end) for start, end, _ in purge_periods_with_std[:1]]  # Keep only the flattest period
         else:
-            # Flag a period 12 hours earlier
-            earlier_start = start - int((12 * 60 * 60) / time_diff)  # 12 hours before the start
-            earlier_end = earlier_start + duration
-            if earlier_start >= 0:  # Ensure the indices are within bounds
-                purge_periods.append((earlier_start, earlier_end))
-
-    # Initialize QC flags as 1 (good_data)
-    qc_temp = xr.full_like(ds['air_temperature'], fill_value=flag_good, dtype=np.int8)
-    qc_rh = xr.full_like(ds['relative_humidity'], fill_value=flag_good, dtype=np.int8)
-
-    # Apply purge flag (3) for each purge period
-    for start, end in purge_periods:
-        qc_temp[start:end] = flag_purge
-        qc_rh[start:end] = flag_purge
-
-        # Flag 6 minutes after each purge period as 4
-        recovery_start = end
-        recovery_end = min(len(qc_rh), end + int((6 * 60) / time_diff))  # 6 minutes in samples
-        qc_rh[recovery_start:recovery_end] = flag_rh_dip  # Use flag 4 for RH recovery
-
-    # Detect RH dips with a preceding flat region
-    dip_intervals = detect_rh_dips(
-        ds['relative_humidity'], 
-        ds['time'], 
-        drop_thresh=3.0, 
-        recovery_time=360, 
-        flat_window=5, 
-        flat_threshold=0.1
-    )
-
-   # --- Flag RH dips only during expected purge windows (from previous day) ---
-    buffer_samples = int((8 * 60) / time_diff)  # 8 minutes in samples
-    dip_time = pd.to_datetime(ds['time'].values)
-
-    expected_purge_windows = []
-    if previous_filename:
-        with xr.open_dataset(previous_filename, mode='r') as prev_ds:
-            prev_ds = prev_ds.sortby('time')
-            purge_mask_prev = (detect_flat(prev_ds['air_temperature'], window_size, std_threshold_temp) &
-                               exclude_high_rh(prev_ds['relative_humidity'],
-                                               detect_flat(prev_ds['relative_humidity'], window_size, std_threshold_rh),
-                                               max_rh=99.9))
-            times = pd.to_datetime(prev_ds['time'].values)
-            mask_vals = purge_mask_prev.values
-            start = None
-            for i, val in enumerate(mask_vals):
-                if val and start is None:
-                    start = times[i]
-                elif not val and start is not None:
-                    end = times[i - 1]
-                    t0 = pd.Timestamp(start).replace(hour=0, minute=0, second=0)
-                    expected_purge_windows.append((start - t0, end - t0))
-                    start = None
-            if start is not None:
-                end = times[-1]
-                t0 = pd.Timestamp(start).replace(hour=0, minute=0, second=0)
-                expected_purge_windows.append((start - t0, end - t0))
-
-    # Option to enable or disable purge flagging based on 8 minutes preceding an RH dip
-    enable_purge_flagging_before_rh_dip = False  # Set to True to enable this behavior
-
-    # Apply RH dip flags
-    for start, end in dip_intervals:
-        dip_start_time = dip_time[start]
-        seconds_since_midnight = (dip_start_time - dip_start_time.replace(hour=0, minute=0, second=0)).total_seconds()
-
-        allow = True if not expected_purge_windows else False
-        for expected_start, expected_end in expected_purge_windows:
-            if expected_start.total_seconds() - 900 <= seconds_since_midnight <= expected_end.total_seconds() + 900:
-                allow = True
-                break
-
-        if allow:
-            if enable_purge_flagging_before_rh_dip:
-                # Optionally flag the 8 minutes preceding the RH dip as purge
-                purge_start = max(0, start - buffer_samples)
-                purge_end = max(purge_start, start)
-                qc_temp[purge_start:purge_end] = flag_purge
-                qc_rh[purge_start:purge_end] = flag_purge
-
-            # Flag the RH dip itself
-            qc_rh[start + 1:end] = flag_rh_dip  # Skip dip initiation point
-
-    # Assign QC variables
-    ds['qc_flag_air_temperature'] = qc_temp
-    ds['qc_flag_air_temperature'].attrs = {
-        'units': '1',
-        'long_name': 'Data Quality flag: Air Temperature',
-        'standard_name': 'quality_flag',
-        'flag_values': np.array([0, 1, 2, 3], dtype=np.int8),
-        'flag_meanings': 'not_used good_data bad_data_measurement_suspect bad_data_purge_cycle_value_fixed_as_start_of_purge'
-    }
-
-    ds['qc_flag_relative_humidity'] = qc_rh
-    ds['qc_flag_relative_humidity'].attrs = {
-        'units': '1',
-        'long_name': 'Data Quality flag: Relative Humidity',
-        'standard_name': 'quality_flag',
-        'flag_values': np.array([0, 1, 2, 3, 4], dtype=np.int8),
-        'flag_meanings': 'not_used good_data bad_data_measurement_suspect bad_data_purge_cycle_value_fixed_as_start_of_purge recovery_in_rh_after_purge'
-    }
-
-    # --- Flag bad data intervals from correction files ---
-    if corr_file_temperature:
-        bad_intervals_temp = read_bad_intervals(corr_file_temperature)
-        print(f"Flagging bad data intervals for air temperature from {corr_file_temperature}")
-        flag_bad_data_xr(ds, bad_intervals_temp, "qc_flag_air_temperature")
-
-    if corr_file_rh:
-        bad_intervals_rh = read_bad_intervals(corr_file_rh)
-        print(f"Flagging bad data intervals for relative humidity from {corr_file_rh}")
-        flag_bad_data_xr(ds, bad_intervals_rh, "qc_flag_relative_humidity")
-
-    # Save changes to the file
-    ds.to_netcdf(filename, mode='a')  # Append mode ensures updates are written
-    print(f"QC flags successfully added to {filename}.")
-
-# Reopen the file with netCDF4 and set the time units
-set_time_units_to_seconds_since_epoch(filename)
\ No newline at end of file
+            # For earlier dates, keep the two flattest purge periods
+            purge_periods = [(start, end) for start, end, _ in purge_periods_with_std[:2]]
+
+        # If only one purge period is found and the date is before 2018-03-13, flag an equivalent period 12 hours earlier or later
+        if len(purge_periods) == 1 and dataset_date < pd.to_datetime("2018-03-13").date():
+            start, end = purge_periods[0]
+            duration = end - start  # Duration of the purge period in samples
+
+            # Determine the start time of the initial purge period
+            purge_start_time = pd.to_datetime(ds['time'].values[start])
+            midday = purge_start_time.replace(hour=12, minute=0, second=0)
+
+            if purge_start_time < midday:
+                # Flag a period 12 hours later
+                later_start = start + int((12 * 60 * 60) / time_diff)  # 12 hours after the start
+                later_end = later_start + duration
+                if later_end <= len(purge_mask):  # Ensure the indices are within bounds
+                    purge_periods.append((later_start, later_end))
+            else:
+                # Flag a period 12 hours earlier
+                earlier_start = start - int((12 * 60 * 60) / time_diff)  # 12 hours before the start
+                earlier_end = earlier_start + duration
+                if earlier_start >= 0:  # Ensure the indices are within bounds
+                    purge_periods.append((earlier_start, earlier_end))
+
+        # Initialize QC flags as 1 (good_data)
+        qc_temp = xr.full_like(ds['air_temperature'], fill_value=flag_good, dtype=np.int8)
+        qc_rh = xr.full_like(ds['relative_humidity'], fill_value=flag_good, dtype=np.int8)
+
+        # Apply purge flag (3) for each purge period
+        for start, end in purge_periods:
+            qc_temp[start:end] = flag_purge
+            qc_rh[start:end] = flag_purge
+
+            # Flag 6 minutes after each purge period as 4
+            recovery_start = end
+            recovery_end = min(len(qc_rh), end + int((6 * 60) / time_diff))  # 6 minutes in samples
+            qc_rh[recovery_start:recovery_end] = flag_rh_dip  # Use flag 4 for RH recovery
+
+        # Detect RH dips with a preceding flat region
+        dip_intervals = detect_rh_dips(
+            ds['relative_humidity'], 
+            ds['time'], 
+            drop_thresh=3.0, 
+            recovery_time=360, 
+            flat_window=5, 
+            flat_threshold=0.1
+        )
+
+       # --- Flag RH dips only during expected purge windows (from previous day) ---
+        buffer_samples = int((8 * 60) / time_diff)  # 8 minutes in samples
+        dip_time = pd.to_datetime(ds['time'].values)
+
+        expected_windows = []
+        detector = None
+        if windows_table is not None:
+            table = load_predicted_windows(windows_table) if isinstance(windows_table, str) else windows_table
+            expected_windows = [(pd.Timedelta(seconds=start), pd.Timedelta(seconds=end))
+                                for start, end in read_predicted_windows(table, dataset_date)]
+        elif state_file:
+            detector = load_detector(state_file, window_size)
+            if detector is None:
+                detector = PurgeStreamDetector(window_size, std_threshold_temp, std_threshold_rh, max_rh=99.9)
+            previous_day = np.datetime64(dataset_date) - np.timedelta64(1, 'D')
+            last_time = detector.last_time()
+            if last_time is not None and ds['time'].values[-1].astype('datetime64[ns]') <= last_time:
+                # The day was already added (the detector skips samples it has seen), so it is
+                # flagged again from the windows the state still holds and the state is left alone
+                print(f"WARNING: {filename} is not after the last time in {state_file} ({last_time}); "
+                      f"the state is not updated")
+                expected_windows = detector.expected_windows(previous_day)
+                detector = None
+                if not expected_windows:
+                    print(f"WARNING: {state_file} has no purge windows for {previous_day}")
+            else:
+                detector.update(ds['time'].values, ds['air_temperature'].values, ds['relative_humidity'].values)
+                expected_windows = detector.expected_windows(previous_day)
+        # A new or unreadable state has learned nothing for the previous day yet, so its data is used
+        if not expected_windows and windows_table is None:
+            if previous_ds is not None:
+                expected_windows = expected_purge_windows(previous_ds, window_size)
+            elif previous_filename:
+                with xr.open_dataset(previous_filename, mode='r') as prev_ds:
+                    expected_windows = expected_purge_windows(prev_ds, window_size)
+
+        # Option to enable or disable purge flagging based on 8 minutes preceding an RH dip
+        enable_purge_flagging_before_rh_dip = False  # Set to True to enable this behavior
+
+        # Apply RH dip flags
+        for start, end in dip_intervals:
+            dip_start_time = dip_time[start]
+            seconds_since_midnight = (dip_start_time - dip_start_time.replace(hour=0, minute=0, second=0)).total_seconds()
+
+            allow = True if not expected_windows else False
+            for expected_start, expected_end in expected_windows:
+                # Compared modulo the day, as a window (or its margin) can run past midnight
+                window_start = expected_start.total_seconds() - 900
+                window_length = expected_end.total_seconds() + 900 - window_start
+                if (seconds_since_midnight - window_start) % 86400 <= window_length:
+                    allow = True
+                    break
+
+            if allow:
+                if enable_purge_flagging_before_rh_dip:
+                    # Optionally flag the 8 minutes preceding the RH dip as purge
+                    purge_start = max(0, start - buffer_samples)
+                    purge_end = max(purge_start, start)
+                    qc_temp[purge_start:purge_end] = flag_purge
+                    qc_rh[purge_start:purge_end] = flag_purge
+
+                # Flag the RH dip itself
+                qc_rh[start + 1:end] = flag_rh_dip  # Skip dip initiation point
+
+        # Assign QC variables
+        ds['qc_flag_air_temperature'] = qc_temp
+        ds['qc_flag_relative_humidity'] = qc_rh
+
+        # --- Flag bad data intervals from correction files ---
+        if corr_file_temperature:
+            bad_intervals_temp = read_bad_intervals(corr_file_temperature)
+            print(f"Flagging bad data intervals for air temperature from {corr_file_temperature}")
+            flag_bad_data_xr(ds, bad_intervals_temp, "qc_flag_air_temperature")
+
+        if corr_file_rh:
+            bad_intervals_rh = read_bad_intervals(corr_file_rh)
+            print(f"Flagging bad data intervals for relative humidity from {corr_file_rh}")
+            flag_bad_data_xr(ds, bad_intervals_rh, "qc_flag_relative_humidity")
+
+        # Write only the QC flag variables back to the file, in the file's time order
+        write_qc_flags(nc, {name: ds[name].values for name in QC_FLAG_ATTRS}, order=order)
+        print(f"QC flags successfully added to {filename}.")
+
+        set_time_units_to_seconds_since_epoch(nc)
+
+    if detector is not None:
+        save_detector(detector, state_file)
+
+    return day_data
+
+
+def main():
+    # Parse command-line argument
+    parser = argparse.ArgumentParser(description='Detect purge cycles in Vaisala HMP155 data and update QC flags in the NetCDF file.')
+    parser.add_argument('-f', '--file', required=True, help='Path to CF-compliant NetCDF file')
+    parser.add_argument('-p', '--previous_file', required=False, help='Path to the previous day\'s NetCDF file for purge time consistency check')
+    parser.add_argument('--corr_file_temperature', type=str, default=None, help='Correction file with BADDATA intervals for air temperature')
+    parser.add_argument('--corr_file_rh', type=str, default=None, help='Correction file with BADDATA intervals for relative humidity')
+    parser.add_argument('--windows', type=str, default=None, help='Table of predicted purge windows from purge_drift.py, used instead of --previous_file')
+    parser.add_argument('-s', '--state_file', type=str, default=None, help='Streaming purge detector state file, carried from day to day instead of --previous_file')
+    args = parser.parse_args()
+
+    flag_purge_times(args.file, previous_filename=args.previous_file,
+                     corr_file_temperature=args.corr_file_temperature, corr_file_rh=args.corr_file_rh,
+                     state_file=args.state_file, windows_table=args.windows)
+
+
+if __name__ == "__main__":
+    main()
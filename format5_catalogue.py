@@ -0,0 +1,202 @@
+"""
+# Catalogue of the format5 files in a raw-data directory
+"""
+
+import os
+import re
+import json
+import argparse
+from datetime import datetime
+from read_format5_header import read_format5_header
+from atomic_write import atomic_write_json
+
+CATALOGUE_VERSION = 1
+CATALOGUE_DIR = os.environ.get("FORMAT5_CATALOGUE_DIR",
+                               os.path.join(os.path.expanduser("~"), ".cache", "format5_catalogue"))
+
+# File names are a prefix, then the date as YYMMDD (e.g. chan240224.000) or YYYYMMDD (e.g. pldc_20240224.000)
+FILE_REGEX = re.compile(r"^([A-Za-z_]+?)(\d{6}|\d{8})\.00\d$")
+
+_catalogues = {}
+
+
+def catalogue_path(path_in):
+    """
+    Returns the path of the catalogue file kept for a raw-data directory.
+    """
+    name = os.path.abspath(path_in).strip(os.sep).replace(os.sep, "_")
+    return os.path.join(CATALOGUE_DIR, name + ".json")
+
+
+def _file_date(digits):
+    """
+    Returns the YYYYMMDD date of a file from the digits in its name.
+    """
+    return digits if len(digits) == 8 else "20" + digits
+
+
+def _load_catalogue(path_in):
+    if path_in in _catalogues:
+        return _catalogues[path_in]
+    try:
+        with open(catalogue_path(path_in), "r") as fid:
+            catalogue = json.load(fid)
+    except (OSError, ValueError):
+        catalogue = None
+    if catalogue is None or catalogue.get("version") != CATALOGUE_VERSION:
+        catalogue = {"version": CATALOGUE_VERSION, "path": os.path.abspath(path_in),
+                     "dir_mtime_ns": None, "names": [], "files": {}}
+    _catalogues[path_in] = catalogue
+    return catalogue
+
+
+def _save_catalogue(path_in, catalogue):
+    path = catalogue_path(path_in)
+    try:
+        os.makedirs(CATALOGUE_DIR, exist_ok=True)
+        atomic_write_json(path, catalogue)
+    except OSError as e:
+        print(f"WARNING: Could not write format5 catalogue {path}: {e}")
+
+
+def _refresh_names(path_in, catalogue):
+    """
+    Re-lists the directory only if it has changed since the catalogue was built.
+    Returns True if the catalogue changed.
+    """
+    dir_mtime_ns = os.stat(path_in).st_mtime_ns
+    if catalogue["dir_mtime_ns"] == dir_mtime_ns:
+        return False
+
+    names = sorted(name for name in os.listdir(path_in) if FILE_REGEX.match(name))
+    catalogue["names"] = names
+    listed = set(names)
+    catalogue["files"] = {name: entry for name, entry in catalogue["files"].items() if name in listed}
+    catalogue["dir_mtime_ns"] = dir_mtime_ns
+    catalogue.pop("_by_date", None)
+    return True
+
+
+def _names_by_date(catalogue):
+    """
+    Groups the file names by (prefix, YYYYMMDD date), kept in memory only.
+    """
+    if "_by_date" not in catalogue:
+        by_date = {}
+        for name in catalogue["names"]:
+            match = FILE_REGEX.match(name)
+            by_date.setdefault((match.group(1), _file_date(match.group(2))), []).append(name)
+        catalogue["_by_date"] = by_date
+    return catalogue["_by_date"]
+
+
+def read_file_entry(path_file):
+    """
+    Reads the catalogue entry of a format5 file from its header: start and end
+    timestamps (ISO strings), number of data rows and channel IDs.
+
+    The year is taken from the date in the file name. The times are None if the
+    header can't be read, in which case the file is never ruled out by time.
+    """
+    stat = os.stat(path_file)
+    entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+             "start": None, "end": None, "rows": None, "chids": None}
+
+    match = FILE_REGEX.match(os.path.basename(path_file))
+    year = int(_file_date(match.group(2))[0:4])
+    try:
+        header = read_format5_header(path_file)
+    except (OSError, ValueError, IndexError, ZeroDivisionError, UnicodeDecodeError) as e:
+        print(f"WARNING: Could not read format5 header of {path_file}: {e}")
+        return entry
+
+    entry["rows"] = header.get("data_rows")
+    entry["chids"] = header.get("chids")
+    if header.get("start_ts") is not None and header.get("finish_ts") is not None:
+        try:
+            start = header["start_ts"].replace(year=year)
+            end = header["finish_ts"].replace(year=year)
+        except ValueError:	# 29 February in the wrong year
+            return entry
+        if end < start:	# The file runs over the end of the year
+            end = end.replace(year=year + 1)
+        entry["start"] = start.isoformat()
+        entry["end"] = end.isoformat()
+    return entry
+
+
+def find_format5_files(path_in, prefix, datestring, start=None, end=None):
+    """
+    Returns the sorted names of the files prefix + date + '.00[0-9]' in path_in
+    for the YYYYMMDD datestring.
+
+    If start and end (datetimes or datetime64) are given, only files whose time
+    range overlaps start < time <= end are returned, so files that can't hold
+    data for the window aren't opened.
+
+    The directory is only listed again when it has changed, and only the headers
+    of the day's files are read (again only when they have changed).
+    """
+    if not os.access(path_in, os.F_OK):
+        return []
+
+    catalogue = _load_catalogue(path_in)
+    changed = _refresh_names(path_in, catalogue)
+
+    names = []
+    for name in _names_by_date(catalogue).get((prefix, datestring), []):
+        entry = catalogue["files"].get(name)
+        if start is not None or end is not None:
+            stat = os.stat(os.path.join(path_in, name))
+            if entry is None or entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+                entry = read_file_entry(os.path.join(path_in, name))
+                catalogue["files"][name] = entry
+                changed = True
+            if entry["start"] is not None:
+                if start is not None and datetime.fromisoformat(entry["end"]) <= _as_datetime(start):
+                    continue
+                if end is not None and datetime.fromisoformat(entry["start"]) > _as_datetime(end):
+                    continue
+        names.append(name)
+
+    if changed:
+        _save_catalogue(path_in, {key: value for key, value in catalogue.items() if not key.startswith("_")})
+    return names
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def scan_format5_directory(path_in, prefixes=None):
+    """
+    Builds (or brings up to date) the whole catalogue of a raw-data directory,
+    reading the header of every format5 file that is new or has changed.
+    Returns a list of (file, start, end, rows, chids).
+    """
+    catalogue = _load_catalogue(path_in)
+    _refresh_names(path_in, catalogue)
+
+    for name in catalogue["names"]:
+        if prefixes is not None and FILE_REGEX.match(name).group(1) not in prefixes:
+            continue
+        stat = os.stat(os.path.join(path_in, name))
+        entry = catalogue["files"].get(name)
+        if entry is None or entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+            catalogue["files"][name] = read_file_entry(os.path.join(path_in, name))
+
+    _save_catalogue(path_in, {key: value for key, value in catalogue.items() if not key.startswith("_")})
+    return [(name, entry["start"], entry["end"], entry["rows"], entry["chids"])
+            for name, entry in sorted(catalogue["files"].items())]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the catalogue of the format5 files in a raw-data directory.")
+    parser.add_argument("path_in", help="Raw-data directory")
+    parser.add_argument("prefixes", nargs="*", help="Only catalogue files with these prefixes, e.g. chan chpy")
+    args = parser.parse_args()
+
+    entries = scan_format5_directory(args.path_in, args.prefixes or None)
+    print(f"{len(entries)} files catalogued in {catalogue_path(args.path_in)}")
@@ -142,6 +142,11 @@ for nday in range(startnum,endnum+1):
     print('Date being generated = ',datevals[3])
     print('\n')
 
+    #For the CR1000X loggers read the cumulative file once per block of days
+    #(a month at a time to limit memory use), rather than once per day
+    if sensor in (2, 5, 9) and endnum > startnum and (nday - startnum) % 31 == 0:
+        metsensors_ncas.split_cr1000x_general(nday, min(nday + 30, endnum), num_today, sensor)
+
     if sensor == 1:
         metsensors_ncas.generate_netcdf_pluvio(nday)
     elif sensor == 2:
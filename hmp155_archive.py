@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+"""
+# Consolidate daily HMP155 NetCDF files into a Parquet archive partitioned by year and month
+
+The archive holds time, air_temperature, relative_humidity and both QC flags in
+one Parquet file per month, laid out as ARCHIVE/year=YYYY/month=MM/data.parquet
+so it can be read with polars (or pyarrow/pandas) as one hive-partitioned
+dataset. Files are added incrementally: a manifest records which daily files
+have been exported, and only new or changed files are read on later runs. An
+export holds a lock on the archive from reading the manifest to writing it, so
+exports running at the same time take turns instead of losing each other's rows.
+"""
+
+import os
+import json
+import argparse
+from collections import defaultdict
+import numpy as np
+import polars as pl
+from netCDF4 import Dataset
+from qc_summary import find_netcdf_files, netcdf_times, FILL_FLAG
+from atomic_write import atomic_path, atomic_write_json, exclusive_lock
+
+MANIFEST_NAME = "manifest.json"
+LOCK_NAME = ".lock"
+MANIFEST_VERSION = 1
+DATA_VARIABLES = ["air_temperature", "relative_humidity"]
+QC_FLAG_VARIABLES = ["qc_flag_air_temperature", "qc_flag_relative_humidity"]
+
+SCHEMA = {
+    "time": pl.Datetime("us"),
+    "air_temperature": pl.Float64,
+    "relative_humidity": pl.Float64,
+    "qc_flag_air_temperature": pl.Int8,
+    "qc_flag_relative_humidity": pl.Int8,
+}
+
+
+def partition_path(archive_dir, year, month):
+    """
+    Returns the path of the Parquet file of a year/month partition.
+    """
+    return os.path.join(archive_dir, f"year={year:04d}", f"month={month:02d}", "data.parquet")
+
+
+def load_manifest(archive_dir):
+    try:
+        with open(os.path.join(archive_dir, MANIFEST_NAME), "r") as fid:
+            manifest = json.load(fid)
+    except (OSError, ValueError):
+        manifest = None
+    if manifest is None or manifest.get("version") != MANIFEST_VERSION:
+        manifest = {"version": MANIFEST_VERSION, "files": {}}
+    return manifest
+
+
+def save_manifest(archive_dir, manifest):
+    atomic_write_json(os.path.join(archive_dir, MANIFEST_NAME), manifest)
+
+
+def read_daily_file(path):
+    """
+    Reads the archived variables of a daily NetCDF file with netCDF4. Missing
+    QC flags are left as FILL_FLAG and missing data values as NaN.
+    """
+    with Dataset(path, mode="r") as nc:
+        times = netcdf_times(nc.variables["time"])
+        columns = {"time": times}
+        for name in DATA_VARIABLES:
+            if name in nc.variables:
+                columns[name] = np.ma.filled(nc.variables[name][:].astype(np.float64), np.nan)
+            else:
+                columns[name] = np.full(len(times), np.nan)
+        for name in QC_FLAG_VARIABLES:
+            if name in nc.variables:
+                columns[name] = np.ma.filled(nc.variables[name][:], FILL_FLAG).astype(np.int8)
+            else:
+                columns[name] = np.full(len(times), FILL_FLAG, dtype=np.int8)
+    return pl.DataFrame(columns, schema=SCHEMA)
+
+
+def write_partition(path, new_rows):
+    """
+    Merges rows into a partition file. Rows already in the partition within the
+    time range of each new file are replaced, so exporting a file again (e.g.
+    after it has been re-flagged) doesn't duplicate it.
+    """
+    parts = []
+    if os.path.isfile(path):
+        existing = pl.read_parquet(path)
+        for first, last in new_rows.group_by("source").agg(pl.col("time").min().alias("first"),
+                                                            pl.col("time").max().alias("last")).select("first", "last").rows():
+            existing = existing.filter((pl.col("time") < first) | (pl.col("time") > last))
+        parts.append(existing)
+    parts.append(new_rows.drop("source"))
+
+    # The newest row of each time is the last one, so de-duplicate before sorting
+    merged = pl.concat(parts).unique(subset="time", keep="last", maintain_order=True).sort("time")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_path(path) as tmp_path:
+        merged.write_parquet(tmp_path, statistics=True)
+
+
+def export_files(paths, archive_dir):
+    """
+    Adds daily NetCDF files to the archive, skipping files that have been
+    exported before and not changed since. Each partition touched is written
+    once. Returns the number of files exported.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    with exclusive_lock(os.path.join(archive_dir, LOCK_NAME)):
+        return _export_files(paths, archive_dir)
+
+
+def _export_files(paths, archive_dir):
+    manifest = load_manifest(archive_dir)
+
+    partitions = defaultdict(list)
+    exported = []
+    for path in paths:
+        key = os.path.abspath(path)
+        stat = os.stat(path)
+        stamp = [stat.st_mtime_ns, stat.st_size]
+        if manifest["files"].get(key) == stamp:
+            continue
+        try:
+            df = read_daily_file(path)
+        except Exception as e:
+            print(f"WARNING: Failed to read {path}: {e}")
+            continue
+
+        # A daily file's midnight row can fall in the next month
+        df = df.with_columns(pl.col("time").dt.year().alias("year"), pl.col("time").dt.month().alias("month"),
+                             pl.lit(key).alias("source"))
+        for (year, month), rows in df.partition_by(["year", "month"], as_dict=True).items():
+            partitions[(year, month)].append(rows.drop("year", "month"))
+        exported.append((key, stamp))
+
+    for (year, month), frames in sorted(partitions.items()):
+        write_partition(partition_path(archive_dir, year, month), pl.concat(frames))
+
+    for key, stamp in exported:
+        manifest["files"][key] = stamp
+    save_manifest(archive_dir, manifest)
+    return len(exported)
+
+
+def read_archive(archive_dir, start=None, end=None, columns=None):
+    """
+    Reads rows with start <= time < end (datetimes, either optional) from the
+    archive. Only the partitions and row groups in the range are read.
+
+    Returns:
+        polars.DataFrame: time and the requested columns (default: all), in time order.
+    """
+    lf = pl.scan_parquet(os.path.join(archive_dir, "year=*", "month=*", "data.parquet"),
+                         hive_partitioning=True)
+    if start is not None:
+        lf = lf.filter(pl.col("year") >= start.year, pl.col("time") >= start)
+    if end is not None:
+        lf = lf.filter(pl.col("year") <= end.year, pl.col("time") < end)
+    lf = lf.select(["time"] + (columns if columns is not None else list(SCHEMA)[1:]))
+    return lf.sort("time").collect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add daily HMP155 NetCDF files to a Parquet archive partitioned by year and month.")
+    parser.add_argument("-d", "--directory", required=True, help="Directory containing the daily NetCDF files (searched recursively)")
+    parser.add_argument("-a", "--archive", required=True, help="Archive directory")
+    args = parser.parse_args()
+
+    n = export_files(find_netcdf_files(args.directory), args.archive)
+    print(f"Exported {n} new or changed files to {args.archive}")
+
+
+if __name__ == "__main__":
+    main()
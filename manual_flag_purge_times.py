@@ -5,6 +5,9 @@ import numpy as np
 import argparse
 import pandas as pd
 from netCDF4 import Dataset
+from run_length import true_runs
+from purge_drift import load_predicted_windows, read_predicted_windows
+from datetime import datetime, timedelta
 
 # Define QC flag values
 FLAG_GOOD = 1
@@ -33,25 +36,21 @@ def get_previous_day_purge_times(prev_file, shift_seconds=0):
         purge_mask = ds["qc_flag_air_temperature"] == FLAG_PURGE
         times = pd.to_datetime(ds["time"].values)
 
-        intervals = []
-        start = None
-        for i, val in enumerate(purge_mask.values):
-            if val and start is None:
-                start = times[i]
-            elif not val and start is not None:
-                end = times[i - 1]
-                intervals.append((start, end))
-                start = None
-        if start is not None:
-            intervals.append((start, times[-1]))
+        starts, ends = true_runs(purge_mask.values)
+        intervals = list(zip(times[starts], times[ends - 1]))
 
         # Apply the time shift
         shifted_intervals = [(start + pd.Timedelta(seconds=shift_seconds), end + pd.Timedelta(seconds=shift_seconds)) for start, end in intervals]
         return shifted_intervals
 
+def seconds_to_time(seconds):
+    """Convert seconds since midnight to a time of day, wrapping past midnight."""
+    return (datetime.min + timedelta(seconds=seconds % (24 * 3600))).time()
+
 def flag_based_on_time_of_day(ds, purge_intervals, recovery_duration=6 * 60):
     """
     Flag data based on the time of day for multiple purge and recovery periods.
+    A period whose end is before its start runs past midnight.
     """
     # Convert time to pandas datetime for easier indexing
     time = pd.to_datetime(ds["time"].values)
@@ -64,15 +63,14 @@ def flag_based_on_time_of_day(ds, purge_intervals, recovery_duration=6 * 60):
         purge_start_seconds = start.hour * 3600 + start.minute * 60 + start.second
         purge_end_seconds = end.hour * 3600 + end.minute * 60 + end.second
 
-        # Flag purge period
-        purge_mask = (time_of_day >= purge_start_seconds) & (time_of_day < purge_end_seconds)
+        # Flag purge period, compared modulo the day so it can run past midnight
+        purge_length = (purge_end_seconds - purge_start_seconds) % (24 * 3600)
+        purge_mask = (time_of_day - purge_start_seconds) % (24 * 3600) < purge_length
         ds["qc_flag_air_temperature"].values[purge_mask] = FLAG_PURGE
         ds["qc_flag_relative_humidity"].values[purge_mask] = FLAG_PURGE
 
         # Flag recovery period
-        recovery_start_seconds = purge_end_seconds
-        recovery_end_seconds = recovery_start_seconds + recovery_duration
-        recovery_mask = (time_of_day >= recovery_start_seconds) & (time_of_day < recovery_end_seconds)
+        recovery_mask = (time_of_day - purge_end_seconds) % (24 * 3600) < recovery_duration
         ds["qc_flag_relative_humidity"].values[recovery_mask] = FLAG_RH_RECOVERY
 
 def clear_purge_flags(ds):
@@ -86,37 +84,13 @@ def clear_purge_flags(ds):
         arr[(arr == FLAG_PURGE) | (arr == FLAG_RH_RECOVERY)] = FLAG_GOOD
         ds["qc_flag_relative_humidity"].values[:] = arr
 
-def main():
-    # Parse command-line arguments
-    parser = argparse.ArgumentParser(description="Manually flag purge periods in a NetCDF file based on time of day.")
-    parser.add_argument("-f", "--file", required=True, help="Path to the NetCDF file")
-    parser.add_argument("--prev-file", help="Path to the previous day's NetCDF file to read purge times")
-    parser.add_argument("--shift-seconds", type=float, default=0.0, help="Shift purge times by this many seconds (default: 0.0)")
-    parser.add_argument("-s", "--start", help="Start time of the purge period (format: HH:MM:SS)")
-    parser.add_argument("-e", "--end", help="End time of the purge period (format: HH:MM:SS)")
-    parser.add_argument("--clear-purge-flags", action="store_true", help="Clear existing purge and recovery flags before applying new ones")
-    args = parser.parse_args()
-
-    # Determine purge intervals
-    if args.prev_file:
-        # Use purge times from the previous day's file
-        intervals = get_previous_day_purge_times(args.prev_file, shift_seconds=args.shift_seconds)
-        if not intervals:
-            print(f"No purge intervals found in {args.prev_file}")
-            return
-        # Convert intervals to time of day
-        purge_intervals = [(start.time(), end.time()) for start, end in intervals]
-    else:
-        # Use manually specified start and end times
-        if not args.start or not args.end:
-            print("Error: You must provide both --start and --end times if --prev-file is not used.")
-            return
-        purge_start_time = pd.to_datetime(args.start, format="%H:%M:%S").time()
-        purge_end_time = pd.to_datetime(args.end, format="%H:%M:%S").time()
-        purge_intervals = [(purge_start_time, purge_end_time)]
-
-    # Open the NetCDF file
-    with xr.open_dataset(args.file, mode="r+") as ds:
+def flag_file(nc_file, purge_intervals, clear=False):
+    """
+    Flags the purge and recovery periods in a NetCDF file, adding the QC flag
+    variables if they don't exist, and clearing the existing purge flags first
+    if clear is set.
+    """
+    with xr.open_dataset(nc_file, mode="r+") as ds:
         # Ensure the dataset is sorted by time
         ds = ds.sortby("time")
 
@@ -142,18 +116,66 @@ def main():
             }
 
         # Clear existing purge/recovery flags if requested
-        if args.clear_purge_flags:
+        if clear:
             clear_purge_flags(ds)
 
         # Flag data based on time of day
         flag_based_on_time_of_day(ds, purge_intervals)
 
         # Save changes to the file
-        ds.to_netcdf(args.file, mode="a")  # Append mode ensures updates are written
-        print(f"QC flags successfully added to {args.file}.")
+        ds.to_netcdf(nc_file, mode="a")  # Append mode ensures updates are written
+        print(f"QC flags successfully added to {nc_file}.")
 
     # Update time units to 'seconds since 1970-01-01 00:00:00'
-    set_time_units_to_seconds_since_epoch(args.file)
+    set_time_units_to_seconds_since_epoch(nc_file)
+
+def main():
+    # Parse command-line arguments
+    parser = argparse.ArgumentParser(description="Manually flag purge periods in a NetCDF file based on time of day.")
+    parser.add_argument("-f", "--file", required=True, nargs="+", help="Path to the NetCDF file (or several, e.g. a range of days with --windows)")
+    parser.add_argument("--prev-file", help="Path to the previous day's NetCDF file to read purge times")
+    parser.add_argument("--windows", help="Table of predicted purge windows from purge_drift.py to read each file's purge times from")
+    parser.add_argument("--shift-seconds", type=float, default=0.0, help="Shift purge times by this many seconds (default: 0.0)")
+    parser.add_argument("-s", "--start", help="Start time of the purge period (format: HH:MM:SS)")
+    parser.add_argument("-e", "--end", help="End time of the purge period (format: HH:MM:SS)")
+    parser.add_argument("--clear-purge-flags", action="store_true", help="Clear existing purge and recovery flags before applying new ones")
+    args = parser.parse_args()
+
+    # Determine purge intervals
+    if args.windows:
+        # Use the purge windows predicted for each file's date, reading the table once
+        table = load_predicted_windows(args.windows)
+        for nc_file in args.file:
+            with xr.open_dataset(nc_file, mode="r") as ds:
+                file_date = pd.to_datetime(ds["time"].values.min()).date()
+            windows = read_predicted_windows(table, file_date)
+            if not windows:
+                print(f"No predicted purge windows for {file_date} in {args.windows}")
+                continue
+            purge_intervals = [(seconds_to_time(start + args.shift_seconds), seconds_to_time(end + args.shift_seconds))
+                               for start, end in windows]
+            flag_file(nc_file, purge_intervals, clear=args.clear_purge_flags)
+        return
+
+    if args.prev_file:
+        # Use purge times from the previous day's file
+        intervals = get_previous_day_purge_times(args.prev_file, shift_seconds=args.shift_seconds)
+        if not intervals:
+            print(f"No purge intervals found in {args.prev_file}")
+            return
+        # Convert intervals to time of day
+        purge_intervals = [(start.time(), end.time()) for start, end in intervals]
+    else:
+        # Use manually specified start and end times
+        if not args.start or not args.end:
+            print("Error: You must provide both --start and --end times if --prev-file or --windows is not used.")
+            return
+        purge_start_time = pd.to_datetime(args.start, format="%H:%M:%S").time()
+        purge_end_time = pd.to_datetime(args.end, format="%H:%M:%S").time()
+        purge_intervals = [(purge_start_time, purge_end_time)]
+
+    for nc_file in args.file:
+        flag_file(nc_file, purge_intervals, clear=args.clear_purge_flags)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
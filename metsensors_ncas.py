@@ -20,11 +20,20 @@ import netCDF4 as nc4
 
 import datetime
 import time
+from concurrent.futures import ThreadPoolExecutor
 import calendar
 import scipy.signal
 from pylab import *
 import module_data_object_python3
 import module_distrometer_format5
+import cr1000x_day_index
+import radiometer_thermistors
+import column_buffer
+import read_sonic_records
+import rd80_disdrometer
+import read_format5_records
+import format5_catalogue
+from read_format5_header import read_format5_header
 import matplotlib as mpl
 mpl.use('Agg')
 import matplotlib.pyplot as plt
@@ -87,9 +96,11 @@ def generate_netcdf_pluvio(nday):
     # ----------------------
     # Initialize data arrays
     # ----------------------
-    vals        = missing_value * np.ones((10000,nvar))
-    timesecs    = np.zeros((10000))
-    input_missing =  np.zeros((10000,nvar))
+    data = column_buffer.ColumnBuffer()	#Arrays grow as rows are read
+    data.add_column('timesecs')
+    data.add_column('vals', width=nvar, fill_value=missing_value)
+    data.add_column('input_missing', width=nvar, dtype=np.int8)
+    timesecs, vals, input_missing = data.reserve(0)
     valid_min_max = np.zeros((2,nvar))
 
     # -----------
@@ -137,11 +148,8 @@ def generate_netcdf_pluvio(nday):
 
 
         if os.access(path_in, os.F_OK):     #A data directory exists for the day
-            files = os.listdir(path_in)
-            tempstr = "pldc_" + datestring_now + '.00'
-            expr = re.compile(tempstr+'[0-9]')
-            infiles = [elem for elem in files if expr.search(elem)]
-            infiles.sort()
+            #The file list comes from the catalogue, so the directory isn't listed every day
+            infiles = format5_catalogue.find_format5_files(path_in, "pldc_", datestring_now)
             print('Raw files = ',infiles)
             nfiles = len(infiles)
             if nfiles == 0:
@@ -177,6 +185,7 @@ def generate_netcdf_pluvio(nday):
                 if startnum < 100000:
                     startnum = startnum + epoch_offset
                 if startnum > nday and startnum <= (nday + 1):
+                    timesecs, vals, input_missing = data.reserve(n+1)	#Grows the arrays if the day has more rows
                     timesecs[n] = 3600.0*float(line[6:8]) + 60.0*float(line[9:11]) + float(line[12:14])
                     if startnum == (nday + 1):  #If we're reading the first timestamp from the next day, add 86400 secs to time or it will be zero
                         timesecs[n] = timesecs[n] + 86400.0
@@ -218,9 +227,7 @@ def generate_netcdf_pluvio(nday):
         # -------------------------------------
         # Trim arrays to remove unused elements
         # -------------------------------------
-        vals = vals[0:n,:]
-        input_missing = input_missing[0:n,:]
-        timesecs   = timesecs[0:n]
+        timesecs, vals, input_missing = data.trimmed(n)
 
         #print(timesecs[0:9])
         #print(vals[0:9,0])
@@ -378,60 +385,19 @@ def generate_netcdf_met(nday,num_today,sensor):
     # -------------------------
     # Define various parameters
     # -------------------------
-    A = -4.56582625e-7
-    B =  8.97922514e-5
-    C = -6.95640241e-3
-    D =  2.74163515e-1
-    E = -6.23224724
-    F = 66.1824897
-
-    A1=0.0010295
-    B1=2.391e-4
-    G1=1.568e-7
-    Tk = 273.15
-    SBconst = 5.67e-8
+    #CG4 and CHP1 thermistor coefficients are in radiometer_thermistors
 
     # -----------
     # Setup paths
     # -----------
     print('Setting up paths')
-    path_in = "/data/range/mirror_grape_loggernet/"
-    #path_out_9 = "/data/amof-netCDF/diagnostics/ncas-nocorr-temperature-rh-1/ncas-nocorr-temperature-rh-1_cao_"
-    if sensor == 2:
-        daily_path_out = "/data/range/daily_met/cr1000x_rxcabin_1/"
-        daily_file = 'CR1000XSeries_Chilbolton_Rxcabinmet1_'
-        infiles = "CR1000XSeries_Chilbolton_Rxcabinmet1.dat"
-        #infiles = "CR1000XSeries_Chilbolton_Rxcabinmet1_20210804.dat"
-        logger_details = '/data/netCDF/corrections/chilbolton_rxcabin_1.txt'
-        if nday < 737825:	#20210204, the day after an extra channel was added to the datafiles for rg009
-            logger_details = '/data/netCDF/corrections/chilbolton_rxcabin_1_20200729.txt'
-        if nday < 737636:	#2020730, the day after extra channels were added to the datafiles for rg001, rg006, rg008, rg004
-            logger_details = '/data/netCDF/corrections/chilbolton_rxcabin_1_20191024.txt'
-        print('nday, logger_details = ', nday, logger_details)
-    if sensor == 5:
-        daily_path_out = "/data/range/daily_met/cr1000x_sparsholt_1/"
-        daily_file = 'CR1000XSeries_Sparsholt1_'
-        infiles = "CR1000XSeries_Sparsholt_dc_tb.dat"
-        #infiles = "CR1000XSeries_Sparsholt_dc_tb_20210113.dat"
-        #infiles = "CR1000XSeries_Sparsholt_dc_tb_20200623.dat"
-        logger_details = '/data/netCDF/corrections/sparsholt_1.txt'
-    if sensor == 9:
-        daily_path_out = "/data/range/daily_met/cr1000x_rxcabin_2/"
-        daily_file = 'CR1000XSeries_Chilbolton_Rxcabinmet2_'
-        infiles = "CR1000XSeries_Chilbolton2_Rxcabinmet2.dat"
-        logger_details = '/data/netCDF/corrections/chilbolton_rxcabin_2.txt'
-        if nday < 738167:	#20220112, the day the CM21 and CG4 were reconnected after cal. (no change to datalogger file columns) 
-            logger_details = '/data/netCDF/corrections/chilbolton_rxcabin_2_20211015.txt'
-        if nday < 738078:       #20211015, the day after an extra channel was added to the datafiles for rg009
-            logger_details = '/data/netCDF/corrections/chilbolton_rxcabin_2_20211007.txt'
-            infiles = "CR1000XSeries_Chilbolton2_Table1.dat"
-
-    daily_file   = os.path.join(daily_path_out,daily_file+datestring+'.dat')
+    logger_paths = cr1000x_logger_paths(nday, sensor)
+    path_in_file = logger_paths[0]
+    daily_file = logger_paths[1]
+    logger_details = logger_paths[2]
 
     data_version = "_v1.0"
 
-    path_in_file = path_in + infiles
-
     # ---------------------------------------------------
     # Process data files
     # Read the cumulative file from the datalogger first
@@ -489,7 +455,6 @@ def generate_netcdf_met(nday,num_today,sensor):
     if n > 0:
         nvar = len(chids)
         nn_max = len(files_to_write)
-        input_missing =  np.zeros((10000,nvar))
         valid_min_max = np.zeros((2,(nvar+1)))	#Making it nvar+1 is a fudge to make substitutions line work for writing the diagnostics T/RH file
         # -------------------------------------
         # Trim arrays to remove unused elements
@@ -497,7 +462,6 @@ def generate_netcdf_met(nday,num_today,sensor):
         vals = vals[0:n,:]
         print('vals.shape = ',vals.shape)
         timesecs   = timesecs[0:n]
-        input_missing = input_missing[0:n,:]
         #print('In main, sorted_indicies = ',sorted_indicies)
 
         #Assign values of input_missing depending on location of missing_value in vals array
@@ -519,25 +483,12 @@ def generate_netcdf_met(nday,num_today,sensor):
                     m_longwave = m      #Column of vals which contains CG4 downwelling flux which needs to be corrected
             for m in range(len(varnames)):
                 if varnames[m].find('body_temperature') >= 0 and chids[m].find('pyrCG4_ch') >= 0:
-                    raw_v = vals[:,m]   #Column with voltage divider values that are used to derive temperature
-                    R_CG4 = 10.0*(raw_v/(1-raw_v))      #Resistance in kohms
-                    for k in range(n):
-                        if R_CG4[k] <= 100.0:   #
-                            vals[k,m] = (A*R_CG4[k]**5 + B*R_CG4[k]**4 + C*R_CG4[k]**3 + D*R_CG4[k]**2 + E*R_CG4[k] + F) + Tk
-                            corr_CG4 = SBconst * vals[k,m] ** 4
-                            vals[k,m_longwave] = vals[k,m_longwave] + corr_CG4
-                        else:
-                            vals[k,m_longwave] = missing_value  #This it should be missing as can't give it a value? Set a value for QC flag too?
-                            vals[k,m] = missing_value   #This it should be missing as can't give it a value? Set a value for QC flag too?
+                    R_CG4 = radiometer_thermistors.divider_resistance(vals[0:n,m], 10.0)      #Resistance in kohms, from the voltage divider values
+                    #Longwave and body temperature are missing where R_CG4 is out of range. Set a value for QC flag too?
+                    vals[0:n,m_longwave],vals[0:n,m] = radiometer_thermistors.correct_cg4(vals[0:n,m_longwave], R_CG4, missing_value)
                 if varnames[m].find('body_temperature') >= 0 and chids[m].find('pyrCP1_T_ch') >= 0:
-                    raw_v = vals[:,m]   #Column with voltage divider values that are used to derive temperature
-                    R_CHP1 = 10000.0*(raw_v/(1-raw_v))  #Resistance in ohms
-                    for k in range(n):
-                        if R_CHP1[k] <= 100000.0:
-                            lnR_CHP1 = np.log(R_CHP1);
-                            vals[k,m] = 1.0/(A1 + (B1 * lnR_CHP1[k]) + (G1 * lnR_CHP1[k] ** 3))
-                        else:
-                            vals[k,m] = missing_value   #This it should be missing as can't give it a value? Set a value for QC flag too?
+                    R_CHP1 = radiometer_thermistors.divider_resistance(vals[0:n,m], 10000.0)  #Resistance in ohms, from the voltage divider values
+                    vals[0:n,m] = radiometer_thermistors.chp1_body_temperature(R_CHP1, missing_value)
 
         #----------------------------------------------------------------------
         # Generate template and output filenames from input logger file details
@@ -747,31 +698,60 @@ def generate_netcdf_met(nday,num_today,sensor):
 
 
 # ------------------------------------------------------------------------
-# Read data from Chilbolton1 Campbell datalogger
+# Cumulative logger file, daily file and logger details file for a day
 # ------------------------------------------------------------------------
-def read_cr1000x_general(in_file, write_file, daily_file_read, daily_file_exist, logger_details, nday, num_today):
+def cr1000x_logger_paths(nday, sensor):
 
-    # -------------------------
-    # Define various parameters
-    # -------------------------
-    missing_value = -1.0E+20
-    epoch_offset = 719163
-    n = 0	#Times
-    timesecs    = np.zeros((10000))
-    #vals        = missing_value*np.ones((10000,nvar))
-    write_daily_ok = 0	#Variable which shows whether we write a daily .dat file, 1 if we do write one
-    wd_col = -999	#Error value for column which has wind direction data. Needs to be identified as needs extra filtering
+    datestring = generate_netcdf_common(nday)[3]
+    path_in = "/data/range/mirror_grape_loggernet/"
+    #path_out_9 = "/data/amof-netCDF/diagnostics/ncas-nocorr-temperature-rh-1/ncas-nocorr-temperature-rh-1_cao_"
+    if sensor == 2:
+        daily_path_out = "/data/range/daily_met/cr1000x_rxcabin_1/"
+        daily_file = 'CR1000XSeries_Chilbolton_Rxcabinmet1_'
+        infiles = "CR1000XSeries_Chilbolton_Rxcabinmet1.dat"
+        #infiles = "CR1000XSeries_Chilbolton_Rxcabinmet1_20210804.dat"
+        logger_details = '/data/netCDF/corrections/chilbolton_rxcabin_1.txt'
+        if nday < 737825:	#20210204, the day after an extra channel was added to the datafiles for rg009
+            logger_details = '/data/netCDF/corrections/chilbolton_rxcabin_1_20200729.txt'
+        if nday < 737636:	#2020730, the day after extra channels were added to the datafiles for rg001, rg006, rg008, rg004
+            logger_details = '/data/netCDF/corrections/chilbolton_rxcabin_1_20191024.txt'
+        print('nday, logger_details = ', nday, logger_details)
+    if sensor == 5:
+        daily_path_out = "/data/range/daily_met/cr1000x_sparsholt_1/"
+        daily_file = 'CR1000XSeries_Sparsholt1_'
+        infiles = "CR1000XSeries_Sparsholt_dc_tb.dat"
+        #infiles = "CR1000XSeries_Sparsholt_dc_tb_20210113.dat"
+        #infiles = "CR1000XSeries_Sparsholt_dc_tb_20200623.dat"
+        logger_details = '/data/netCDF/corrections/sparsholt_1.txt'
+    if sensor == 9:
+        daily_path_out = "/data/range/daily_met/cr1000x_rxcabin_2/"
+        daily_file = 'CR1000XSeries_Chilbolton_Rxcabinmet2_'
+        infiles = "CR1000XSeries_Chilbolton2_Rxcabinmet2.dat"
+        logger_details = '/data/netCDF/corrections/chilbolton_rxcabin_2.txt'
+        if nday < 738167:	#20220112, the day the CM21 and CG4 were reconnected after cal. (no change to datalogger file columns) 
+            logger_details = '/data/netCDF/corrections/chilbolton_rxcabin_2_20211015.txt'
+        if nday < 738078:       #20211015, the day after an extra channel was added to the datafiles for rg009
+            logger_details = '/data/netCDF/corrections/chilbolton_rxcabin_2_20211007.txt'
+            infiles = "CR1000XSeries_Chilbolton2_Table1.dat"
 
+    daily_file   = os.path.join(daily_path_out,daily_file+datestring+'.dat')
+    path_in_file = path_in + infiles
 
-    # ----------------------------
-    # Read datalogger file details
-    # ----------------------------
+    return path_in_file, daily_file, logger_details
+
+
+# ------------------------------------------------------------------------
+# Read datalogger file details (column on/off flags and calibrations)
+# ------------------------------------------------------------------------
+def load_cr1000x_logger_details(logger_details):
+
+    wd_col = -999	#Error value for column which has wind direction data. Needs to be identified as needs extra filtering
+    chosen_chids = []
+    chosen_files = []
+    chosen_varnames = []
+    chosen_qcflagnames = []
+    chids = []
 
-    #logger_details = '/data/netCDF/corrections/chilbolton_rxcabin_1.txt'
-    chosen_chids = [' ']	#Dummy first element so that we can use the append command to add to the array
-    chosen_files = [' ']	#Dummy first element so that we can use the append command to add to the array
-    chosen_varnames = [' ']	#Dummy first element so that we can use the append command to add to the array
-    chosen_qcflagnames = [' ']	#Dummy first element so that we can use the append command to add to the array
     f_logger = open(logger_details, 'r') 
     line = f_logger.readline()
     fdata = line.split(':')
@@ -787,13 +767,9 @@ def read_cr1000x_general(in_file, write_file, daily_file_read, daily_file_exist,
         line = line.strip('\n')
         fdata = line.split(',')
         print(fdata)
-        if m == 0:
-            chids = [fdata[0]]
-        else:
-            chids.append(fdata[0])
+        chids.append(fdata[0])
         if fdata[0] == 'wd_ch':
             wd_col = m
-            #print('Wind direction column == ', wd_col)
         on_off[m] = int(fdata[1])
         if on_off[m] > 0:
             chosen_chids.append(fdata[0])
@@ -802,121 +778,212 @@ def read_cr1000x_general(in_file, write_file, daily_file_read, daily_file_exist,
             chosen_qcflagnames.append(fdata[6])
         logger_cals[0,m] = float(fdata[2])
         logger_cals[1,m] = float(fdata[3])
-    #print('n_cols, on_off = ', n_cols, on_off) 
-    #print('logger_cals = ',logger_cals)
 
     f_logger.close()
     print('chids from text file = ',chids)
-
-    chosen_chids.pop(0)
-    chosen_files.pop(0)
-    chosen_varnames.pop(0)
-    chosen_qcflagnames.pop(0)
     print('chosen_chids where on_off == 1 = ',chosen_chids)
     print('chosen_varnames where on_off == 1 = ',chosen_varnames)
-    #print('chosen_qcflagnames where on_off == 1 = ',chosen_qcflagnames)
     print('chosen_files where on_off == 1 = ',chosen_files)
-    unique_chosen_files, indicies, inverses = np.unique(chosen_files, return_index=True, return_inverse=True)
-    #sorted_indicies = np.sort(indicies)
+
+    #Output files in the order in which they first appear in the logger details
+    unique_chosen_files, indicies = np.unique(chosen_files, return_index=True)
     arg_sorted_indicies = np.argsort(indicies)
-    #print('unique_chosen_files = ',unique_chosen_files)
-    print('indicies = ',indicies)
-    #print('sorted_indicies = ',sorted_indicies)
-    print('arg_sorted_indicies = ',arg_sorted_indicies)
     ordered_chosen_files = np.array(unique_chosen_files)[arg_sorted_indicies] 
-    #unique_chosen_files = chosen_files[sorted_indicies]
     print('ordered_chosen_files = ',ordered_chosen_files)
-    nvar_local = len(chosen_chids)
-    vals        = missing_value*np.ones((10000,nvar_local))
 
-    f = open(in_file, 'r')
-    print("In general read function, num_today, nday = ", num_today, nday)
-    #In order to check whether we should write the CR1000X data line by line to a daily file check that
-    #you're not reading data from a daily file, that the daily file doesn't already exist
-    #that you're processing yesterday's data and that the time of day is later than 01UT
-    # (so that the data have been mirrored to /data/range/mirror_grape_loggernet)
-    # In addition, cronjobs to produce yesterday's data should be after ~ 01:15
-    if daily_file_read == 0 and daily_file_exist == 0 and (num_today - nday) >= 1 and int(str(datetime.datetime.now())[11:13]) >= 1:
-        write_daily_ok = 1
-        fd = open(write_file, 'w')
-
-    for z in range(4):      #4 header lines, may eventually want some of them
-        line = f.readline()
-        if daily_file_read == 0 and daily_file_exist == 0:	#Keep the header lines to write out later unless you're reading a daily file
-            if z == 0:
-                header_list = [line]
-            else:
-                header_list.append(line)
+    return n_cols, first_column, on_off, logger_cals, wd_col, chosen_chids, chosen_varnames, chosen_qcflagnames, ordered_chosen_files, chosen_files
 
-    # ---------------------------
-    # Repeated data for each time
-    # ---------------------------
 
-    while True:
+# ------------------------------------------------------------------------
+# Day number (as used for nday) of each CR1000X data line
+# A line belongs to nday if its timestamp is in (nday, nday+1], so the
+# record stamped 00:00:00 closes the previous day
+# ------------------------------------------------------------------------
+def cr1000x_line_days(data_lines):
 
-        line = f.readline()
-        if not line: break
-        column_count = 0	#Counter for each column in that line that is on
-        #startnum = int(date2num(datetime.datetime(int(line[1:5]),int(line[6:8]),int(line[9:11]),0,0,0)))
-        startnum = date2num(datetime.datetime(int(line[1:5]),int(line[6:8]),int(line[9:11]),int(line[12:14]),int(line[15:17]),int(line[18:20])))
-        if startnum < 100000:
-            startnum = startnum + epoch_offset
-        if startnum > nday and startnum <= (nday + 1):
-            #print(line)
-            #if n == 0 and daily_file_read == 0 and daily_file_exist == 0:	#Write header to file if this is first line for today's date
-            if n == 0 and write_daily_ok == 1:	#Write header to file if this is first line for today's date
-                for z in range(4):
-                    fd.write(header_list[z])	    
-
-            timesecs[n] = 3600.0*float(line[12:14]) + 60.0*float(line[15:17]) + float(line[18:20])
-            if startnum == (nday + 1):  #If we're reading the first timestamp from the next day, add 86400 secs to time or it will be zero
-                timesecs[n] = timesecs[n] + 86400.0
-
-            #print('timesecs = ',timesecs[n]) 
-            fdata = line.split(',')
-            #print(fdata)
-            #If a data value is missing, the string has 5 characters, "NAN". Not all values will create such a long string, so just look for the first N
-            for m in range(n_cols):	#All columns in raw datalogger file, whether on or off
-                if on_off[m] > 0:	#Column is on
-                    #print(fdata[m + first_column][1:2])
-                    if fdata[m + first_column][1:2] != "N" and fdata[m + first_column][1:2] != "I":
-                        temp_val = float(fdata[m + first_column])
-                        if m != wd_col:
-                            vals[n, column_count] = logger_cals[0, m] * temp_val + logger_cals[1, m]
-                        else:
-                            if np.absolute(temp_val) <= 5000.0:
-                                temp_val = logger_cals[0, m] * temp_val + logger_cals[1, m]
-                                if  temp_val >= 360.0:
-                                    vals[n, column_count] = temp_val - 360.0
-                                elif temp_val < 0.0:
-                                    vals[n, column_count] = temp_val + 360.0
-                                else:
-                                    vals[n, column_count] = temp_val
-
-                        #print('n,column_count,temp_val = ',n, column_count, temp_val)
-
-                    column_count = column_count + 1
-  
-            #Write line to daily file
-            if write_daily_ok == 1:
-                fd.write(line)
-            n += 1
+    epoch_offset = 719163
+    #TOACI1/TOA5 timestamps are quoted, "YYYY-MM-DD hh:mm:ss", so sit at a fixed position in each line
+    stamps = np.array([line[1:20] for line in data_lines], dtype='datetime64[s]').astype(np.int64)
+    line_days = (stamps - 1) // 86400 + epoch_offset
+    timesecs = (stamps - (line_days - epoch_offset) * 86400).astype(np.float64)	#86400 for the record at midnight of the next day
 
-    f.close()
-    if write_daily_ok == 1:
-        fd.close()	#Writes daily files
-        print('Changing permissions of daily file ', write_file)
-        oscommand = "chgrp netcdf " + write_file 
-        os.system(oscommand)
-        #oscommand = "chmod g+w " + out_file
-        oscommand = "chmod 775 " + write_file
-        os.system(oscommand) 
+    return line_days, timesecs
+
+
+# ------------------------------------------------------------------------
+# Convert the data columns of CR1000X lines to calibrated values
+# ------------------------------------------------------------------------
+def convert_cr1000x_values(data_lines, n_cols, first_column, on_off, logger_cals, wd_col):
+
+    missing_value = -1.0E+20
+    on_cols = np.flatnonzero(on_off > 0)
+    n = len(data_lines)
+    vals = missing_value*np.ones((n,len(on_cols)))
+    if n == 0:
+        return vals
+
+    fields = np.array([line.rstrip('\r\n').split(',')[first_column:(first_column + n_cols)] for line in data_lines])
+    fields = fields[:,on_cols]
+    #If a data value is missing, the string is "NAN" (or "INF"), so just look for the N or I after the quote
+    bad = np.char.startswith(fields, 'N', start=1) | np.char.startswith(fields, 'I', start=1)
+    raw = np.where(bad, '0', fields).astype(np.float64)
+    cal_vals = logger_cals[0, on_cols] * raw + logger_cals[1, on_cols]
+    vals = np.where(bad, missing_value, cal_vals)
+
+    wd_pos = np.flatnonzero(on_cols == wd_col)
+    if len(wd_pos) > 0:	#Wind direction needs extra filtering and wrapping into 0-360
+        k = wd_pos[0]
+        wd = cal_vals[:,k]
+        wd = np.where(wd >= 360.0, wd - 360.0, np.where(wd < 0.0, wd + 360.0, wd))
+        wd_ok = ~bad[:,k] & (np.absolute(raw[:,k]) <= 5000.0)
+        vals[:,k] = np.where(wd_ok, wd, missing_value)
+
+    return vals
+
+
+# ------------------------------------------------------------------------
+# Read the header and the data lines covering days first_nday to last_nday
+# from a CR1000X file. The day index is used for cumulative files
+# ------------------------------------------------------------------------
+def read_cr1000x_lines(in_file, first_nday, last_nday, use_index):
+
+    indexed_lines = None
+    if use_index:
+        indexed_lines = cr1000x_day_index.read_day_lines(in_file, generate_netcdf_common(first_nday)[3], generate_netcdf_common(last_nday)[3])
+
+    if indexed_lines is not None:
+        header_list = indexed_lines[0]
+        data_lines = indexed_lines[1]
+    else:
+        f = open(in_file, 'r')
+        header_list = [f.readline() for z in range(4)]	#4 header lines, may eventually want some of them
+        data_lines = f.readlines()
+        f.close()
+
+    data_lines = [line for line in data_lines if line.strip()]
+
+    return header_list, data_lines
+
+
+# ------------------------------------------------------------------------
+# Write a day's lines from the cumulative file to a daily .dat file
+# ------------------------------------------------------------------------
+def write_cr1000x_daily_file(write_file, header_list, day_lines):
+
+    fd = open(write_file, 'w')
+    if len(day_lines) > 0:	#Write header to file, then the lines for the day
+        fd.writelines(header_list)
+        fd.writelines(day_lines)
+    fd.close()	#Writes daily files
+    print('Changing permissions of daily file ', write_file)
+    oscommand = "chgrp netcdf " + write_file 
+    os.system(oscommand)
+    #oscommand = "chmod g+w " + out_file
+    oscommand = "chmod 775 " + write_file
+    os.system(oscommand) 
+
+
+# ------------------------------------------------------------------------
+# Split a CR1000X cumulative file into days nday_start to nday_end in one
+# pass. Each day's daily file is written and its lines are kept in
+# cr1000x_day_buffers for read_cr1000x_general, so a multi-day run reads
+# the cumulative file once rather than once per day. Only the last block
+# of days split is kept
+# ------------------------------------------------------------------------
+cr1000x_day_buffers = {}	#(cumulative file, nday) -> (header lines, day's lines, timesecs)
+
+def split_cr1000x_general(nday_start, nday_end, num_today, sensor):
+
+    #Drop any days of the previous block that were not read (e.g. their processing failed)
+    cr1000x_day_buffers.clear()
+
+    #The cumulative file can change with date (sensor 9), so group the days by file
+    days_by_file = {}
+    for nday in range(nday_start, nday_end + 1):
+        logger_paths = cr1000x_logger_paths(nday, sensor)
+        days_by_file.setdefault(logger_paths[0], []).append((nday, logger_paths[1]))
+
+    for in_file, file_days in days_by_file.items():
+        if not os.path.isfile(in_file):
+            print('Cumulative file not found for splitting ', in_file)
+            continue
+        print('Splitting ', in_file, ' into ', len(file_days), ' days')
+        header_list, data_lines = read_cr1000x_lines(in_file, file_days[0][0], file_days[-1][0], True)
+        line_days, line_timesecs = cr1000x_line_days(data_lines)
+
+        for nday, daily_file in file_days:
+            day_rows = np.flatnonzero(line_days == nday)
+            day_lines = [data_lines[k] for k in day_rows]
+            cr1000x_day_buffers[(in_file, nday)] = (header_list, day_lines, line_timesecs[day_rows])
+            #Same conditions for writing a daily file as read_cr1000x_general
+            if not os.path.isfile(daily_file) and (num_today - nday) >= 1 and int(str(datetime.datetime.now())[11:13]) >= 1:
+                write_cr1000x_daily_file(daily_file, header_list, day_lines)
+            print('No. lines split for day ', nday, ' = ', len(day_lines))
+
+
+# ------------------------------------------------------------------------
+# Read data from Chilbolton1 Campbell datalogger
+# ------------------------------------------------------------------------
+def read_cr1000x_general(in_file, write_file, daily_file_read, daily_file_exist, logger_details, nday, num_today):
+
+    # -------------------------
+    # Define various parameters
+    # -------------------------
+    write_daily_ok = 0	#Variable which shows whether we write a daily .dat file, 1 if we do write one
+
+    # ----------------------------
+    # Read datalogger file details
+    # ----------------------------
+    details = load_cr1000x_logger_details(logger_details)
+    n_cols = details[0]
+    first_column = details[1]
+    on_off = details[2]
+    logger_cals = details[3]
+    wd_col = details[4]
+    chosen_chids = details[5]
+    chosen_varnames = details[6]
+    chosen_qcflagnames = details[7]
+    ordered_chosen_files = details[8]
+    chosen_files = details[9]
+
+    print("In general read function, num_today, nday = ", num_today, nday)
+
+    # ---------------------------------------------------------------------
+    # Use the day's lines if the splitter has already read them into memory
+    # (and written the daily file), otherwise read them from the file
+    # ---------------------------------------------------------------------
+    day_buffer = cr1000x_day_buffers.pop((in_file, nday), None)
+    if day_buffer is not None and daily_file_read == 0:
+        print('Using lines read by the CR1000X splitter')
+        day_lines = day_buffer[1]
+        timesecs = day_buffer[2]
+    else:
+        #In order to check whether we should write the CR1000X data line by line to a daily file check that
+        #you're not reading data from a daily file, that the daily file doesn't already exist
+        #that you're processing yesterday's data and that the time of day is later than 01UT
+        # (so that the data have been mirrored to /data/range/mirror_grape_loggernet)
+        # In addition, cronjobs to produce yesterday's data should be after ~ 01:15
+        if daily_file_read == 0 and daily_file_exist == 0 and (num_today - nday) >= 1 and int(str(datetime.datetime.now())[11:13]) >= 1:
+            write_daily_ok = 1
+
+        #For the cumulative file the day index is used, so the whole file isn't scanned
+        header_list, data_lines = read_cr1000x_lines(in_file, nday, nday, daily_file_read == 0)
+
+        line_days, line_timesecs = cr1000x_line_days(data_lines)
+        day_rows = np.flatnonzero(line_days == nday)
+        day_lines = [data_lines[k] for k in day_rows]
+        timesecs = line_timesecs[day_rows]
+
+        if write_daily_ok == 1:
+            write_cr1000x_daily_file(write_file, header_list, day_lines)
+
+    n = len(day_lines)
+    vals = convert_cr1000x_values(day_lines, n_cols, first_column, on_off, logger_cals, wd_col)
     
     print('No. values in read function = ', n)
 
     return n, timesecs, vals, chosen_chids, chosen_varnames, chosen_qcflagnames, ordered_chosen_files, chosen_files
 
-
 # ------------------------------------------------------------------------
 # Raingauge from chan* file netcdf generation function
 # ------------------------------------------------------------------------
@@ -949,14 +1016,18 @@ def generate_netcdf_rain_f5(nday):
 
     missing_value = -1.0E+20
     epoch_offset = 719163
+    day_start = np.datetime64(int(nday) - epoch_offset, 'D').astype('datetime64[s]')	#Records for the day are day_start < time <= day_end
+    day_end = day_start + np.timedelta64(86400, 's')
 
     # ----------------------
     # Initialize data arrays
     # This is general so could go in a function, but as it's short, leave it here for now
     # ----------------------
-    timesecs    = np.zeros((10000))
-    vals        = missing_value*np.ones((10000,nvar))
-    input_missing    = np.zeros((10000,nvar))
+    data = column_buffer.ColumnBuffer()	#Arrays grow as rows are read
+    data.add_column('timesecs')
+    data.add_column('vals', width=nvar, fill_value=missing_value)
+    data.add_column('input_missing', width=nvar, dtype=np.int8)
+    timesecs, vals, input_missing = data.reserve(0)
     valid_min_max = np.zeros((2,nvar))
 
 
@@ -1014,11 +1085,8 @@ def generate_netcdf_rain_f5(nday):
         print(nday_file, datevals)
 
         if os.access(path_in, os.F_OK):     #A data directory exists for the day
-            files = os.listdir(path_in)
-            tempstr = "chan" + datestring_now[2:] + '.00'
-            expr = re.compile(tempstr+'[0-9]')
-            infiles = [elem for elem in files if expr.search(elem)]
-            infiles.sort()
+            #Only the files whose time range overlaps the day being processed
+            infiles = format5_catalogue.find_format5_files(path_in, "chan", datestring_now, day_start, day_end)
             print(infiles)
             nfiles = len(infiles)
             if nfiles == 0:
@@ -1029,47 +1097,26 @@ def generate_netcdf_rain_f5(nday):
             print('No directory found')
 
         for nf in range(nfiles):    #Indent from here
-            f = open(path_in+infiles[nf], 'r')
-
-            for z in range(17):      #4 header lines, may eventually want some of them
-                line = f.readline()
-
-            # ---------------------------
-            # Repeated data for each time
-            # ---------------------------
-
-            while True:
-
-                line = f.readline()
-                if not line: break
-                #May need to change to handle change of year. Or maybe easier to just lose 1 point once a year?! Stems from not having year in the f5 file
-                startnum = date2num(datetime.datetime(int(year_now),int(line[0:2]),int(line[3:5]),int(line[6:8]),int(line[9:11]),int(line[12:14])))
-                if startnum < 100000:
-                    startnum = startnum + epoch_offset
-                if startnum > nday and startnum <= (nday + 1):
-
-                #startnum = int(date2num(datetime.datetime(int(datestring[0:4]),int(line[0:2]),int(line[3:5]),0,0,0)))
-                #if startnum == nday:
-
-                    timesecs[n] = 3600.0*float(line[6:8]) + 60.0*float(line[9:11]) + float(line[12:14])
-                    if n == 0:
-                        print('First point = ', nday, timesecs[0], startnum, datestring_now)
-                    if startnum == (nday + 1):  #If we're reading the first timestamp from the next day, add 86400 secs to time or it will be zero
-                        timesecs[n] = timesecs[n] + 86400.0
-
-                    fdata = line.split()	#Need to not specify ' ' or it treats sucessive delimiters as individuals
-                    #vals[n,1] = stdrgcal * int(fdata[1])	#rg006dc_ch
-                    #vals[n,2] = lowrgcal * int(fdata[2])	#rg008dc_ch
-                    #vals[n,3] = tbrgcal * int(fdata[4])	#rg004tb_ch
-                    #vals[n,0] = stdrgcal * int(fdata[15])	#rg001dc_ch
-
-                    vals[n,1] = rgcal[1] * int(fdata[1])	#rg006dc_ch
-                    vals[n,2] = rgcal[2] * int(fdata[2])	#rg008dc_ch
-                    vals[n,3] = rgcal[3] * int(fdata[4])	#rg004tb_ch
-                    vals[n,0] = rgcal[0] * int(fdata[15])	#rg001dc_ch
-                    n += 1
-
-            f.close()
+            # ------------------------------------------------------------------
+            # Read just the day's records from the memory-mapped file. A record
+            # belongs to the day if nday < time <= nday + 1, so the following
+            # midnight is included and gets 86400 secs
+            #May need to change to handle change of year. Or maybe easier to just lose 1 point once a year?! Stems from not having year in the f5 file
+            # ------------------------------------------------------------------
+            header = read_format5_header(path_in+infiles[nf])
+            file_times, file_vals = read_format5_records.read_format5_window(path_in+infiles[nf], header, day_start, day_end, [0, 1, 3, 14])
+            nrec = len(file_times)
+            if nrec > 0:
+                timesecs, vals, input_missing = data.reserve(n+nrec)	#Grows the arrays if the day has more rows
+                timesecs[n:n+nrec] = (file_times - day_start).astype(float)
+                if n == 0:
+                    print('First point = ', nday, timesecs[0], datestring_now)
+
+                vals[n:n+nrec,1] = rgcal[1] * file_vals[:,0]	#rg006dc_ch
+                vals[n:n+nrec,2] = rgcal[2] * file_vals[:,1]	#rg008dc_ch
+                vals[n:n+nrec,3] = rgcal[3] * file_vals[:,2]	#rg004tb_ch
+                vals[n:n+nrec,0] = rgcal[0] * file_vals[:,3]	#rg001dc_ch
+                n += nrec
 
         print('no. values  = ', n)
 
@@ -1077,10 +1124,8 @@ def generate_netcdf_rain_f5(nday):
         # -------------------------------------
         # Trim arrays to remove unused elements
         # -------------------------------------
-        vals = vals[0:n,:]
+        timesecs, vals, input_missing = data.trimmed(n)
         print('vals.shape = ',vals.shape)
-        timesecs   = timesecs[0:n]
-        input_missing = input_missing[0:n,:]
 
         #Assign values of input_missing depending on location of missing_value in vals array
         input_missing = np.where(vals == missing_value,1,0)
@@ -1240,31 +1285,8 @@ def generate_netcdf_disdro_f5(nday,sensor):
     # Define various parameters
     # -------------------------
     missing_value = -1.0E+20
-    nbins = 127
-    disdro_A=5.0265E-03 #m2
-    #Minimum diameters for each bin
-    rd80_thresholds=[0.313, 0.318, 0.324, 0.331,
-                    0.337, 0.343, 0.35, 0.357, 0.364, 0.371,
-                    0.379, 0.387, 0.396, 0.405, 0.414, 0.423,
-                    0.433, 0.443, 0.453, 0.464, 0.474, 0.484,
-                    0.495, 0.505, 0.515, 0.526, 0.537, 0.547,
-                    0.558, 0.57, 0.583, 0.596, 0.611, 0.628,
-                    0.644, 0.662, 0.679, 0.696, 0.715, 0.735,
-                    0.754, 0.771, 0.787, 0.806, 0.827, 0.845,
-                    0.862, 0.879, 0.895, 0.912, 0.928, 0.944,
-                    0.96, 0.978, 0.999, 1.024, 1.051, 1.08,
-                    1.11, 1.14, 1.171, 1.202, 1.232, 1.262,
-                    1.289, 1.318, 1.346, 1.374, 1.402, 1.429,
-                    1.456, 1.483, 1.509, 1.533, 1.558, 1.582,
-                    1.606, 1.631, 1.657, 1.683, 1.715, 1.748,
-                    1.793, 1.841, 1.897, 1.955, 2.013, 2.077,
-                    2.139, 2.2, 2.262, 2.321, 2.381, 2.441,
-                    2.499, 2.558, 2.616, 2.672, 2.727, 2.781,
-                    2.836, 2.893, 2.949, 3.011, 3.08, 3.155,
-                    3.23, 3.306, 3.385, 3.466, 3.545, 3.625,
-                    3.704, 3.784, 3.864, 3.945, 4.028, 4.127,
-                    4.231, 4.34, 4.456, 4.573, 4.686, 4.801,
-                    4.915, 5.03, 5.145]
+    nbins = rd80_disdrometer.NBINS
+    rd80_thresholds = rd80_disdrometer.RD80_THRESHOLDS	#Minimum diameters for each bin. Bin geometry and area are in rd80_disdrometer
 
 
 
@@ -1272,26 +1294,12 @@ def generate_netcdf_disdro_f5(nday,sensor):
     # Initialize data arrays
     # This is general so could go in a function, but as it's short, leave it here for now
     # ----------------------
-    timesecs    = np.zeros((30000))
-    vals        = missing_value*np.ones((30000,nbins))	#Could/should expand to 10000,nbins,nvar
-    input_missing    = np.zeros((30000,nvar))
+    data = column_buffer.ColumnBuffer()	#Arrays grow as records are read
+    data.add_column('timesecs')
+    data.add_column('vals', width=nbins, fill_value=missing_value)	#Could/should expand to n,nbins,nvar
+    data.add_column('input_missing', width=nvar, dtype=np.int8)
+    timesecs, vals, input_missing = data.reserve(0)
     #valid_min_max = np.zeros((2))
-    mean_diam    = np.zeros((127))
-    mean_vol     = np.zeros((127))
-    ds_bin_width = np.zeros((127))
-
-
-
-    # ---------------------------------------------------
-    # Calculate mean drop diameter, volume and bin widths 
-    # ---------------------------------------------------
-    for n in range(126):
-        mean_diam[n]=np.mean([rd80_thresholds[n],rd80_thresholds[n+1]])
-        mean_vol[n]=0.5236*np.mean([rd80_thresholds[n]**3,rd80_thresholds[n+1]**3])
-        ds_bin_width[n]=rd80_thresholds[n+1]-rd80_thresholds[n]
-    mean_diam[126] = 5.203      #arbitrary value based on spacing of previous bins
-    mean_vol[126] = 74.0
-    ds_bin_width[126] = ds_bin_width[125]       #arbitrary value based on spacing of previous bins
 
     # -----------
     # Setup paths
@@ -1342,11 +1350,8 @@ def generate_netcdf_disdro_f5(nday,sensor):
         #print "datestring_now = ",datestring_now
 
         if os.access(path_in, os.F_OK):     #A data directory exists for the day
-            files = os.listdir(path_in)
-            tempstr = "chds" + datestring_now[2:] + '.00'
-            expr = re.compile(tempstr+'[0-9]')
-            infiles = [elem for elem in files if expr.search(elem)]
-            infiles.sort()
+            #All records are read from the files, so they aren't picked by time range
+            infiles = format5_catalogue.find_format5_files(path_in, "chds", datestring_now)
             print('Raw files = ',infiles)
             nfiles = len(infiles)
             #print("nfiles = ",nfiles)
@@ -1389,11 +1394,10 @@ def generate_netcdf_disdro_f5(nday,sensor):
             numtimes = np.rint((date2num(datetimes) - nday + epoch_offset) * 86400.0)	#Time in seconds since midnight 
             print('numtimes = ',numtimes)
             print('nfiles, n, number_of_records, len(numtimes), (n+number_of_records) = ',nfiles, n, number_of_records, len(numtimes), (n+number_of_records))
+            timesecs, vals, input_missing = data.reserve(n + number_of_records)	#Grows the arrays if the day has more records
             timesecs[n : (n + number_of_records)] = numtimes 
-
-            for nn in range(number_of_records):
-                vals[n,:] = disdro_handler.return_spectral_data(nn)
-                n = n + 1	#Counter for total number of points across all files for the days
+            vals[n : (n + number_of_records),:] = rd80_disdrometer.spectral_matrix(disdro_handler, number_of_records)
+            n = n + number_of_records	#Counter for total number of points across all files for the days
 
 
 
@@ -1421,6 +1425,7 @@ def generate_netcdf_disdro_f5(nday,sensor):
         # -------------------------------------
         # Trim arrays to remove unused elements
         # -------------------------------------
+        timesecs, vals, input_missing = data.trimmed(n)
         #timesecs = timesecs[(timesecs > 0) & (timesecs <= 86400.0)]
         vals = vals[(timesecs > 0) & (timesecs <= 86400.0),:]
         timesecs = timesecs[(timesecs > 0) & (timesecs <= 86400.0)]
@@ -1442,9 +1447,7 @@ def generate_netcdf_disdro_f5(nday,sensor):
         sampling_interval = str(timesecs[1]-timesecs[0])+' seconds'
         t_interval = timesecs[1]-timesecs[0]
 
-        ch_count_vol_product = mean_vol*vals
-        #print('ch_count_vol_product min, max = ', np.amin(ch_count_vol_product), np.amax(ch_count_vol_product))
-        ch_accum_array = (np.sum(ch_count_vol_product,axis=1))/(disdro_A*1.0e+06)
+        ch_accum_array = rd80_disdrometer.rainfall_thickness(vals)	#Rainfall from the whole day of spectra at once
         #print( ch_accum_array)
         #print( 'ch_accum_array min, max = ', np.amin(ch_accum_array), np.amax(ch_accum_array))
         #print( ch_accum_array.shape)
@@ -1603,18 +1606,7 @@ def generate_netcdf_bbrad_f5(nday):
     # -------------------------
     # Define various parameters
     # -------------------------
-    A = -4.56582625e-7
-    B =  8.97922514e-5
-    C = -6.95640241e-3
-    D =  2.74163515e-1
-    E = -6.23224724
-    F = 66.1824897
-
-    A1=0.0010295
-    B1=2.391e-4
-    G1=1.568e-7
-    Tk = 273.15
-    SBconst = 5.67e-8
+    #CG4 and CHP1 thermistor coefficients are in radiometer_thermistors
     scal = load_bbrad_calibrations(nday)    
     #scal = np.zeros((nvar-1))
     #scal[0] = 10.89e-6	#CM21
@@ -1623,13 +1615,17 @@ def generate_netcdf_bbrad_f5(nday):
     #scal[3] = 7.89e-6	#CHP1 
     missing_value = -1.0E+20
     epoch_offset = 719163
+    day_start = np.datetime64(int(nday) - epoch_offset, 'D').astype('datetime64[s]')	#Records for the day are day_start < time <= day_end
+    day_end = day_start + np.timedelta64(86400, 's')
     # ----------------------
     # Initialize data arrays
     # This is general so could go in a function, but as it's short, leave it here for now
     # ----------------------
-    timesecs    = np.zeros((10000))
-    vals        = missing_value*np.ones((10000,nvar))
-    input_missing    = np.zeros((10000,nvar))
+    data = column_buffer.ColumnBuffer()	#Arrays grow as rows are read
+    data.add_column('timesecs')
+    data.add_column('vals', width=nvar, fill_value=missing_value)
+    data.add_column('input_missing', width=nvar, dtype=np.int8)
+    timesecs, vals, input_missing = data.reserve(0)
     valid_min_max = np.zeros((2,nvar))
 
     # -----------
@@ -1687,11 +1683,8 @@ def generate_netcdf_bbrad_f5(nday):
         #print "datestring_now = ",datestring_now
 
         if os.access(path_in, os.F_OK):     #A data directory exists for the day
-            files = os.listdir(path_in)
-            tempstr = "chpy" + datestring_now[2:] + '.00'
-            expr = re.compile(tempstr+'[0-9]')
-            infiles = [elem for elem in files if expr.search(elem)]
-            infiles.sort()
+            #Only the files whose time range overlaps the day being processed
+            infiles = format5_catalogue.find_format5_files(path_in, "chpy", datestring_now, day_start, day_end)
             print('Raw files = ',infiles)
             nfiles = len(infiles)
             #print("nfiles = ",nfiles)
@@ -1715,59 +1708,31 @@ def generate_netcdf_bbrad_f5(nday):
             print('No directory found')
 
         for nf in range(nfiles):    #Indent from here
-            f = open(path_in+infiles[nf], 'r')
-
-            for z in range(8):      #8 header lines, may eventually want some of them
-                line = f.readline()
-
-            # ---------------------------
-            # Repeated data for each time
-            # ---------------------------
-
-            while True:
- 
-                line = f.readline()
-                if not line: break
-                #startnum = int(date2num(datetime.datetime(int(datestring[0:4]),int(line[0:2]),int(line[3:5]),0,0,0)))
-                #print 'startnum, nday = ',startnum, nday
-                #if startnum == nday:
-                #May need to change to handle change of year. Or maybe easier to just lose 1 point once a year?!
-                startnum = date2num(datetime.datetime(int(year_now),int(line[0:2]),int(line[3:5]),int(line[6:8]),int(line[9:11]),int(line[12:14])))
-                if startnum < 100000:
-                    startnum = startnum + epoch_offset
-                if startnum > nday and startnum <= (nday + 1):
-
-                    timesecs[n] = 3600.0*float(line[6:8]) + 60.0*float(line[9:11]) + float(line[12:14])
-                    if n == 0:
-                        print('First point = ', nday, timesecs[0], startnum, datestring_now)
-                    if startnum == (nday + 1):  #If we're reading the first timestamp from the next day, add 86400 secs to time or it will be zero
-                        timesecs[n] = timesecs[n] + 86400.0
-
-                    fdata = line.split()	#Need to not specify ' ' or it treats sucessive delimiters as individuals
-                    vals[n,0] = float(fdata[1])/scal[0]	#CM21
-                    vals[n,1] = float(fdata[4])/scal[1]	#CMP21
-                    vals[n,2] = float(fdata[2])/scal[2]	#CG4
-                    vals[n,4] = float(fdata[5])/scal[3]	#CHP1
-                    #Temperatures and corrections
-                    R_CG4 = float(fdata[3])/1000.	#kohms. 10^5 ohms is sensible highest
-                    if R_CG4 <= 100.0:
-                        T_CG4 = (A*R_CG4**5 + B*R_CG4**4 + C*R_CG4**3 + D*R_CG4**2 + E*R_CG4 + F) + Tk
-                        corr_CG4 = SBconst * T_CG4 ** 4               
-                        vals[n,2] = vals[n,2] + corr_CG4
-                        vals[n,3] = T_CG4
-                    else:
-                        vals[n,2] = missing_value	#This it should be missing as can't give it a value? Set a value for QC flag too?
-                        vals[n,3] = missing_value
-                    R_CHP1 = float(fdata[6])
-                    if R_CHP1 <= 100000.0:
-                        lnR_CHP1 = np.log(R_CHP1);
-                        vals[n,5] = 1.0/(A1 + (B1 * lnR_CHP1) + (G1 * lnR_CHP1 ** 3)) 
-                    else:
-                        vals[n,5] = missing_value
-
-                    n += 1
-
-            f.close()
+            # ------------------------------------------------------------------
+            # Read just the day's records from the memory-mapped file. A record
+            # belongs to the day if nday < time <= nday + 1, so the following
+            # midnight is included and gets 86400 secs
+            #May need to change to handle change of year. Or maybe easier to just lose 1 point once a year?!
+            # ------------------------------------------------------------------
+            header = read_format5_header(path_in+infiles[nf])
+            file_times, file_vals = read_format5_records.read_format5_window(path_in+infiles[nf], header, day_start, day_end, [0, 1, 2, 3, 4, 5])
+            nrec = len(file_times)
+            if nrec > 0:
+                timesecs, vals, input_missing = data.reserve(n+nrec)	#Grows the arrays if the day has more rows
+                timesecs[n:n+nrec] = (file_times - day_start).astype(float)
+                if n == 0:
+                    print('First point = ', nday, timesecs[0], datestring_now)
+
+                vals[n:n+nrec,0] = file_vals[:,0]/scal[0]	#CM21
+                vals[n:n+nrec,1] = file_vals[:,3]/scal[1]	#CMP21
+                vals[n:n+nrec,2] = file_vals[:,1]/scal[2]	#CG4
+                vals[n:n+nrec,4] = file_vals[:,4]/scal[3]	#CHP1
+                #Temperatures and corrections
+                R_CG4 = file_vals[:,2]/1000.	#kohms. 10^5 ohms is sensible highest
+                #Longwave and body temperature are missing where R_CG4 is out of range. Set a value for QC flag too?
+                vals[n:n+nrec,2],vals[n:n+nrec,3] = radiometer_thermistors.correct_cg4(vals[n:n+nrec,2], R_CG4, missing_value)
+                vals[n:n+nrec,5] = radiometer_thermistors.chp1_body_temperature(file_vals[:,5], missing_value)	#Resistance in ohms
+                n += nrec
     
         print('No. values from raw format5 files = ', n)
 
@@ -1775,10 +1740,8 @@ def generate_netcdf_bbrad_f5(nday):
         # -------------------------------------
         # Trim arrays to remove unused elements
         # -------------------------------------
-        vals = vals[0:n,:]
+        timesecs, vals, input_missing = data.trimmed(n)
         #print('vals.shape = ',vals.shape)
-        timesecs   = timesecs[0:n]
-        input_missing = input_missing[0:n,:]
 
         #Assign values of input_missing depending on location of missing_value in vals array
         input_missing = np.where(vals == missing_value,1,0)
@@ -1957,11 +1920,14 @@ def generate_netcdf_pws100(nday):
     # Initialize data arrays
     # ----------------------
     nbins = 300 #Number of size bins
-    vals        = missing_value * np.ones((10000,nvar))
-    vals[:,1] = -127.0	#Missing value for synoptic code, which is a short integer
-    drop_vals        = missing_value * np.ones((10000,300))
-    timesecs    = np.zeros((10000))
-    input_missing =  np.zeros((10000,nvar))
+    vals_fill = missing_value * np.ones((nvar))
+    vals_fill[1] = -127.0	#Missing value for synoptic code, which is a short integer
+    data = column_buffer.ColumnBuffer()	#Arrays grow as rows are read
+    data.add_column('timesecs')
+    data.add_column('vals', width=nvar, fill_value=vals_fill)
+    data.add_column('input_missing', width=nvar, dtype=np.int8)
+    data.add_column('drop_vals', width=nbins, fill_value=missing_value)
+    timesecs, vals, input_missing, drop_vals = data.reserve(0)
     valid_min_max = np.zeros((2,nvar))
     bin_middle = 0.1 * np.arange(nbins) + 0.05
 
@@ -2049,6 +2015,7 @@ def generate_netcdf_pws100(nday):
                 if startnum < 100000:
                     startnum = startnum + epoch_offset
                 if startnum > nday and startnum <= (nday + 1):
+                    timesecs, vals, input_missing, drop_vals = data.reserve(n+1)	#Grows the arrays if the day has more rows
                     timesecs[n] = 3600.0*float(line[0:2]) + 60.0*float(line[3:5]) + float(line[6:8])
                     if startnum == (nday + 1):  #If we're reading the first timestamp from the next day, add 86400 secs to time or it will be zero
                         timesecs[n] = timesecs[n] + 86400.0
@@ -2073,10 +2040,7 @@ def generate_netcdf_pws100(nday):
         # -------------------------------------
         # Trim arrays to remove unused elements
         # -------------------------------------
-        vals = vals[0:n,:]
-        drop_vals = drop_vals[0:n,:]
-        #input_missing = input_missing[0:n,:]
-        timesecs   = timesecs[0:n]
+        timesecs, vals, input_missing, drop_vals = data.trimmed(n)
 
         #print(timesecs[0:9])
         #print(vals[0:9,0])
@@ -2236,6 +2200,81 @@ def generate_netcdf_pws100(nday):
 # -----------------------------------------------------------------------------------
 # CNR4 net flux radiometer from datataker in flux compound netcdf generation function
 # -----------------------------------------------------------------------------------
+#--------------------------------------------
+# Read the hourly files of a day concurrently.
+# read_file(path, *args) is called for each
+# file in a thread pool, so network reads and
+# parsing overlap. Results are returned in the
+# order of infiles, i.e. in time order
+#--------------------------------------------
+file_read_threads = 8	#Number of hourly files read at once
+
+def read_hourly_files(read_file, path_in, infiles, *args):
+    if len(infiles) == 0:
+        return []
+    with ThreadPoolExecutor(max_workers=min(file_read_threads, len(infiles))) as executor:
+        return list(executor.map(lambda infile: read_file(path_in + infile, *args), infiles))
+
+
+
+#--------------------------------------------
+# Read one hourly CNR4 Datataker file (net_*)
+# Returns times (secs since midnight of nday)
+# and values of the records with
+# nday < time <= nday + 1
+#--------------------------------------------
+def read_cnr4_file(path_file, nday, year_now, month_now, day_now, scal):
+
+    SBconst = 5.67e-8
+    A = 0.003908
+    B = -5.8019E-07  #A and B are coefficents to calculate T(K) from Pt100 resistance
+    epoch_offset = 719163
+    file_timesecs = []
+    file_vals = []
+
+    f = open(path_file, 'r')
+
+    #No header lines in raw file
+
+    # ---------------------------
+    # Repeated data for each time
+    # ---------------------------
+
+    while True:
+
+        line = f.readline()
+        if not line: break
+        #May need to change to handle change of year. Or maybe easier to just lose 1 point once a year?!
+        startnum = date2num(datetime.datetime(int(year_now),int(month_now),int(day_now),int(line[9:11]),int(line[12:14]),int(line[15:17])))
+        #print('startnum, nday = ',startnum, nday)
+        if startnum < 100000:
+            startnum = startnum + epoch_offset
+        if startnum > nday and startnum <= (nday + 1):
+            if len(line) > 175:
+                fdata = line.split(',')
+                date_time = fdata[0].split()
+                tsecs = 3600.0 * float(date_time[1][0:2]) + 60.0 * float(date_time[1][3:5]) + float(date_time[1][6:len(date_time[1])])
+                tempstr = fdata[19].split(';')
+                res = float(tempstr[0])/100.0    #Pt-100 resistance, div. by 100 to use in temperature equation
+                sensor_T = 273.15 + (((-1.0 * A) + np.sqrt(A**2 - (4.0 * B * (1.0 - res))))/(2.0 * B))
+                row = np.zeros((5))
+                row[4] = sensor_T
+                for m in range(4):
+                    row[m] = float(fdata[15 + m])/scal[m]
+                    if m%2.0 == 1.0:
+                        row[m] = row[m] + (SBconst * sensor_T**4)
+
+                if startnum == (nday + 1):  #If we're reading the first timestamp from the next day, add 86400 secs to time or it will be zero
+                    tsecs = tsecs + 86400.0
+                file_timesecs.append(tsecs)
+                file_vals.append(row)
+
+    f.close()
+
+    return np.array(file_timesecs), np.array(file_vals).reshape((len(file_vals),5))
+
+
+
 def generate_netcdf_cnr4_netflux(nday):
 
     datevals=generate_netcdf_common(nday)
@@ -2255,9 +2294,7 @@ def generate_netcdf_cnr4_netflux(nday):
     # Define various parameters
     # -------------------------
     Tk = 273.15
-    SBconst = 5.67e-8
-    A = 0.003908
-    B = -5.8019E-07  #A and B are coefficents to calculate T(K) from Pt100 resistance
+    #SBconst and the Pt100 coefficients are in read_cnr4_file
 
     #scal = load_bbrad_calibrations(nday)
     scal = np.zeros((nvar-1))
@@ -2271,9 +2308,11 @@ def generate_netcdf_cnr4_netflux(nday):
     # Initialize data arrays
     # This is general so could go in a function, but as it's short, leave it here for now
     # ----------------------
-    timesecs    = np.zeros((100000))
-    vals        = missing_value*np.ones((100000,nvar))
-    input_missing    = np.zeros((100000,nvar))
+    data = column_buffer.ColumnBuffer()	#Arrays grow as rows are read
+    data.add_column('timesecs')
+    data.add_column('vals', width=nvar, fill_value=missing_value)
+    data.add_column('input_missing', width=nvar, dtype=np.int8)
+    timesecs, vals, input_missing = data.reserve(0)
     valid_min_max = np.zeros((2,nvar))
 
     # -----------
@@ -2348,52 +2387,19 @@ def generate_netcdf_cnr4_netflux(nday):
 
 
         else:
+            infiles = []
             nfiles = 0
             print('No directory found')
 
-        for nf in range(nfiles):    #Indent from here
-            f = open(path_in+infiles[nf], 'r')
-
-            #No header lines in raw file
-
-            # ---------------------------
-            # Repeated data for each time
-            # ---------------------------
-
-            while True:
-
-                line = f.readline()
-                if not line: break
-                #startnum = int(date2num(datetime.datetime(int(datestring[0:4]),int(line[0:2]),int(line[3:5]),0,0,0)))
-                #print 'startnum, nday = ',startnum, nday
-                #if startnum == nday:
-                #May need to change to handle change of year. Or maybe easier to just lose 1 point once a year?!
-                startnum = date2num(datetime.datetime(int(year_now),int(month_now),int(day_now),int(line[9:11]),int(line[12:14]),int(line[15:17])))
-                #print('startnum, nday = ',startnum, nday)
-                if startnum < 100000:
-                    startnum = startnum + epoch_offset
-                if startnum > nday and startnum <= (nday + 1):
-                    if len(line) > 175:
-                        fdata = line.split(',')
-                        date_time = fdata[0].split()
-                        timesecs[n] = 3600.0 * float(date_time[1][0:2]) + 60.0 * float(date_time[1][3:5]) + float(date_time[1][6:len(date_time[1])])
-                        tempstr = fdata[19].split(';')
-                        res = float(tempstr[0])/100.0    #Pt-100 resistance, div. by 100 to use in temperature equation
-                        sensor_T = 273.15 + (((-1.0 * A) + np.sqrt(A**2 - (4.0 * B * (1.0 - res))))/(2.0 * B))
-                        vals[n,4] = sensor_T
-                        for m in range(4):
-                            vals[n,m] = float(fdata[15 + m])/scal[m]
-                            if m%2.0 == 1.0:
-                                vals[n,m] = vals[n,m] + (SBconst * sensor_T**4)
-
-                        if n == 0:
-                            print('First point = ', nday, timesecs[0], startnum, datestring_now)
-                        if startnum == (nday + 1):  #If we're reading the first timestamp from the next day, add 86400 secs to time or it will be zero
-                            timesecs[n] = timesecs[n] + 86400.0
-
-                        n += 1
-
-            f.close()
+        #Hourly files are read concurrently, then added in time (file) order
+        for file_timesecs, file_vals in read_hourly_files(read_cnr4_file, path_in, infiles[0:nfiles], nday, year_now, month_now, day_now, scal):
+            nrec = len(file_timesecs)
+            timesecs, vals, input_missing = data.reserve(n+nrec)	#Grows the arrays if the day has more rows
+            timesecs[n:n+nrec] = file_timesecs
+            vals[n:n+nrec,:] = file_vals
+            if n == 0 and nrec > 0:
+                print('First point = ', nday, timesecs[0], datestring_now)
+            n += nrec
 
         print('No. values from raw net flux files = ', n)
 
@@ -2401,10 +2407,8 @@ def generate_netcdf_cnr4_netflux(nday):
         # -------------------------------------
         # Trim arrays to remove unused elements
         # -------------------------------------
-        vals = vals[0:n,:]
+        timesecs, vals, input_missing = data.trimmed(n)
         #print('vals.shape = ',vals.shape)
-        timesecs   = timesecs[0:n]
-        input_missing = input_missing[0:n,:]
 
         #Assign values of input_missing depending on location of missing_value in vals array
         input_missing = np.where(vals == missing_value,1,0)
@@ -2572,9 +2576,11 @@ def generate_netcdf_sonic(nday):
     # ----------------------
     # Initialize data arrays
     # ----------------------
-    vals        = missing_value * np.ones((1800000,nvar))
-    timesecs    = np.zeros((1800000))
-    input_missing =  np.zeros((1800000,nvar))
+    data = column_buffer.ColumnBuffer()	#Arrays grow as rows are read
+    data.add_column('timesecs')
+    data.add_column('vals', width=nvar, fill_value=missing_value)
+    data.add_column('input_missing', width=nvar, dtype=np.int8)
+    timesecs, vals, input_missing = data.reserve(0)
     valid_min_max = np.zeros((2,nvar))
 
     # -----------
@@ -2638,6 +2644,7 @@ def generate_netcdf_sonic(nday):
                 print('No files on this day')
 
         else:
+            infiles = []
             nfiles = 0
             print('No directory found')
 
@@ -2646,43 +2653,15 @@ def generate_netcdf_sonic(nday):
         # ----------------------
         print('Starting to process raw data files')
 
-        for nf in range(nfiles):
-            f = open(path_in+infiles[nf], 'r')
-
-            #There are no header lines
-
-            # ---------------------------
-            # Repeated data for each time
-            # ---------------------------
-
-            while True:
-
-                line = f.readline()
-                if not line: break
-                #print fdata
-                fdata = line.split()
-                #print(len(line))
-                startnum = date2num(datetime.datetime(int(year_now),int(month_now),int(day_now),int(line[9:11]),int(line[12:14]),int(line[15:17])))
-                if startnum < 100000:
-                    startnum = startnum + epoch_offset
-                if startnum > nday and startnum <= (nday + 1):
-                    timesecs[n] = 3600.0*float(line[9:11]) + 60.0*float(line[12:14]) + float(line[15:21])
-                    if startnum == (nday + 1):  #If we're reading the first timestamp from the next day, add 86400 secs to time or it will be zero
-                        timesecs[n] = timesecs[n] + 86400.0
-                    if len(line) > 66:        # There's data in the line beyond the quantities we're writing to a file
-                        #fdata=fdatatmp[1].split(';')
-                        #print(line[9:21], ' ',line[24:32])
-                        if line[24:32] != '        ' and line[35:43] != '        ' and line[46:54] != '        ' and line[57:65] != '        ':
-                            vals[n,0] = float(line[24:32])     #Northward wind
-                            vals[n,1] = float(line[35:43])     #Eastward wind
-                            vals[n,2] = float(line[46:54])         #Upward
-                            vals[n,3] = float(line[57:65]) + 273.15   #Temperature (K)
-
-                        else:
-                            input_missing[n,:] = 1
-                    n += 1
-
-            f.close()
+        #Hourly files are read concurrently, then added in time (file) order. There are no header lines
+        #Each file is parsed in one go, keeping records with nday < time <= nday + 1
+        for file_timesecs, file_vals, file_missing in read_hourly_files(read_sonic_records.read_sonic_file, path_in, infiles[0:nfiles], nday, nday_file, missing_value):
+            nrec = len(file_timesecs)
+            timesecs, vals, input_missing = data.reserve(n+nrec)	#Grows the arrays if the day has more rows
+            timesecs[n:n+nrec] = file_timesecs
+            vals[n:n+nrec,:] = file_vals	#Northward, eastward, upward wind and temperature (K)
+            input_missing[n:n+nrec,:] = file_missing
+            n += nrec
 
         print('No. values from raw data files = ', n)
 
@@ -2690,9 +2669,7 @@ def generate_netcdf_sonic(nday):
         # -------------------------------------
         # Trim arrays to remove unused elements
         # -------------------------------------
-        vals = vals[0:n,:]
-        input_missing = input_missing[0:n,:]
-        timesecs   = timesecs[0:n]
+        timesecs, vals, input_missing = data.trimmed(n)
 
         print(timesecs[0:9])
         print(vals[0:9,0])
@@ -2851,40 +2828,35 @@ def generate_netcdf_common(nday_local):
 #--------------------------------------------
 def generate_netcdf_datetimeinfo(year,month,day,n,timesecs):
 
-    first_last_datetime = np.zeros((6,2),dtype = np.int32)      #Values to use in datetime.datetime, derived from time.gmtime
-    tt = (year,month,day,0,0,0,0,0,0)
-    tt_upper = (year,month,(day+1),0,0,0,0,0,0)
-    day_start_epoch = time.mktime(tt)
+    first_last_datetime = np.zeros((6,2),dtype = np.int32)      #Values to use in datetime.datetime, derived from the whole seconds of the epoch times
+    day_start_epoch = float(calendar.timegm((year,month,day,0,0,0)))   #UTC, whatever the local timezone
     yr_arr=np.zeros(n)+year
     mn_arr=np.zeros(n)+month
     dy_arr=np.zeros(n)+day
-    dyyr_arr=np.zeros(n)
-    epoch_timesecs=np.zeros(n)
-    hr_arr=np.zeros(n,dtype=np.int32)
-    mi_arr=np.zeros(n,dtype=np.int32)
-    sc_arr=np.zeros(n,dtype=np.float32)
     epoch_timesecs = day_start_epoch + timesecs
-    #In cases where parts of previous or next day are found in file, it would be best to derive the above from the data timestamp
-    for mm in range(n):
-        tt = time.gmtime(epoch_timesecs[mm])
-        hr_arr[mm] = np.int32(tt[3])
-        mi_arr[mm] = np.int32(tt[4])
-        sc_arr[mm] = timesecs[mm]-3600*hr_arr[mm]-60*mi_arr[mm]	#Keeps digits after decimal place, unlike tt[5] 
-        dyyr_arr[mm] = np.float32(tt[7]+timesecs[mm]/86400.0)
-        #If the last time is exactly midnight, we need different in
-        if timesecs[mm] == 86400.0:     #Point from midnight of the following day
-            sc_arr[mm] = sc_arr[mm] - 86400.0
-            hr_arr[mm] = 24
-            dyyr_arr[mm] = np.float32(tt[7])    #Will be number for next day
-        #These values are used for first, last times in the global attributes
-        #It's safer to derive them from the tt array, as using the arrays can cause problems with the datetime.datetime function
-        #if values aren't compatible, e.g. last hr_arr value being 24
-        if mm == 0:     #First point
-            for nn in range(6):
-                first_last_datetime[nn,0] = np.int32(tt[nn])
-        if mm == n-1:   #Last point
-            for nn in range(6):
-                first_last_datetime[nn,1] = np.int32(tt[nn])
+    #In cases where parts of previous or next day are found in file, the components are derived from the data timestamp
+    secs = np.asarray(timesecs[0:n],dtype=np.float64)
+    whole_secs = np.floor(epoch_timesecs[0:n]).astype(np.int64)	#As time.gmtime, fractions of a second dropped
+    days = whole_secs // 86400
+    secs_of_day = whole_secs - 86400*days
+    hr_arr = (secs_of_day // 3600).astype(np.int32)
+    mi_arr = (secs_of_day % 3600 // 60).astype(np.int32)
+    sc_arr = (secs - 3600*hr_arr - 60*mi_arr).astype(np.float32)	#Keeps digits after decimal place
+    dates = days.astype('datetime64[D]')
+    yday = (dates - dates.astype('datetime64[Y]').astype('datetime64[D]')).astype(np.int64) + 1
+    dyyr_arr = (yday + secs/86400.0).astype(np.float32).astype(np.float64)
+    #If the last time is exactly midnight, we need different info
+    midnight = secs == 86400.0     #Point from midnight of the following day
+    sc_arr[midnight] = sc_arr[midnight] - 86400.0
+    hr_arr[midnight] = 24
+    dyyr_arr[midnight] = yday[midnight]    #Will be number for next day
+    #These values are used for first, last times in the global attributes
+    #It's safer to derive them from the whole seconds, as using the arrays can cause problems with the datetime.datetime function
+    #if values aren't compatible, e.g. last hr_arr value being 24
+    if n > 0:
+        for col,mm in enumerate([0,n-1]):     #First, last point
+            ymd = str(dates[mm]).split('-')
+            first_last_datetime[:,col] = [int(ymd[0]),int(ymd[1]),int(ymd[2]),secs_of_day[mm] // 3600,secs_of_day[mm] % 3600 // 60,secs_of_day[mm] % 60]
 
     #print(np.amin(hr_arr),np.amax(hr_arr),np.amin(mi_arr),np.amax(mi_arr),np.amin(sc_arr),np.amax(sc_arr))
     #print(sc_arr)
@@ -2894,22 +2866,73 @@ def generate_netcdf_datetimeinfo(year,month,day,n,timesecs):
 
 
 
+#--------------------------------------------
+# Parse a corrections file into a table of
+# the entries for each day, in file order.
+# Tables are cached so each file is only read
+# once in a run (unless it changes)
+#--------------------------------------------
+corrections_cache = {}	#corr_file -> (mtime, {nday: [(line, t_start, t_end, correction string), ...]})
+
+def load_corrections_table(corr_file):
+
+    epoch_offset = 719163
+    mtime = os.stat(corr_file).st_mtime_ns
+    if corr_file in corrections_cache and corrections_cache[corr_file][0] == mtime:
+        return corrections_cache[corr_file][1]
+
+    table = {}
+    f = open(corr_file, 'r')
+    while True:	#Reading correction file, stops at the first blank line
+
+        line = f.readline().strip()
+        if not line: break
+        if len(line) == 30:	#Standard length for correction file
+            startnum = int(date2num(datetime.datetime(int(line[0:4]),int(line[4:6]),int(line[6:8]),0,0,0)))
+            if startnum < 100000:
+                startnum = startnum + epoch_offset
+            t_start = 3600.0*float(line[9:11]) + 60.0*float(line[11:13]) + float(line[13:15])
+            t_end   = 3600.0*float(line[16:18]) + 60.0*float(line[18:20]) + float(line[20:22])
+            table.setdefault(startnum, []).append((line, t_start, t_end, line[23:]))
+    f.close()
+
+    corrections_cache[corr_file] = (mtime, table)
+    return table
+
+
+#--------------------------------------------
+# Index of the point nearest to each time t,
+# the lower index if two are equally near
+# (the same as np.argmin(np.absolute(timesecs-t)))
+#--------------------------------------------
+def nearest_time_index(timesecs, t):
+
+    t = np.asarray(t, dtype=float)
+    if len(timesecs) == 0 or np.any(np.diff(timesecs) < 0) or np.any(np.isnan(timesecs)):	#Not in time order, search the whole array
+        return np.array([np.argmin(np.absolute(timesecs-tt)) for tt in np.atleast_1d(t)]).reshape(t.shape)
+
+    upper = np.clip(np.searchsorted(timesecs, t), 1, len(timesecs) - 1) if len(timesecs) > 1 else np.zeros(t.shape, dtype=int)
+    lower = np.maximum(upper - 1, 0)
+    nearest = np.where(np.absolute(timesecs[lower]-t) <= np.absolute(timesecs[upper]-t), lower, upper)
+    return np.searchsorted(timesecs, timesecs[nearest])	#First of any repeated times
+
+
 #--------------------------------------------
 # Reading corrections file 
 #--------------------------------------------
 def load_netcdf_corrections(nday, chids, n_values, t_interval, timesecs, vals):
 
-    epoch_offset = 719163
     n_chids = len(chids)
     qualflag = np.ones((n_values,n_chids), dtype = int)
     valid_min_max = np.zeros((2,n_chids))
+    timesecs = np.asarray(timesecs)
 
     for n_inst in range(n_chids):
         corr_file = '/data/netCDF/corrections/' + chids[n_inst] + '.corr'
         print('n_inst, corr_file = ', n_inst, corr_file)
 
         sub_vals = vals[:, n_inst]	#Data for each instrument in file
-        f = open(corr_file, 'r')
+        day_corrections = load_corrections_table(corr_file).get(nday, [])
 
         #Check for HMP155 purgetimes first, as want any points flagged as purge time to be superseded by baddata from a correction file if it exists
         #Get hmp155 purge times for oatnew_ch and rhnew_ch
@@ -2921,50 +2944,29 @@ def load_netcdf_corrections(nday, chids, n_values, t_interval, timesecs, vals):
             #print('start_purge, end_purge = ', start_purge, end_purge)
             qualflag[start_purge:(end_purge+1),n_inst] = 3
 
+        if len(day_corrections) > 0:
+            start_indices = nearest_time_index(timesecs, [corr[1] for corr in day_corrections])	#Time range in file is 0 to 86390
+            end_indices = nearest_time_index(timesecs, [corr[2] for corr in day_corrections])
+            is_raingauge = np.char.find(chids[n_inst],"rg") >= 0 or np.char.find(chids[n_inst],"disdrom") >= 0
 
-
-        while True:	#Reading correction file
-
-            line = f.readline().strip()
-            if not line: break
-            if len(line) == 30:	#Standard length for correction file
-            #if len(line) == 31:	#Standard length for correction file
-                startnum = int(date2num(datetime.datetime(int(line[0:4]),int(line[4:6]),int(line[6:8]),0,0,0)))
-                #print 'nday, startnum = ',nday, startnum
-                if startnum < 100000:
-                    startnum = startnum + epoch_offset
-                if startnum == nday:
-                    #print(len(line), line)
-                    print(line.strip())
-                    t_start = 3600.0*float(line[9:11]) + 60.0*float(line[11:13]) + float(line[13:15])
-                    t_end   = 3600.0*float(line[16:18]) + 60.0*float(line[18:20]) + float(line[20:22])
-               	    #print(t_start, t_end, t_interval)
-               	    #start_index = int(round(t_start/t_interval))	#Time range in file is 0 to 86390 
-                    #end_index = int(round(t_end/t_interval))	#Don't think we need +1 here to round up.
-               	    start_index = np.argmin(np.absolute(timesecs-t_start))	#Time range in file is 0 to 86390 
-                    end_index = np.argmin(np.absolute(timesecs-t_end))	#Time range in file is 0 to 86390 
-                    #end_index = np.where(t_end == timesecs)		#Don't think we need +1 here to round up.
-                    #print('Correction start, end index, no. values in file = ',start_index, end_index, n_values)
-                    if end_index >= (n_values-2):       #May be rounding errors with max. index so reduce if necessary. Also avoid last point in day being missed.
-                        end_index = n_values - 1
-                    if start_index == 1:        #Avoid having 1 single point remaining at start of day
-                        start_index = 0
-                    #print(start_index, end_index, n_values)
-                    instring = line[23:]
-                    if np.char.equal(instring,'HOLDCAL'):
-                        if np.char.find(chids[n_inst],"rg") >= 0 or np.char.find(chids[n_inst],"disdrom") >= 0:
-                            #print("qualflag for a raingauge")	#For a raingauge, only flag values as HOLDCAL if they're > 0
-                            for flag_ind in range((end_index-start_index+1)):
-                                #Set qualflag to 3 if the data value is greater than 0 and the flag isn't already set to 2 (BADDATA) from a previous line
-                                if sub_vals[flag_ind+start_index] > 0 and qualflag[(flag_ind+start_index),n_inst] <= 1:
-                                    qualflag[(flag_ind+start_index),n_inst] = 3
-                                    #print(flag_ind+start_index, sub_vals[flag_ind+start_index])
-
-                    if np.char.equal(instring,'BADDATA'):
-                        qualflag[start_index:(end_index+1),n_inst] = 2	#Need end_index+1 to make change all points from start_index to (and including) end_index
-                    print('Correction t_start(s), t_end(s), start_index, end_index, correction string = ', t_start, t_end, start_index, end_index, instring)
-
-        f.close()
+        #Apply the day's corrections in file order, as a later BADDATA overrides an earlier HOLDCAL
+        for n_corr in range(len(day_corrections)):
+            line, t_start, t_end, instring = day_corrections[n_corr]
+            print(line)
+            start_index = int(start_indices[n_corr])
+            end_index = int(end_indices[n_corr])
+            if end_index >= (n_values-2):       #May be rounding errors with max. index so reduce if necessary. Also avoid last point in day being missed.
+                end_index = n_values - 1
+            if start_index == 1:        #Avoid having 1 single point remaining at start of day
+                start_index = 0
+            if instring == 'HOLDCAL' and is_raingauge:
+                #For a raingauge, only flag values as HOLDCAL if they're > 0
+                #and the flag isn't already set to 2 (BADDATA) from a previous line
+                flags = qualflag[start_index:(end_index+1),n_inst]
+                flags[(sub_vals[start_index:(end_index+1)] > 0) & (flags <= 1)] = 3
+            if instring == 'BADDATA':
+                qualflag[start_index:(end_index+1),n_inst] = 2	#Need end_index+1 to make change all points from start_index to (and including) end_index
+            print('Correction t_start(s), t_end(s), start_index, end_index, correction string = ', t_start, t_end, start_index, end_index, instring)
 
         vals_ok = sub_vals[np.where(qualflag[:,n_inst] == 1)]
         if len(vals_ok) > 0:
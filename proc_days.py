@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+"""
+# Generate and purge-flag HMP155 NetCDF files for a range of days in one process
+"""
+
+import os
+import argparse
+import importlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from flag_purge_times import flag_purge_times, read_day_data
+
+# Processing module for each data source
+SOURCES = {
+    "cr1000x": "process_hmp155",
+    "f5": "process_hmp155_f5",
+    "stfc": "process_hmp155_stfc",
+}
+
+DAYS_PER_WORKER = 8  # Days given to each worker per block in parallel mode
+
+
+def raw_file(source, raw_data_base, date):
+    """
+    Returns the path of the raw data file for a day, laid out as the proc_year*.sh scripts expect.
+    """
+    if source == "f5":
+        return os.path.join(raw_data_base, f"chan{date:%y%m%d}.000")
+    return os.path.join(raw_data_base, f"{date:%Y}", f"{date:%Y%m}",
+                        f"CR1000XSeries_Chilbolton_Rxcabinmet1_{date:%Y%m%d}.dat")
+
+
+def process_day(process_module, infile, outdir, metadata_file, previous_ds=None,
+                corr_file_temperature=None, corr_file_rh=None):
+    """
+    Generates the NetCDF file for one day and flags its purge times.
+
+    Returns (ncfile, day_data), where day_data is the day's data to pass as
+    previous_ds for the next day.
+    """
+    ncfile = process_module.main(infile, outdir=outdir, metadata_file=metadata_file)
+    day_data = flag_purge_times(ncfile, corr_file_temperature=corr_file_temperature,
+                                corr_file_rh=corr_file_rh, previous_ds=previous_ds)
+    return ncfile, day_data
+
+
+def generate_day(source, infile, outdir, metadata_file):
+    """
+    Generates the NetCDF file for one day, without purge flagging.
+
+    Returns (ncfile, day_data), where day_data is the day's data to pass as
+    previous_ds when flagging the next day.
+    """
+    process_module = importlib.import_module(SOURCES[source])
+    ncfile = process_module.main(infile, outdir=outdir, metadata_file=metadata_file)
+    return ncfile, read_day_data(ncfile)
+
+
+def flag_day(ncfile, previous_ds=None, corr_file_temperature=None, corr_file_rh=None):
+    """
+    Flags the purge times of one day's NetCDF file. Returns the file name.
+    """
+    flag_purge_times(ncfile, corr_file_temperature=corr_file_temperature,
+                     corr_file_rh=corr_file_rh, previous_ds=previous_ds)
+    return ncfile
+
+
+def day_range(start, end):
+    """
+    Returns the days from start to end (YYYYMMDD, inclusive).
+    """
+    current_date = datetime.strptime(start, "%Y%m%d")
+    end_date = datetime.strptime(end, "%Y%m%d")
+    days = []
+    while current_date <= end_date:
+        days.append(current_date)
+        current_date += timedelta(days=1)
+    return days
+
+
+def day_inputs(source, raw_data_base, outdir, current_date):
+    """
+    Returns the raw data file and the output directory (outdir/YYYY) for a day,
+    or None for the raw file if it doesn't exist.
+    """
+    infile = raw_file(source, raw_data_base, current_date)
+    year_outdir = os.path.join(outdir, f"{current_date:%Y}")
+    os.makedirs(year_outdir, exist_ok=True)
+
+    if not os.path.isfile(infile):
+        print(f"WARNING: Raw data file {infile} not found. Skipping {current_date:%Y%m%d}.")
+        return None, year_outdir
+    return infile, year_outdir
+
+
+def main(start, end, source, raw_data_base, outdir, metadata_file,
+         corr_file_temperature=None, corr_file_rh=None, workers=1):
+    """
+    Processes each day from start to end (YYYYMMDD, inclusive). Output goes to
+    outdir/YYYY. The previous day's data are passed on in memory for the purge time
+    consistency check rather than being read back from its file.
+
+    With more than one worker the days are processed in parallel (see main_parallel).
+    """
+    if workers > 1:
+        return main_parallel(start, end, source, raw_data_base, outdir, metadata_file,
+                             corr_file_temperature=corr_file_temperature,
+                             corr_file_rh=corr_file_rh, workers=workers)
+
+    process_module = importlib.import_module(SOURCES[source])
+    previous_ds = None
+    ncfiles = []
+
+    for current_date in day_range(start, end):
+        infile, year_outdir = day_inputs(source, raw_data_base, outdir, current_date)
+        if infile is None:
+            continue
+        try:
+            ncfile, previous_ds = process_day(process_module, infile, year_outdir, metadata_file,
+                                              previous_ds=previous_ds,
+                                              corr_file_temperature=corr_file_temperature,
+                                              corr_file_rh=corr_file_rh)
+            ncfiles.append(ncfile)
+        except Exception as e:
+            print(f"WARNING: Processing {current_date:%Y%m%d} failed: {e}")
+
+    return ncfiles
+
+
+def main_parallel(start, end, source, raw_data_base, outdir, metadata_file,
+                  corr_file_temperature=None, corr_file_rh=None, workers=2):
+    """
+    Processes the days from start to end across a pool of worker processes, in
+    blocks of days so that only a block's data are held in memory at once.
+
+    Stage 1 generates each day's NetCDF file in parallel and reads back its data.
+    Stage 2 then pairs each day with the last successfully generated day before it,
+    in date order, and flags the purge times. As each day is given its previous
+    day's data in memory, the flagging also runs in parallel, and the flags are the
+    same as processing the days one after the other.
+    """
+    days = day_range(start, end)
+    block_size = workers * DAYS_PER_WORKER
+    previous_ds = None
+    ncfiles = []
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for first in range(0, len(days), block_size):
+            block = days[first:first + block_size]
+
+            # Stage 1: generate the files
+            futures = {}
+            for current_date in block:
+                infile, year_outdir = day_inputs(source, raw_data_base, outdir, current_date)
+                if infile is not None:
+                    futures[current_date] = executor.submit(generate_day, source, infile, year_outdir, metadata_file)
+            generated = {}
+            for current_date, future in futures.items():
+                try:
+                    generated[current_date] = future.result()
+                except Exception as e:
+                    print(f"WARNING: Processing {current_date:%Y%m%d} failed: {e}")
+
+            # Stage 2: flag the purge times, handing each day's data on to the next day in date order
+            futures = {}
+            for current_date in block:
+                if current_date not in generated:
+                    continue
+                ncfile, day_data = generated[current_date]
+                futures[current_date] = executor.submit(flag_day, ncfile, previous_ds=previous_ds,
+                                                        corr_file_temperature=corr_file_temperature,
+                                                        corr_file_rh=corr_file_rh)
+                previous_ds = day_data
+            for current_date, future in futures.items():
+                try:
+                    ncfiles.append(future.result())
+                except Exception as e:
+                    print(f"WARNING: Flagging {current_date:%Y%m%d} failed: {e}")
+
+    return ncfiles
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate and purge-flag HMP155 NetCDF files for a range of days")
+    parser.add_argument("-s", "--start", required=True, help="First day (YYYYMMDD)")
+    parser.add_argument("-e", "--end", required=True, help="Last day (YYYYMMDD)")
+    parser.add_argument("--source", choices=sorted(SOURCES), default="cr1000x", help="Raw data source (default: cr1000x)")
+    parser.add_argument("-r", "--raw_data_base", required=True, help="Base directory of the raw data")
+    parser.add_argument("-o", "--outdir", default="./", help="Output directory, files go in a YYYY subdirectory")
+    parser.add_argument("-m", "--metadata_file", default="metadata.json", help="Metadata file")
+    parser.add_argument("--corr_file_temperature", type=str, default=None, help="Correction file with BADDATA intervals for air temperature")
+    parser.add_argument("--corr_file_rh", type=str, default=None, help="Correction file with BADDATA intervals for relative humidity")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="Number of worker processes (default: 1, one day after another)")
+    args = parser.parse_args()
+
+    main(args.start, args.end, args.source, args.raw_data_base, args.outdir, args.metadata_file,
+         corr_file_temperature=args.corr_file_temperature, corr_file_rh=args.corr_file_rh,
+         workers=args.workers)
@@ -2,13 +2,15 @@
 
 # Default values
 year=""
+workers=1
 
 # Parse command line options
-while getopts "y:" opt; do
+while getopts "y:w:" opt; do
     case $opt in
         y) year="$OPTARG" ;;
+        w) workers="$OPTARG" ;;
         *)  
-            echo "Usage: $0 -y <year>"
+            echo "Usage: $0 -y <year> [-w <workers>]"
             exit 1
             ;;
     esac
@@ -32,46 +34,14 @@ end_date="${year}1231"
 source ~/anaconda3/etc/profile.d/conda.sh  # or wherever your conda is installed
 conda activate cao_3_11
 
-current_date=$start_date
-while [ "$current_date" -le "$end_date" ]; do
-
-    YMD=$(date -d "$current_date" +%y%m%d)
-    outdir="/gws/pw/j07/ncas_obs_vol2/cao/processing/ncas-temperature-rh-1/data/long-term/level1_f5/$year"
-
-    mkdir -p "$outdir"
-
-    # Calculate the previous day's date
-    previous_date=$(date -d "$current_date - 1 day" +%Y%m%d)
-    previous_year=$(date -d "$current_date - 1 day" +%Y)
-
-    # Construct paths to the current and previous day's files
-    infile="$raw_data_base/chan${YMD}.000"
-
-    mfile="/home/users/cjwalden/git/ncas-temperature-rh-1-software/metadata_f5.json"
-    corr_file_oat="/gws/pw/j07/ncas_obs_vol2/cao/raw_data/met_cao/data/long-term/corrections/oatnew_ch.corr"
-    corr_file_rh="/gws/pw/j07/ncas_obs_vol2/cao/raw_data/met_cao/data/long-term/corrections/rhnew_ch.corr"
-
-    # Run the Python script
-    python ~/git/ncas-temperature-rh-1-software/process_hmp155_f5.py "$infile" \
-               -m "$mfile" -o "$outdir"
-
-        # Path to the generated NetCDF file
-    ncfile="$outdir/ncas-temperature-rh-1_cao_${current_date}_surface-met_v1.0.nc"
-
-    # Add QC flags for purge times
-    if [ -f "$ncfile" ]; then
-        if [ -z "$previous_ncfile" ]; then
-            # No previous file for the first day
-            python ~/git/ncas-temperature-rh-1-software/flag_purge_times.py -f "$ncfile" --corr_file_temperature "$corr_file_oat" --corr_file_rh "$corr_file_rh"
-        else
-            # Use the previous day's file for consistency checks
-            python ~/git/ncas-temperature-rh-1-software/flag_purge_times.py -f "$ncfile" -p "$previous_ncfile"  --corr_file_temperature "$corr_file_oat" --corr_file_rh "$corr_file_rh"
-        fi
-        # Update the previous file to the current file
-        previous_ncfile="$ncfile"
-    else
-        echo "Warning: NetCDF file $ncfile not found. Skipping QC flagging."
-    fi
-
-    current_date=$(date -d "$current_date + 1 day" +%Y%m%d)
-done
+mfile="/home/users/cjwalden/git/ncas-temperature-rh-1-software/metadata_f5.json"
+outdir="/gws/pw/j07/ncas_obs_vol2/cao/processing/ncas-temperature-rh-1/data/long-term/level1_f5"
+corr_file_oat="/gws/pw/j07/ncas_obs_vol2/cao/raw_data/met_cao/data/long-term/corrections/oatnew_ch.corr"
+corr_file_rh="/gws/pw/j07/ncas_obs_vol2/cao/raw_data/met_cao/data/long-term/corrections/rhnew_ch.corr"
+
+# Generate NetCDF files and add QC flags for purge times for every day in one process,
+# each day using the previous day's purge times for consistency checks.
+# With -w the days are spread over that many worker processes
+python ~/git/ncas-temperature-rh-1-software/proc_days.py --start "$start_date" --end "$end_date" \
+           --source f5 -r "$raw_data_base" -m "$mfile" -o "$outdir" -w "$workers" \
+           --corr_file_temperature "$corr_file_oat" --corr_file_rh "$corr_file_rh"
@@ -2,13 +2,15 @@
 
 # Default values
 year=""
+workers=1
 
 # Parse command line options
-while getopts "y:" opt; do
+while getopts "y:w:" opt; do
     case $opt in
         y) year="$OPTARG" ;;
+        w) workers="$OPTARG" ;;
         *)  
-            echo "Usage: $0 -y <year>"
+            echo "Usage: $0 -y <year> [-w <workers>]"
             exit 1
             ;;
     esac
@@ -32,42 +34,11 @@ end_date="${year}1231"
 source ~/anaconda3/etc/profile.d/conda.sh  # or wherever your conda is installed
 conda activate cao_3_11
 
-current_date=$start_date
-previous_ncfile=""  # Initialize variable to store the previous day's NetCDF file
+mfile="/home/users/cjwalden/git/ncas-temperature-rh-1-software/metadata_stfc.json"
+outdir="/gws/pw/j07/ncas_obs_vol2/cao/processing/ncas-temperature-rh-1/data/long-term/level1"
 
-while [ "$current_date" -le "$end_date" ]; do
-
-    YM=$(date -d "$current_date" +%Y%m)
-    outdir="/gws/pw/j07/ncas_obs_vol2/cao/processing/ncas-temperature-rh-1/data/long-term/level1/$year"
-
-    mkdir -p "$outdir"
-
-    # Construct paths to the current day's files
-    infile="$raw_data_base/$year/$YM/CR1000XSeries_Chilbolton_Rxcabinmet1_${current_date}.dat"
-    mfile="/home/users/cjwalden/git/ncas-temperature-rh-1-software/metadata_stfc.json"
-
-    # Generate NetCDF file
-    python ~/git/ncas-temperature-rh-1-software/process_hmp155_stfc.py "$infile" \
-               -m "$mfile" -o "$outdir"
-
-    # Path to the generated NetCDF file
-    ncfile="$outdir/stfc-temperature-rh-1_cao_${current_date}_surface-met_v1.0.nc"
-
-    # Add QC flags for purge times
-    if [ -f "$ncfile" ]; then
-        if [ -z "$previous_ncfile" ]; then
-            # No previous file for the first day
-            python ~/git/ncas-temperature-rh-1-software/flag_purge_times.py -f "$ncfile"
-        else
-            # Use the previous day's file for consistency checks
-            python ~/git/ncas-temperature-rh-1-software/flag_purge_times.py -f "$ncfile" -p "$previous_ncfile"
-        fi
-        # Update the previous file to the current file
-        previous_ncfile="$ncfile"
-    else
-        echo "Warning: NetCDF file $ncfile not found. Skipping QC flagging."
-    fi
-
-    # Move to the next day
-    current_date=$(date -d "$current_date + 1 day" +%Y%m%d)
-done
+# Generate NetCDF files and add QC flags for purge times for every day in one process,
+# each day using the previous day's purge times for consistency checks.
+# With -w the days are spread over that many worker processes
+python ~/git/ncas-temperature-rh-1-software/proc_days.py --start "$start_date" --end "$end_date" \
+           --source stfc -r "$raw_data_base" -m "$mfile" -o "$outdir" -w "$workers"
@@ -53,6 +53,13 @@ def preprocess_data(infile):
             print(f"Column '{col}' missing, filling with null.")
             df = df.with_columns(pl.lit(None).alias(col))
     df = df.select(keep)
+    return scale_values(df)
+
+
+def scale_values(df):
+    """
+    Converts the raw Air_T_Avg and RH_Avg logger values to K and %.
+    """
     # Convert types
     scale_factor_Air_T = 0.02
     offset_Air_T = 233.15  # Offset for temperature in Kelvin
@@ -183,6 +190,8 @@ def main(infile, outdir="./", metadata_file="metadata.json", aws_7_file=None):
     nc.close()
     nant.remove_empty_variables.main(file_name)
 
+    return file_name
+
 
 def none_or_str(value):
     if value == 'None':
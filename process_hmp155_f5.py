@@ -47,8 +47,8 @@ def preprocess_data_f5(infile):
     # Step 1: Use read_format5_header to extract the header
     header = read_format5_header(infile)
 
-    # Step 2: Use read_format5_content to read and process the file
-    df = read_format5_content(infile, header)
+    # Step 2: Use read_format5_content to read just the HMP155 channels from the file
+    df = read_format5_content(infile, header, chids=["oatnew_ch", "rhnew_ch"])
 
     print(df)
 
@@ -217,6 +217,8 @@ def main(infile, outdir="./", metadata_file="metadata.json", aws_7_file=None):
     nc.close()
     nant.remove_empty_variables.main(file_name)
 
+    return file_name
+
 
 def none_or_str(value):
     if value == 'None':
@@ -0,0 +1,255 @@
+"""
+# Process today's Vaisala HMP155A CR1000X data to netCDF incrementally, for near-real-time output
+
+Each run reads only the rows added to the .dat file since the last run (from the
+byte offset kept in a state file) and appends them to the day's netCDF file,
+which has an unlimited time dimension. Rows are split by UTC day, a day's file
+holding the rows after its midnight up to and including the next one, and the
+next day's file is created when its first row arrives. The live files are named
+as process_hmp155.py's daily product with a _live suffix, so regenerating the
+day's file in full with process_hmp155.py leaves them alone. Run it every few
+minutes from cron; a run that starts while the last one still holds the lock on
+the state file leaves the new rows to the next run.
+"""
+
+import io
+import os
+import json
+import shutil
+import argparse
+import tempfile
+import numpy as np
+import polars as pl
+from netCDF4 import Dataset
+import ncas_amof_netcdf_template as nant
+from process_hmp155 import scale_values
+from atomic_write import atomic_write_json, exclusive_lock
+
+HEADER_LINES = 4  # TOA5 header: file info, field names, units, processing
+KEEP = ["TIMESTAMP", "Air_T_Avg", "RH_Avg"]
+TIME_UNITS = "seconds since 1970-01-01 00:00:00"
+KEEP_FILES = 2  # Days of netCDF files remembered in the state, for rows arriving late
+LIVE_SUFFIX = "_live"  # Added to the daily product's file name
+
+
+def state_path(infile, outdir):
+    """
+    Returns the path of the state file kept in outdir for an input file.
+    """
+    return os.path.join(outdir, f".{os.path.basename(infile)}.live.json")
+
+
+def load_state(path):
+    try:
+        with open(path, "r") as fid:
+            return json.load(fid)
+    except (OSError, ValueError):
+        return None
+
+
+def save_state(path, state):
+    atomic_write_json(path, state)
+
+
+def read_new_rows(infile, state):
+    """
+    Reads the complete lines added to infile since state["offset"] (a line still
+    being written is left for the next run). On the first run the TOA5 header is
+    read and its field names kept in the state.
+
+    Returns (df, offset): the new rows with TIMESTAMP, Air_T_Avg and RH_Avg
+    scaled as in process_hmp155.py, and the byte offset to read from next time.
+    """
+    with open(infile, "rb") as fid:
+        if state.get("field_names") is None:
+            header = [fid.readline() for _ in range(HEADER_LINES)]
+            if not header[-1].endswith(b"\n"):
+                return None, 0  # The header isn't complete yet
+            state["field_names"] = header[1].decode("ascii").strip()
+            state["offset"] = fid.tell()
+        fid.seek(state["offset"])
+        block = fid.read()
+
+    block = block[:block.rfind(b"\n") + 1]
+    offset = state["offset"] + len(block)
+    if not block:
+        return None, offset
+
+    df = pl.read_csv(
+        io.BytesIO(state["field_names"].encode("ascii") + b"\n" + block),
+        columns=KEEP,
+        try_parse_dates=True,
+        ignore_errors=True
+    )
+    df = df.filter(pl.col("TIMESTAMP").is_not_null())
+    return scale_values(df), offset
+
+
+def time_values(timestamps):
+    """
+    Returns the AMOF time variables for the timestamps (datetime64, UTC).
+    """
+    seconds = timestamps.astype("datetime64[s]")
+    years = seconds.astype("datetime64[Y]")
+    months = seconds.astype("datetime64[M]")
+    days = seconds.astype("datetime64[D]")
+    second_of_day = (seconds - days).astype(np.int64)
+    return {
+        "time": seconds.astype(np.int64).astype(np.float64),
+        "day_of_year": (seconds - years.astype("datetime64[s]")).astype(np.int64) / 86400.0 + 1,
+        "year": years.astype(np.int64) + 1970,
+        "month": (months - years.astype("datetime64[M]")).astype(np.int64) + 1,
+        "day": (days - months.astype("datetime64[D]")).astype(np.int64) + 1,
+        "hour": second_of_day // 3600,
+        "minute": second_of_day % 3600 // 60,
+        "second": (second_of_day % 60).astype(np.float64),
+    }
+
+
+def append_variable(nc, name, start, values):
+    """
+    Writes values to a variable from index start along time and widens its
+    valid_min/valid_max to cover them.
+    """
+    var = nc.variables[name]
+    values = np.asarray(values)
+    if values.dtype.kind == "f":
+        values = np.ma.masked_invalid(values)
+    var[start:start + len(values)] = values
+
+    if values.dtype.kind == "f" and values.mask.all():
+        return
+    for attr, reduce in (("valid_min", np.min), ("valid_max", np.max)):
+        if attr not in var.ncattrs():
+            continue
+        value = reduce(values)
+        if start > 0:
+            # The attributes were set by earlier runs, before that they are the template's placeholders
+            value = reduce([value, var.getncattr(attr)])
+        var.setncattr(attr, np.asarray(value, dtype=var.dtype))
+
+
+def file_days(timestamps):
+    """
+    Returns the day (datetime64[D]) of the file each timestamp belongs in: the
+    day after the midnight before it, so a row at midnight stays with the day
+    that ends there.
+    """
+    return (timestamps - np.timedelta64(1, "us")).astype("datetime64[D]")
+
+
+def create_live_netcdf(timestamps, day, outdir, metadata_file):
+    """
+    Creates the live netCDF file for a day with an unlimited time dimension and
+    returns its path. If the day's live file is already there, it is kept and
+    its path returned.
+    """
+    # Created out of the way, as the template names it as the daily product
+    file_date = str(day).replace("-", "")
+    tmp_dir = tempfile.mkdtemp(dir=outdir, prefix=".live-")
+    try:
+        nc = nant.create_netcdf.main("ncas-temperature-rh-1", date=file_date,
+                                     dimension_lengths={"time": None},  # None makes time unlimited
+                                     products="surface-met", file_location=tmp_dir,
+                                     product_version="1.0")
+        if isinstance(nc, list):
+            print("[WARNING] Unexpectedly got multiple netCDFs returned from nant.create_netcdf.main, just using first file...")
+            nc = nc[0]
+
+        nant.util.add_metadata_to_netcdf(nc, metadata_file)
+        nc.variables["time"].setncattr("units", TIME_UNITS)
+        nc.setncattr("time_coverage_start", str(timestamps[0].astype("datetime64[s]")))
+
+        tmp_name = nc.filepath()
+        nc.close()
+
+        root, ext = os.path.splitext(os.path.basename(tmp_name))
+        file_name = os.path.join(outdir, root + LIVE_SUFFIX + ext)
+        if not os.path.isfile(file_name):
+            os.replace(tmp_name, file_name)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return file_name
+
+
+def append_rows(ncfile, df, timestamps):
+    """
+    Appends the rows after the last time already in ncfile to it.
+    """
+    with Dataset(ncfile, mode="a") as nc:
+        start = len(nc.dimensions["time"])
+
+        # Leave out rows at or before the last time already written
+        if start > 0:
+            new = timestamps.astype("datetime64[s]").astype(np.int64) > nc.variables["time"][start - 1]
+            df, timestamps = df.filter(pl.Series(new)), timestamps[new]
+
+        if len(timestamps) > 0:
+            for name, values in time_values(timestamps).items():
+                append_variable(nc, name, start, values)
+            append_variable(nc, "air_temperature", start, df["Air_T_Avg"].to_numpy())
+            append_variable(nc, "relative_humidity", start, df["RH_Avg"].to_numpy())
+
+            nc.setncattr("time_coverage_end", str(timestamps[-1].astype("datetime64[s]")))
+            print(f"[INFO] Appended {len(timestamps)} rows to {ncfile}")
+
+
+def main(infile, outdir="./", metadata_file="metadata.json"):
+    """
+    Appends the rows added to infile since the last run to their day's netCDF
+    file, creating it when the day's first row arrives. Returns the latest
+    netCDF file name, or None if there is nothing yet or another run is still
+    going.
+    """
+    path = state_path(infile, outdir)
+
+    # The state and the netCDF files are only read and written under the lock
+    with exclusive_lock(path + ".lock", blocking=False) as locked:
+        if not locked:
+            print(f"[INFO] Another run is still processing {infile}, leaving the new rows for the next run.")
+            return None
+        return _append_new_rows(infile, outdir, metadata_file, path)
+
+
+def _append_new_rows(infile, outdir, metadata_file, path):
+    state = load_state(path)
+    size = os.path.getsize(infile)
+    if state is None or state.get("infile") != os.path.abspath(infile) or size < state.get("offset", 0):
+        if state is not None:
+            print(f"[INFO] {infile} is new or has been replaced, starting again from its first row.")
+        state = {"infile": os.path.abspath(infile), "offset": 0, "field_names": None, "ncfile": None, "ncfiles": {}}
+
+    df, offset = read_new_rows(infile, state)
+    if df is None or df.height == 0:
+        state["offset"] = offset
+        save_state(path, state)
+        return state["ncfile"]
+
+    timestamps = df["TIMESTAMP"].to_numpy().astype("datetime64[us]")
+    days = file_days(timestamps)
+
+    ncfiles = state.setdefault("ncfiles", {})
+    for day in np.unique(days):
+        in_day = days == day
+        key = str(day)
+        if key not in ncfiles or not os.path.isfile(ncfiles[key]):
+            ncfiles[key] = create_live_netcdf(timestamps[in_day], day, outdir, metadata_file)
+        append_rows(ncfiles[key], df.filter(pl.Series(in_day)), timestamps[in_day])
+        state["ncfile"] = ncfiles[key]
+
+    for key in sorted(ncfiles)[:-KEEP_FILES]:
+        del ncfiles[key]
+
+    state["offset"] = offset
+    save_state(path, state)
+    return state["ncfile"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append new Vaisala HMP155 data from today's CR1000X file to a live netCDF file")
+    parser.add_argument("infile", type=str, help="Input file")
+    parser.add_argument("-o", "--outdir", type=str, default="./", help="Output directory")
+    parser.add_argument("-m", "--metadata_file", type=str, default="metadata.json", help="Metadata file")
+    args = parser.parse_args()
+
+    main(args.infile, outdir=args.outdir, metadata_file=args.metadata_file)
@@ -234,6 +234,8 @@ def main(infile, outdir="./", metadata_file="metadata_stfc.json", aws_7_file=Non
     nc.close()
     nant.remove_empty_variables.main(file_name)
 
+    return file_name
+
 
 def none_or_str(value):
     if value == 'None':
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+"""
+# Track the drift of the HMP155 purge times across many days
+
+Reads the purge periods (qc_flag_air_temperature == 3) of every daily file in a
+date range, in parallel, follows each daily purge from day to day and fits its
+drift (e.g. the logger clock drift that manual_flag_purge_times.py --shift-seconds
+makes up for). The result is a table of the predicted purge window for each day,
+which flag_purge_times.py and manual_flag_purge_times.py can read with --windows.
+"""
+
+import os
+import re
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import polars as pl
+from netCDF4 import Dataset
+from qc_summary import find_netcdf_files, netcdf_times
+from run_length import true_runs
+
+FLAG_PURGE = 3
+MATCH_SECONDS = 60 * 60   # A purge continues a track if it starts within 60 minutes of its last start
+MIN_FIT_DAYS = 3          # Fewest days to fit a drift from, otherwise the track's median is used
+EXTRAPOLATE_DAYS = 7      # Days after a track was last seen that it is still predicted for
+SECONDS_PER_DAY = 86400
+FILE_DATE_REGEX = re.compile(r"_(\d{8})_")
+
+
+def file_purge_intervals(path):
+    """
+    Returns the purge periods of a daily file as (date, start, end) tuples: the
+    date of the start as YYYY-MM-DD and the start and end (last purge sample) as
+    seconds since that midnight, including fractions.
+    """
+    try:
+        with Dataset(path, mode="r") as nc:
+            if "qc_flag_air_temperature" not in nc.variables:
+                return []
+            times = netcdf_times(nc.variables["time"])
+            flags = np.ma.filled(nc.variables["qc_flag_air_temperature"][:], 0)
+    except Exception as e:
+        print(f"WARNING: Failed to read {path}: {e}")
+        return []
+
+    order = np.argsort(times, kind="stable")
+    times, flags = times[order], flags[order]
+    starts, ends = true_runs(flags == FLAG_PURGE)
+
+    intervals = []
+    for start, end in zip(times[starts], times[ends - 1]):
+        midnight = start.astype("datetime64[D]")
+        intervals.append((str(midnight),
+                          (start - midnight) / np.timedelta64(1, "s"),
+                          (end - midnight) / np.timedelta64(1, "s")))
+    return intervals
+
+
+def collect_intervals(paths, workers=None):
+    """
+    Reads the purge periods of many files in parallel. Returns a list of
+    (date, start, end) sorted by date and start.
+    """
+    intervals = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for file_intervals in executor.map(file_purge_intervals, paths, chunksize=16):
+            intervals.extend(file_intervals)
+    return sorted(intervals)
+
+
+def circular_difference(a, b):
+    """
+    Returns a - b in seconds, wrapped into [-12 h, 12 h).
+    """
+    return (a - b + SECONDS_PER_DAY / 2) % SECONDS_PER_DAY - SECONDS_PER_DAY / 2
+
+
+def track_purges(intervals):
+    """
+    Follows each daily purge from day to day: a purge joins the track whose last
+    start is nearest to it (within MATCH_SECONDS), or starts a new track. Start
+    times are unwrapped along a track so a purge drifting over midnight stays in it.
+
+    Returns:
+        list of dicts: days (day numbers), starts and durations of each track.
+    """
+    tracks = []
+    for date, start, end in intervals:
+        day = np.datetime64(date, "D").astype(np.int64)
+        best, best_diff = None, MATCH_SECONDS
+        for track in tracks:
+            if track["days"][-1] == day:
+                continue  # Only one purge per track per day
+            diff = circular_difference(start, track["starts"][-1])
+            if abs(diff) <= best_diff:
+                best, best_diff = track, abs(diff)
+        if best is None:
+            tracks.append({"days": [day], "starts": [start], "durations": [end - start]})
+        else:
+            best["days"].append(day)
+            best["starts"].append(best["starts"][-1] + circular_difference(start, best["starts"][-1]))
+            best["durations"].append(end - start)
+    return tracks
+
+
+def fit_drift(days, starts):
+    """
+    Fits start = offset + drift * day, rejecting outliers once.
+    Returns (offset, drift) with drift in seconds per day.
+    """
+    days = np.asarray(days, dtype=np.float64)
+    starts = np.asarray(starts, dtype=np.float64)
+    if len(days) < MIN_FIT_DAYS:
+        return float(np.median(starts)), 0.0
+
+    x0 = days[0]
+    drift, offset = np.polyfit(days - x0, starts, 1)
+    residuals = starts - (offset + drift * (days - x0))
+    keep = np.abs(residuals) <= max(60.0, 3 * np.std(residuals))
+    if keep.sum() >= MIN_FIT_DAYS and not keep.all():
+        drift, offset = np.polyfit(days[keep] - x0, starts[keep], 1)
+    return float(offset - drift * x0), float(drift)
+
+
+def predict_windows(tracks, first_date, last_date):
+    """
+    Predicts the purge window of each track for each day from first_date to
+    last_date (datetime64[D], inclusive), from the day the track was first seen to
+    EXTRAPOLATE_DAYS after it was last seen.
+
+    Returns:
+        polars.DataFrame: date, track, start_seconds, end_seconds (predicted, since
+        midnight), observed_start_seconds, observed_end_seconds and
+        drift_seconds_per_day.
+    """
+    rows = {"date": [], "track": [], "start_seconds": [], "end_seconds": [],
+            "observed_start_seconds": [], "observed_end_seconds": [], "drift_seconds_per_day": []}
+    first_day = np.datetime64(first_date, "D").astype(np.int64)
+    last_day = np.datetime64(last_date, "D").astype(np.int64)
+
+    for number, track in enumerate(tracks):
+        offset, drift = fit_drift(track["days"], track["starts"])
+        duration = float(np.median(track["durations"]))
+        observed = {day: (start % SECONDS_PER_DAY, (start + length) % SECONDS_PER_DAY)
+                    for day, start, length in zip(track["days"], track["starts"], track["durations"])}
+
+        for day in range(max(first_day, track["days"][0]), min(last_day, track["days"][-1] + EXTRAPOLATE_DAYS) + 1):
+            start = (offset + drift * day) % SECONDS_PER_DAY
+            rows["date"].append(np.datetime64(day, "D").astype(object))
+            rows["track"].append(number)
+            rows["start_seconds"].append(round(start, 3))
+            rows["end_seconds"].append(round(start + duration, 3))
+            rows["observed_start_seconds"].append(observed.get(day, (None, None))[0])
+            rows["observed_end_seconds"].append(observed.get(day, (None, None))[1])
+            rows["drift_seconds_per_day"].append(drift)
+
+    return pl.DataFrame(rows, schema={"date": pl.Date, "track": pl.Int64, "start_seconds": pl.Float64,
+                                      "end_seconds": pl.Float64, "observed_start_seconds": pl.Float64,
+                                      "observed_end_seconds": pl.Float64,
+                                      "drift_seconds_per_day": pl.Float64}).sort(["date", "start_seconds"])
+
+
+def load_predicted_windows(table_file):
+    """
+    Reads a table written by this script (.parquet or .csv) once, for
+    read_predicted_windows to look days up in.
+
+    Returns:
+        dict: date -> list of (start, end) seconds since midnight, in table order.
+    """
+    table = pl.read_parquet(table_file) if table_file.endswith(".parquet") else pl.read_csv(table_file, try_parse_dates=True)
+    windows = {}
+    for date, start, end in table.select("date", "start_seconds", "end_seconds").iter_rows():
+        windows.setdefault(date, []).append((start, end))
+    return windows
+
+
+def read_predicted_windows(windows, date):
+    """
+    Returns the predicted purge windows for a date (date or datetime) from a
+    table loaded with load_predicted_windows, as (start, end) seconds since
+    midnight. The end can be past 86400 for a purge running over midnight.
+    """
+    return windows.get(np.datetime64(date, "D").astype(object), [])
+
+
+def files_in_range(paths, first_date, last_date):
+    """
+    Leaves out files whose name has a _YYYYMMDD_ date outside the range, allowing
+    a day either side for purges across midnight.
+    """
+    first = (first_date - timedelta(days=1)).strftime("%Y%m%d")
+    last = (last_date + timedelta(days=1)).strftime("%Y%m%d")
+    selected = []
+    for path in paths:
+        match = FILE_DATE_REGEX.search(os.path.basename(path))
+        if match is None or first <= match.group(1) <= last:
+            selected.append(path)
+    return selected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit the drift of the purge times over a range of days and write the predicted purge window for each day.")
+    parser.add_argument("-d", "--directory", required=True, help="Directory containing the flagged daily NetCDF files (searched recursively)")
+    parser.add_argument("-s", "--start", required=True, help="First day (YYYYMMDD)")
+    parser.add_argument("-e", "--end", required=True, help="Last day (YYYYMMDD)")
+    parser.add_argument("-o", "--outfile", default="purge_windows.csv", help="Output table, .parquet or .csv (default: purge_windows.csv)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Number of worker processes (default: number of CPUs)")
+    args = parser.parse_args()
+
+    first_date = datetime.strptime(args.start, "%Y%m%d")
+    last_date = datetime.strptime(args.end, "%Y%m%d")
+
+    paths = files_in_range(find_netcdf_files(args.directory), first_date, last_date)
+    intervals = [interval for interval in collect_intervals(paths, workers=args.workers)
+                 if args.start <= interval[0].replace("-", "") <= args.end]
+    tracks = track_purges(intervals)
+    table = predict_windows(tracks, np.datetime64(first_date, "D"), np.datetime64(last_date, "D"))
+
+    if args.outfile.endswith(".parquet"):
+        table.write_parquet(args.outfile)
+    else:
+        table.write_csv(args.outfile)
+
+    for number, track in enumerate(tracks):
+        offset, drift = fit_drift(track["days"], track["starts"])
+        print(f"Purge track {number}: {len(track['days'])} days, drift = {drift:.3f} seconds per day")
+    print(f"Predicted purge windows written to {args.outfile}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+# Streaming purge detector for HMP155 data, carrying its state across chunks and days
+
+The detector is fed samples chunk by chunk (a day, or the rows added since the
+last live run) and finds the same flat regions as flag_purge_times.detect_flat:
+both air temperature and RH flat over a centred rolling window, RH below
+saturation. The rolling windows, any purge run still open at the end of a chunk
+and the purge times of day learned from recent days are kept between chunks, so
+the purge windows learned for a day include purges running past its midnight
+and the previous day never has to be read again. The state is small and saved
+as JSON between runs.
+"""
+
+import json
+import numpy as np
+import pandas as pd
+from run_length import true_runs, rolling_std
+from atomic_write import atomic_write_json
+
+STATE_VERSION = 1
+KEEP_DAYS = 3  # Days of learned purge windows kept in the state
+NS_PER_DAY = 86400 * 10**9
+
+
+class PurgeStreamDetector:
+    """
+    Detects purge periods in a stream of (time, air_temperature, relative_humidity)
+    samples.
+
+    Parameters:
+        window (int): The rolling window size (in samples) for detecting flat regions.
+        std_threshold_temp (float): Standard deviation threshold for air temperature.
+        std_threshold_rh (float): Standard deviation threshold for RH.
+        max_rh (float): Points with RH at or above this are not counted as flat.
+    """
+
+    def __init__(self, window, std_threshold_temp=0.07, std_threshold_rh=0.05, max_rh=99.9):
+        self.window = int(window)
+        self.std_threshold_temp = std_threshold_temp
+        self.std_threshold_rh = std_threshold_rh
+        self.max_rh = max_rh
+
+        # Samples still needed for rolling windows; the first n_context of them
+        # have already been classified and are only there as left context
+        self.times = np.zeros(0, dtype=np.int64)
+        self.temp = np.zeros(0)
+        self.rh = np.zeros(0)
+        self.n_context = 0
+
+        self.run_start = None  # Start (ns) of a purge run still open
+        self.run_end = None    # Last flat sample (ns) of the open run
+        self.windows = {}      # YYYY-MM-DD -> [[start, end], ...] ns since that midnight
+
+    def update(self, times, air_temperature, relative_humidity):
+        """
+        Adds a chunk of samples. Samples at or before the last time already
+        added are skipped, so a chunk can safely be given again.
+
+        Returns:
+            list of tuples: (start, end) datetime64[ns] of each purge run completed
+            by this chunk, end being the last flat sample.
+        """
+        times = np.asarray(times).astype("datetime64[ns]").view(np.int64)
+        temp = np.asarray(air_temperature, dtype=np.float64)
+        rh = np.asarray(relative_humidity, dtype=np.float64)
+        if len(self.times) > 0:
+            new = times > self.times[-1]
+            times, temp, rh = times[new], temp[new], rh[new]
+
+        self.times = np.concatenate((self.times, times))
+        self.temp = np.concatenate((self.temp, temp))
+        self.rh = np.concatenate((self.rh, rh))
+
+        # A sample is classified once the samples to the right of it in its window have arrived
+        n_ready = len(self.times) - (self.window - 1 - self.window // 2) - self.n_context
+        return self._classify(max(0, n_ready))
+
+    def last_time(self):
+        """
+        Returns the time (datetime64[ns]) of the last sample added, or None if
+        there hasn't been one.
+        """
+        if len(self.times) == 0:
+            return None
+        return np.datetime64(int(self.times[-1]), "ns")
+
+    def _classify(self, n_ready):
+        if n_ready == 0:
+            return []
+        flat = ((rolling_std(self.temp, self.window) < self.std_threshold_temp) &
+                (rolling_std(self.rh, self.window) < self.std_threshold_rh) &
+                (self.rh < self.max_rh))
+        first = self.n_context
+        mask = flat[first:first + n_ready]
+        times = self.times[first:first + n_ready]
+
+        # A run left open by the last chunk carries on if this one starts flat
+        runs = [] if mask[0] else self._close_run()
+        starts, ends = true_runs(mask)
+        for start, end in zip(starts, ends):
+            if self.run_start is None:
+                self.run_start = times[start]
+            self.run_end = times[end - 1]
+            if end < len(mask):
+                runs += self._close_run()
+
+        # Keep only the left context the remaining samples need
+        done = first + n_ready
+        keep_from = max(0, done - self.window // 2)
+        self.times = self.times[keep_from:]
+        self.temp = self.temp[keep_from:]
+        self.rh = self.rh[keep_from:]
+        self.n_context = done - keep_from
+        return runs
+
+    def _close_run(self):
+        if self.run_start is None:
+            return []
+        start, end = int(self.run_start), int(self.run_end)
+        self.run_start = self.run_end = None
+
+        # Times of day as expected_purge_windows gives them: the start to the whole
+        # second, the end relative to the same midnight
+        midnight = start - start % NS_PER_DAY
+        start_of_day = (start - midnight) // 10**9 * 10**9
+        day = str(np.datetime64(midnight, "ns").astype("datetime64[D]"))
+        self.windows.setdefault(day, []).append([start_of_day, start_of_day + end - start])
+        for old_day in sorted(self.windows)[:-KEEP_DAYS]:
+            del self.windows[old_day]
+        return [(np.datetime64(start, "ns"), np.datetime64(end, "ns"))]
+
+    def expected_windows(self, day):
+        """
+        Returns the purge windows learned for a day (date or datetime64) as
+        (start, end) timedeltas since midnight, the form expected_purge_windows
+        returns them in.
+        """
+        day = str(np.datetime64(day, "D"))
+        return [(pd.Timedelta(start, "ns"), pd.Timedelta(end, "ns")) for start, end in self.windows.get(day, [])]
+
+    def to_state(self):
+        """
+        Returns the detector state as a JSON-serialisable dictionary.
+        """
+        return {
+            "version": STATE_VERSION,
+            "window": self.window,
+            "std_threshold_temp": self.std_threshold_temp,
+            "std_threshold_rh": self.std_threshold_rh,
+            "max_rh": self.max_rh,
+            "times": self.times.tolist(),
+            "air_temperature": self.temp.tolist(),
+            "relative_humidity": self.rh.tolist(),
+            "n_context": self.n_context,
+            "run_start": None if self.run_start is None else int(self.run_start),
+            "run_end": None if self.run_end is None else int(self.run_end),
+            "windows": self.windows,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """
+        Rebuilds a detector from to_state().
+        """
+        if state.get("version") != STATE_VERSION:
+            raise ValueError(f"Unsupported purge detector state version {state.get('version')}")
+        detector = cls(state["window"], state["std_threshold_temp"], state["std_threshold_rh"], state["max_rh"])
+        detector.times = np.array(state["times"], dtype=np.int64)
+        detector.temp = np.array(state["air_temperature"], dtype=np.float64)
+        detector.rh = np.array(state["relative_humidity"], dtype=np.float64)
+        detector.n_context = state["n_context"]
+        detector.run_start = state["run_start"]
+        detector.run_end = state["run_end"]
+        detector.windows = state["windows"]
+        return detector
+
+
+def load_detector(path, window=None):
+    """
+    Loads a detector from a state file. Returns None if there isn't one, if it
+    can't be read (e.g. truncated or from another state version) or if it was
+    saved with a window size other than window, so that detection starts again.
+    """
+    try:
+        with open(path, "r") as fid:
+            detector = PurgeStreamDetector.from_state(json.load(fid))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+        print(f"WARNING: Could not read purge detector state {path} ({e}), starting again")
+        return None
+    if window is not None and detector.window != int(window):
+        print(f"WARNING: {path} was saved with a window of {detector.window} samples, not {window}, starting again")
+        return None
+    return detector
+
+
+def save_detector(detector, path):
+    atomic_write_json(path, detector.to_state())
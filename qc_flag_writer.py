@@ -0,0 +1,82 @@
+"""
+# Write the HMP155 QC flag variables in place in an open NetCDF file
+
+Only the qc_flag_* variables (and their attributes) are written, so flagging a
+file costs I/O the size of the int8 flag arrays rather than a rewrite of the
+whole dataset.
+"""
+
+import numpy as np
+
+FLAG_GOOD = 1
+
+QC_FLAG_ATTRS = {
+    "qc_flag_air_temperature": {
+        "units": "1",
+        "long_name": "Data Quality flag: Air Temperature",
+        "standard_name": "quality_flag",
+        "flag_values": np.array([0, 1, 2, 3], dtype=np.int8),
+        "flag_meanings": "not_used good_data bad_data_measurement_suspect bad_data_purge_cycle_value_fixed_as_start_of_purge",
+    },
+    "qc_flag_relative_humidity": {
+        "units": "1",
+        "long_name": "Data Quality flag: Relative Humidity",
+        "standard_name": "quality_flag",
+        "flag_values": np.array([0, 1, 2, 3, 4], dtype=np.int8),
+        "flag_meanings": "not_used good_data bad_data_measurement_suspect bad_data_purge_cycle_value_fixed_as_start_of_purge recovery_in_rh_after_purge",
+    },
+}
+
+# Data variable each QC flag variable belongs to
+QC_FLAG_DATA_VARS = {
+    "qc_flag_air_temperature": "air_temperature",
+    "qc_flag_relative_humidity": "relative_humidity",
+}
+
+
+def qc_flag_variable(nc, name):
+    """
+    Returns the QC flag variable name of an open netCDF4 Dataset, creating it
+    as int8 on the dimensions of its data variable, set to FLAG_GOOD and with
+    the QC flag attributes, if it doesn't exist.
+    """
+    if name in nc.variables:
+        return nc.variables[name]
+
+    var = nc.createVariable(name, "i1", nc.variables[QC_FLAG_DATA_VARS[name]].dimensions)
+    var[:] = FLAG_GOOD
+    var.setncatts(QC_FLAG_ATTRS[name])
+    return var
+
+
+def time_order(time_values):
+    """
+    Returns the stable sort order of the times, or None if they are already in
+    order so that no sorted copy is needed.
+    """
+    time_values = np.asarray(time_values)
+    if len(time_values) < 2 or np.all(time_values[1:] >= time_values[:-1]):
+        return None
+    return np.argsort(time_values, kind="stable")
+
+
+def write_qc_flags(nc, flags, order=None):
+    """
+    Writes QC flag arrays to an open netCDF4 Dataset, creating the variables if
+    needed and setting their attributes.
+
+    Parameters:
+        nc (netCDF4.Dataset): Dataset opened in 'r+' mode.
+        flags (dict): QC flag variable name -> flag array.
+        order (numpy.ndarray): If the flags were computed on time-sorted data,
+            the sort order (from time_order), used to put them back in file order.
+    """
+    for name, values in flags.items():
+        values = np.asarray(values, dtype=np.int8)
+        if order is not None:
+            in_file_order = np.empty_like(values)
+            in_file_order[order] = values
+            values = in_file_order
+        var = qc_flag_variable(nc, name)
+        var[:] = values
+        var.setncatts(QC_FLAG_ATTRS[name])
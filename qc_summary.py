@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+"""
+# Summarise the QC flags of a directory of HMP155 NetCDF files
+
+Only the time and qc_flag_* variables are read, with netCDF4, and files are
+read in parallel. The result is a table of the number of samples with each flag
+value, per day and per QC flag variable.
+"""
+
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import polars as pl
+from netCDF4 import Dataset, num2date
+
+QC_FLAG_VARIABLES = ["qc_flag_air_temperature", "qc_flag_relative_humidity"]
+FILL_FLAG = -1  # Flag value reported for masked (fill value) samples
+
+
+def find_netcdf_files(directory):
+    """
+    Returns the sorted paths of the .nc files under directory.
+    """
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in files if name.endswith(".nc"))
+    return sorted(paths)
+
+
+def netcdf_times(time_var):
+    """
+    Returns the values of a netCDF4 time variable as datetime64[us].
+    """
+    values = np.asarray(time_var[:], dtype=np.float64)
+    units = time_var.getncattr("units")
+    if units.startswith("seconds since 1970-01-01"):
+        return (np.round(values * 1e6).astype(np.int64)).astype("datetime64[us]")
+    times = num2date(values, units, getattr(time_var, "calendar", "standard"),
+                     only_use_cftime_datetimes=False, only_use_python_datetimes=True)
+    return np.array(times, dtype="datetime64[us]")
+
+
+def time_days(time_var):
+    """
+    Returns the datetime64[D] day of each value of a netCDF4 time variable.
+    """
+    return netcdf_times(time_var).astype("datetime64[D]")
+
+
+def file_flag_counts(path, variables=QC_FLAG_VARIABLES):
+    """
+    Counts the samples with each flag value per day in one file.
+
+    Returns:
+        dict: Columns file, date, variable, flag_value and count (lists), or an
+        error message under "error" if the file can't be read.
+    """
+    rows = {"file": [], "date": [], "variable": [], "flag_value": [], "count": []}
+    try:
+        with Dataset(path, mode="r") as nc:
+            days = time_days(nc.variables["time"])
+            for name in variables:
+                if name not in nc.variables:
+                    continue
+                flags = np.ma.filled(nc.variables[name][:], FILL_FLAG).astype(np.int64)
+
+                # Count (day, flag value) pairs in one pass
+                keys, counts = np.unique(np.stack((days.astype(np.int64), flags)), axis=1, return_counts=True)
+                n = len(counts)
+                rows["file"].extend([os.path.basename(path)] * n)
+                rows["date"].extend(keys[0].astype("datetime64[D]").tolist())
+                rows["variable"].extend([name] * n)
+                rows["flag_value"].extend(keys[1].tolist())
+                rows["count"].extend(counts.tolist())
+    except Exception as e:
+        return {"error": f"{path}: {e}"}
+    return rows
+
+
+def qc_summary(paths, workers=None):
+    """
+    Counts the QC flag values per day and variable over many files, read in
+    parallel. Files that can't be read are reported and left out.
+
+    Returns:
+        polars.DataFrame: Columns date, variable, flag_value, count and files
+        (the number of files the day's samples came from).
+    """
+    frames = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for rows in executor.map(file_flag_counts, paths, chunksize=16):
+            if "error" in rows:
+                print(f"WARNING: Failed to process {rows['error']}")
+            elif rows["count"]:
+                frames.append(pl.DataFrame(rows, schema={"file": pl.Utf8, "date": pl.Date, "variable": pl.Utf8,
+                                                         "flag_value": pl.Int64, "count": pl.Int64}))
+
+    if not frames:
+        return pl.DataFrame(schema={"date": pl.Date, "variable": pl.Utf8, "flag_value": pl.Int64,
+                                    "count": pl.Int64, "files": pl.UInt32})
+    return (pl.concat(frames)
+            .group_by(["date", "variable", "flag_value"])
+            .agg(pl.col("count").sum(), pl.col("file").n_unique().alias("files"))
+            .sort(["date", "variable", "flag_value"]))
+
+
+def wide_summary(summary):
+    """
+    Pivots the summary to one row per day and variable, with a flag_<value>
+    column of counts for each flag value.
+    """
+    if summary.height == 0:
+        return summary
+    wide = summary.pivot(on="flag_value", index=["date", "variable"], values="count", aggregate_function="sum")
+    flag_columns = sorted((c for c in wide.columns if c not in ("date", "variable")), key=int)
+    return (wide.select(["date", "variable"] + [pl.col(c).fill_null(0).alias(f"flag_{c}") for c in flag_columns])
+            .sort(["date", "variable"]))
+
+
+def write_summary(summary, outfile):
+    """
+    Writes a summary table as Parquet if outfile ends in .parquet, otherwise as CSV.
+    """
+    if outfile.endswith(".parquet"):
+        summary.write_parquet(outfile)
+    else:
+        summary.write_csv(outfile)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count the QC flag values per day in a directory of NetCDF files.")
+    parser.add_argument("-d", "--directory", required=True, help="Directory containing NetCDF files")
+    parser.add_argument("-o", "--outfile", default="qc_summary.csv", help="Output table, .parquet or .csv (default: qc_summary.csv)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument("--long", action="store_true", help="Write one row per day, variable and flag value instead of a flag_<value> column per flag value")
+    args = parser.parse_args()
+
+    paths = find_netcdf_files(args.directory)
+    summary = qc_summary(paths, workers=args.workers)
+    write_summary(summary if args.long else wide_summary(summary), args.outfile)
+    print(f"Summarised {len(paths)} files in {args.outfile}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+# Body temperatures of the CG4 pyrgeometer and CHP1 pyrheliometer from their thermistors
+
+Shared by generate_netcdf_met (sensor 9) and generate_netcdf_bbrad_f5. Every
+conversion works on whole arrays: the CG4 thermistor polynomial is evaluated
+with np.polyval, the CHP1 Steinhart-Hart equation takes one log of the
+resistances, and resistances beyond the sensible limits give missing values.
+"""
+
+import numpy as np
+
+TK = 273.15
+SB_CONST = 5.67e-8
+
+# CG4 thermistor: T(degC) = A*R**5 + B*R**4 + C*R**3 + D*R**2 + E*R + F, R in kohms
+CG4_COEFFS = (-4.56582625e-7, 8.97922514e-5, -6.95640241e-3, 2.74163515e-1, -6.23224724, 66.1824897)
+CG4_MAX_KOHMS = 100.0
+
+# CHP1 thermistor: 1/T(K) = A1 + B1*ln(R) + G1*ln(R)**3, R in ohms
+CHP1_A1 = 0.0010295
+CHP1_B1 = 2.391e-4
+CHP1_G1 = 1.568e-7
+CHP1_MAX_OHMS = 100000.0
+
+
+def divider_resistance(ratio, reference):
+    """
+    Returns the thermistor resistance from a voltage divider ratio measured
+    against a reference resistor (in the units of the reference).
+    """
+    ratio = np.asarray(ratio, dtype=np.float64)
+    return reference * (ratio / (1 - ratio))
+
+
+def cg4_temperature(resistance_kohms):
+    """
+    Returns (temperature, ok): the CG4 body temperature in K, NaN where the
+    resistance is above CG4_MAX_KOHMS (or NaN), and the mask of usable samples.
+    """
+    resistance = np.asarray(resistance_kohms, dtype=np.float64)
+    ok = resistance <= CG4_MAX_KOHMS
+    temperature = np.full(resistance.shape, np.nan)
+    temperature[ok] = np.polyval(CG4_COEFFS, resistance[ok]) + TK
+    return temperature, ok
+
+
+def chp1_temperature(resistance_ohms):
+    """
+    Returns (temperature, ok): the CHP1 body temperature in K, NaN where the
+    resistance is above CHP1_MAX_OHMS (or NaN), and the mask of usable samples.
+    """
+    resistance = np.asarray(resistance_ohms, dtype=np.float64)
+    ok = resistance <= CHP1_MAX_OHMS
+    temperature = np.full(resistance.shape, np.nan)
+    ln_resistance = np.log(resistance[ok])
+    temperature[ok] = 1.0 / np.polyval((CHP1_G1, 0.0, CHP1_B1, CHP1_A1), ln_resistance)
+    return temperature, ok
+
+
+def correct_cg4(longwave, resistance_kohms, missing_value):
+    """
+    Adds the emission of the CG4 body (sigma * T**4) to its downwelling
+    longwave flux.
+
+    Returns:
+        tuple: (corrected longwave flux, body temperature in K), both set to
+        missing_value where the thermistor resistance is out of range.
+    """
+    temperature, ok = cg4_temperature(resistance_kohms)
+    corrected = np.array(longwave, dtype=np.float64)
+    corrected[ok] = corrected[ok] + SB_CONST * temperature[ok] ** 4
+    corrected[~ok] = missing_value
+    temperature[~ok] = missing_value
+    return corrected, temperature
+
+
+def chp1_body_temperature(resistance_ohms, missing_value):
+    """
+    Returns the CHP1 body temperature in K, missing_value where the thermistor
+    resistance is out of range.
+    """
+    temperature, ok = chp1_temperature(resistance_ohms)
+    temperature[~ok] = missing_value
+    return temperature
@@ -0,0 +1,61 @@
+"""
+# Bin geometry and bulk spectra of the RD-80 disdrometer
+
+The 127 drop size bins of the RD-80 are fixed, so their mean drop volumes are
+worked out once when the module is imported. Whole
+days of spectra are held as one (records, NBINS) array of drop counts, and
+rainfall is derived from it with array operations.
+"""
+
+import numpy as np
+
+NBINS = 127
+SAMPLING_AREA = 5.0265E-03  # m2
+
+# Minimum diameter (mm) of each bin
+RD80_THRESHOLDS = np.array([
+    0.313, 0.318, 0.324, 0.331, 0.337, 0.343, 0.35, 0.357,
+    0.364, 0.371, 0.379, 0.387, 0.396, 0.405, 0.414, 0.423,
+    0.433, 0.443, 0.453, 0.464, 0.474, 0.484, 0.495, 0.505,
+    0.515, 0.526, 0.537, 0.547, 0.558, 0.57, 0.583, 0.596,
+    0.611, 0.628, 0.644, 0.662, 0.679, 0.696, 0.715, 0.735,
+    0.754, 0.771, 0.787, 0.806, 0.827, 0.845, 0.862, 0.879,
+    0.895, 0.912, 0.928, 0.944, 0.96, 0.978, 0.999, 1.024,
+    1.051, 1.08, 1.11, 1.14, 1.171, 1.202, 1.232, 1.262,
+    1.289, 1.318, 1.346, 1.374, 1.402, 1.429, 1.456, 1.483,
+    1.509, 1.533, 1.558, 1.582, 1.606, 1.631, 1.657, 1.683,
+    1.715, 1.748, 1.793, 1.841, 1.897, 1.955, 2.013, 2.077,
+    2.139, 2.2, 2.262, 2.321, 2.381, 2.441, 2.499, 2.558,
+    2.616, 2.672, 2.727, 2.781, 2.836, 2.893, 2.949, 3.011,
+    3.08, 3.155, 3.23, 3.306, 3.385, 3.466, 3.545, 3.625,
+    3.704, 3.784, 3.864, 3.945, 4.028, 4.127, 4.231, 4.34,
+    4.456, 4.573, 4.686, 4.801, 4.915, 5.03, 5.145,
+])
+
+# Mean drop volume (mm3) of each bin. The value for the last bin is arbitrary,
+# based on the spacing of the previous bins
+MEAN_VOLUME = np.append(0.5236 * ((RD80_THRESHOLDS[:-1] ** 3 + RD80_THRESHOLDS[1:] ** 3) / 2), 74.0)
+
+
+def spectral_matrix(disdro_handler, number_of_records=None):
+    """
+    Returns the spectra of every record held by a module_distrometer_format5
+    Handler as one (records, NBINS) float array.
+
+    The handler hands spectra back one record at a time, in a buffer it reuses,
+    so each is copied straight into its row of the result.
+    """
+    if number_of_records is None:
+        number_of_records = disdro_handler.return_number_of_records()
+    spectra = np.empty((number_of_records, NBINS))
+    for nn in range(number_of_records):
+        spectra[nn, :] = disdro_handler.return_spectral_data(nn)
+    return spectra
+
+
+def rainfall_thickness(spectra):
+    """
+    Returns the thickness of rainfall (mm) of each record of a (records, NBINS)
+    array of drop counts: the total volume of the drops over the sampling area.
+    """
+    return np.sum(MEAN_VOLUME * spectra, axis=1) / (SAMPLING_AREA * 1.0e+06)
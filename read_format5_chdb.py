@@ -1,68 +1,130 @@
 import os
+import copy
+import json
+import hashlib
+from atomic_write import atomic_write_json
 
-def read_format5_chdb(path_file):
+CACHE_VERSION = 1
+CACHE_DIR = os.environ.get("FORMAT5_CHDB_CACHE_DIR",
+                           os.path.join(os.path.expanduser("~"), ".cache", "format5_chdb"))
+
+_chdb_cache = {}
+
+
+def parse_format5_chdb(path_file):
     """
-    Reads the format5 channel database (.chdb) file and processes its contents.
+    Parses the format5 channel database (.chdb) file in a single pass.
     Returns a dictionary where each instrument is a key with a sub-dictionary of its properties.
     """
-    # Load the file contents into a list
-    channel_info = []
+    # Initialize the channel database dictionary
+    chdb = {}
+
+    # Process each line, skipping blank lines and lines starting with '#'
+    current_instrument = None
     with open(path_file, 'r') as fid:
         for line in fid:
-            channel_info.append(line.rstrip('\n'))
+            line = line.rstrip('\n').lstrip()
+            if not line or line.startswith('#'):
+                continue
+            parts = line.split()
+            key = parts[0]
+            if key == 'channel':
+                # Start a new instrument entry
+                current_instrument = parts[1]
+                chdb[current_instrument] = {
+                    "title": None,
+                    "location": None,
+                    "rawrange": None,
+                    "rawunits": None,
+                    "realrange": None,
+                    "realunits": None,
+                    "interval": None
+                }
+            elif current_instrument:
+                if key == 'title':
+                    chdb[current_instrument]["title"] = line.replace('title ', '', 1)
+                elif key == 'location':
+                    chdb[current_instrument]["location"] = line.replace('location ', '', 1)
+                elif key == 'rawrange':
+                    chdb[current_instrument]["rawrange"] = {
+                        "lower": float(parts[1]),
+                        "upper": float(parts[2])
+                    }
+                elif key == 'rawunits':
+                    chdb[current_instrument]["rawunits"] = line.replace('rawunits ', '', 1)
+                elif key == 'realrange':
+                    chdb[current_instrument]["realrange"] = {
+                        "lower": float(parts[1]),
+                        "upper": float(parts[2])
+                    }
+                elif key == 'realunits':
+                    chdb[current_instrument]["realunits"] = line.replace('realunits ', '', 1)
+                elif key == 'interval':
+                    chdb[current_instrument]["interval"] = float(parts[1])
+                elif key == 'acquire':
+                    pass  # No action needed for 'acquire'
 
-    # Remove leading blanks and lines with no content
-    new_channel_info = []
-    for line in channel_info:
-        stripped_line = line.lstrip()
-        if stripped_line:  # Skip empty lines
-            new_channel_info.append(stripped_line)
+    return chdb
 
-    # Remove lines starting with '#'
-    channel_info = [line for line in new_channel_info if not line.startswith('#')]
 
-    # Initialize the channel database dictionary
-    chdb = {}
+def chdb_cache_path(path_file):
+    """
+    Returns the path of the parsed cache kept in CACHE_DIR for a .chdb file.
+    """
+    name = os.path.abspath(path_file).strip(os.sep).replace(os.sep, "_")
+    return os.path.join(CACHE_DIR, name + ".json")
 
-    # Process each line in the channel info
-    current_instrument = None
-    for line in channel_info:
-        parts = line.split()
-        key = parts[0]
-        if key == 'channel':
-            # Start a new instrument entry
-            current_instrument = parts[1]
-            chdb[current_instrument] = {
-                "title": None,
-                "location": None,
-                "rawrange": None,
-                "rawunits": None,
-                "realrange": None,
-                "realunits": None,
-                "interval": None
-            }
-        elif current_instrument:
-            if key == 'title':
-                chdb[current_instrument]["title"] = line.replace('title ', '', 1)
-            elif key == 'location':
-                chdb[current_instrument]["location"] = line.replace('location ', '', 1)
-            elif key == 'rawrange':
-                chdb[current_instrument]["rawrange"] = {
-                    "lower": float(parts[1]),
-                    "upper": float(parts[2])
-                }
-            elif key == 'rawunits':
-                chdb[current_instrument]["rawunits"] = line.replace('rawunits ', '', 1)
-            elif key == 'realrange':
-                chdb[current_instrument]["realrange"] = {
-                    "lower": float(parts[1]),
-                    "upper": float(parts[2])
-                }
-            elif key == 'realunits':
-                chdb[current_instrument]["realunits"] = line.replace('realunits ', '', 1)
-            elif key == 'interval':
-                chdb[current_instrument]["interval"] = float(parts[1])
-            elif key == 'acquire':
-                pass  # No action needed for 'acquire'
-
-    return chdb
\ No newline at end of file
+
+def _file_hash(path_file):
+    with open(path_file, 'rb') as fid:
+        return hashlib.sha256(fid.read()).hexdigest()
+
+
+def _load_cache(path_file):
+    try:
+        with open(chdb_cache_path(path_file), 'r') as fid:
+            cache = json.load(fid)
+    except (OSError, ValueError):
+        return None
+    if cache.get("version") != CACHE_VERSION:
+        return None
+    return cache
+
+
+def _save_cache(path_file, cache):
+    path = chdb_cache_path(path_file)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        atomic_write_json(path, cache)
+    except OSError as e:
+        print(f"WARNING: Could not write channel database cache {path}: {e}")
+
+
+def read_format5_chdb(path_file):
+    """
+    Reads the format5 channel database (.chdb) file and processes its contents.
+    Returns a dictionary where each instrument is a key with a sub-dictionary of its properties.
+
+    The parsed database is memoized in the process and cached in a JSON file in
+    CACHE_DIR (FORMAT5_CHDB_CACHE_DIR, default ~/.cache/format5_chdb), keyed on
+    the .chdb's modification time, size and hash, so it is only re-parsed when
+    the .chdb changes.
+    """
+    stat = os.stat(path_file)
+    stamp = [stat.st_mtime_ns, stat.st_size]
+
+    key = os.path.abspath(path_file)
+    if key in _chdb_cache and _chdb_cache[key]["stamp"] == stamp:
+        return copy.deepcopy(_chdb_cache[key]["chdb"])
+
+    cache = _load_cache(path_file)
+    if cache is None or cache["stamp"] != stamp:
+        # The file has been touched or changed, only re-parse if its content differs
+        file_hash = _file_hash(path_file)
+        if cache is None or cache["hash"] != file_hash:
+            cache = {"version": CACHE_VERSION, "hash": file_hash, "chdb": parse_format5_chdb(path_file)}
+        cache["stamp"] = stamp
+        _save_cache(path_file, cache)
+
+    _chdb_cache[key] = cache
+    return copy.deepcopy(cache["chdb"])
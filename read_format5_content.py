@@ -2,65 +2,85 @@ import numpy as np
 import polars as pl
 from datetime import datetime
 from read_format5_header import read_format5_header
+import read_format5_records
 
-def read_format5_content(path_file, header):
+TIME_COLUMNS = 5  # Month, day, hour, minute and second lead every data line
+
+
+def format5_timestamps(year, time_values):
     """
-    Reads the content of a format5 data file and stores it in a Polars DataFrame.
-    Extracts only the 'ws_ch' and 'wd_ch' columns.
+    Builds datetime64[us] timestamps from the integer month, day, hour, minute
+    and second columns of a format5 file, without going through strings.
     """
-    # Open the format5 file
-    with open(path_file, "r") as fid:
+    time_values = time_values.astype(np.int64)
+    months = np.datetime64(year - 1970, "Y").astype("datetime64[M]") + (time_values[:, 0] - 1)
+    days = months.astype("datetime64[D]") + (time_values[:, 1] - 1)
+    seconds = time_values[:, 2] * 3600 + time_values[:, 3] * 60 + time_values[:, 4]
+    return (days.astype("datetime64[s]") + seconds).astype("datetime64[us]")
+
+
+def read_format5_block(path_file, header):
+    """
+    Reads the numeric block of a format5 data file in one call.
+
+    Only complete lines are read (a line still being written is left for the
+    next read). Returns a float array with one row per line: the 5 time columns
+    followed by one column per channel in header["chids"].
+    """
+    n_cols = TIME_COLUMNS + len(header["chids"])
+
+    with open(path_file, "rb") as fid:
         # Skip to the start of the content
         fid.seek(header["comment_size"] + header["header_size"], 0)
+        block = fid.read()
 
-        # Prepare to read the content line by line
-        content = []
-        for line in fid:
-            # Split the line into the first 5 comma-separated values and the rest space-separated
-            parts = line.strip().split(" ", 1)
-            timestamp_part = parts[0].split(",")  # First 5 values are comma-separated
-            data_part = parts[1].split() if len(parts) > 1 else []  # Remaining values are space-separated
+    block = block[:block.rfind(b"\n") + 1]
 
-            # Combine the timestamp and data parts
-            content.append([*map(float, timestamp_part), *map(float, data_part)])
+    # The timestamp is comma-separated and the values space-separated
+    values = np.fromstring(block.replace(b",", b" ").decode("ascii"), dtype=float, sep=" ")
+    if values.size % n_cols != 0:
+        raise ValueError(f"{path_file}: expected lines of {n_cols} values, read {values.size} values")
+    n_rows = values.size // n_cols
 
-    # Convert the content to a NumPy array
-    content = np.array(content, dtype=float)  # Use dtype=object to handle mixed types
+    return values.reshape(n_rows, n_cols)
+
+
+def read_format5_content(path_file, header, chids=None):
+    """
+    Reads the content of a format5 data file and stores it in a Polars DataFrame.
+    Renames the 'ws_ch' and 'wd_ch' columns to 'WS_Avg' and 'WD_Avg'.
+
+    If chids is given (for example channels taken from read_format5_chdb),
+    only those channels are parsed and returned.
+    """
+    if chids is None:
+        chids = header["chids"]
+    missing = [chid for chid in chids if chid not in header["chids"]]
+    if missing:
+        raise ValueError(f"{path_file}: channels {missing} are not in the file")
+    columns = [header["chids"].index(chid) for chid in chids]
 
     # Prepare timestamping of the data
     # Extract the year from the file name
     year = int(path_file[-10:-8]) + 2000
 
-    # Convert the first 5 columns (time columns) into datetime strings
-    timestamps = [
-        f"{year:04d}-{int(row[0]):02d}-{int(row[1]):02d} {int(row[2]):02d}:{int(row[3]):02d}:{int(row[4]):02d}"
-        for row in content
-    ]
-
-    # Replace the first 5 columns with the timestamps
-    data = np.column_stack((timestamps, content[:, 5:]))
+    records = read_format5_records.map_format5_records(path_file, header)
+    if read_format5_records.is_fixed_length(records):
+        # Only the requested channels are converted
+        timestamps = read_format5_records.format5_record_times(records, year).astype("datetime64[us]")
+        values = read_format5_records.parse_format5_records(records, columns)
+    else:
+        content = read_format5_block(path_file, header)
+        timestamps = format5_timestamps(year, content[:, :TIME_COLUMNS])
+        values = content[:, [TIME_COLUMNS + c for c in columns]]
 
-    # Create column labels
-    column_labels = ["timestamp"] + header["chids"]
-
-    # Create a Polars DataFrame
-    df = pl.DataFrame(data, schema=column_labels)
+    # Create a Polars DataFrame, all channels as Float64
+    data = {"TIMESTAMP": timestamps}
+    for i, chid in enumerate(chids):
+        data[chid] = values[:, i]
+    df = pl.DataFrame(data)
 
     # Rename columns in the DataFrame
-    df = df.rename({
-        "timestamp": "TIMESTAMP",
-        "ws_ch": "WS_Avg",
-        "wd_ch": "WD_Avg"
-    })
-
-    # Explicitly cast columns to the correct types
-    df = df.with_columns(
-        # Cast TIMESTAMP to Datetime
-        pl.col("TIMESTAMP").str.strptime(pl.Datetime, format="%Y-%m-%d %H:%M:%S").alias("TIMESTAMP"),
-        
-        # Cast WS_Avg and WD_Avg to Float64
-        pl.col("WS_Avg").cast(pl.Float64).alias("WS_Avg"),
-        pl.col("WD_Avg").cast(pl.Float64).alias("WD_Avg")
-    )
-
-    return df
\ No newline at end of file
+    df = df.rename({chid: name for chid, name in (("ws_ch", "WS_Avg"), ("wd_ch", "WD_Avg")) if chid in df.columns})
+
+    return df
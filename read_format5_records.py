@@ -0,0 +1,186 @@
+import numpy as np
+from bisect import bisect_right
+
+# Byte positions of the month, day, hour, minute and second digits in a data line
+TIME_POSITIONS = (0, 3, 6, 9, 12)
+TIME_WIDTH = 14  # The comma-separated timestamp takes the first 14 bytes of a data line
+COMMA_POSITIONS = (2, 5, 8, 11)  # Byte positions of the commas in the timestamp
+
+
+def map_format5_records(path_file, header):
+    """
+    Memory-maps the data region of a format5 file as an array of fixed-length
+    byte-string records, one per data line, so that rows can be sliced without
+    reading the whole file.
+
+    Returns an empty array if the file has no complete data lines.
+    """
+    if header["data_rows"] <= 0:
+        return np.zeros(0, dtype=f"S{header['dataline_size']}")
+
+    return np.memmap(path_file, dtype=f"S{header['dataline_size']}", mode="r",
+                     offset=header["comment_size"] + header["header_size"],
+                     shape=(header["data_rows"],))
+
+
+def _record_bytes(records):
+    """
+    Returns a (records, dataline_size) uint8 view of the records, without copying.
+    """
+    return np.ndarray((len(records), records.dtype.itemsize), dtype=np.uint8,
+                      buffer=records, offset=0, strides=(records.strides[0], 1))
+
+
+def format5_record_times(records, year):
+    """
+    Returns the datetime64[s] timestamps of format5 records, built from the
+    timestamp digits without going through strings. The year is not held in the
+    data lines, so it comes from the file name (see read_format5_header).
+    """
+    raw = _record_bytes(records)
+    digits = np.stack([raw[:, p:p + 2] for p in TIME_POSITIONS]).astype(np.int64) - ord("0")
+    month, day, hour, minute, second = 10 * digits[:, :, 0] + digits[:, :, 1]
+
+    months = np.datetime64(year - 1970, "Y").astype("datetime64[M]") + (month - 1)
+    days = months.astype("datetime64[D]") + (day - 1)
+    return days.astype("datetime64[s]") + (hour * 3600 + minute * 60 + second)
+
+
+class _RecordTimes:
+    """
+    Sequence view of the record timestamps that converts only the records a
+    binary search looks at.
+    """
+    def __init__(self, records, year):
+        self.records = records
+        self.year = year
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, i):
+        return format5_record_times(self.records[i:i + 1], self.year)[0]
+
+
+def format5_time_slice(records, year, start=None, end=None):
+    """
+    Returns the slice of the records with start < timestamp <= end, either bound
+    being optional. Data lines are in time order, so this is a binary search that
+    only reads a few records.
+    """
+    times = _RecordTimes(records, year)
+    first = 0 if start is None else bisect_right(times, np.datetime64(start, "s"))
+    last = len(records) if end is None else bisect_right(times, np.datetime64(end, "s"))
+    return slice(first, max(first, last))
+
+
+def is_fixed_length(records):
+    """
+    Checks that every record ends in a newline and has the timestamp commas in
+    place, i.e. that the data lines really are all dataline_size bytes long. A
+    single short line shifts every record after it, so check all the records of
+    a file, not just a slice of them.
+    """
+    raw = _record_bytes(records)
+    return bool(np.all(raw[:, -1] == ord("\n")) and np.all(raw[:, COMMA_POSITIONS] == ord(",")))
+
+
+def format5_field_spans(records):
+    """
+    Returns the (start, end) byte span of each channel field, taken from the first
+    record. A field runs from just after the previous value to the end of its own
+    value, so right-aligned values of varying width stay inside it.
+    """
+    raw = _record_bytes(records[:1])[0, TIME_WIDTH:]
+    filled = raw > ord(" ")
+    ends = np.flatnonzero(filled & ~np.concatenate((filled[1:], [False]))) + 1
+    field_starts = np.concatenate(([0], ends[:-1]))
+    return [(TIME_WIDTH + s, TIME_WIDTH + e) for s, e in zip(field_starts, ends)]
+
+
+def _parse_field(records, span):
+    """
+    Parses one fixed-position field of every record, or returns None if the field
+    does not hold exactly one whole value in every record.
+    """
+    raw = _record_bytes(records)[:, span[0]:span[1]]
+    filled = raw > ord(" ")
+    value_starts = filled & ~np.concatenate((np.zeros((len(records), 1), dtype=bool), filled[:, :-1]), axis=1)
+    if not np.all(value_starts.sum(axis=1) == 1) or np.any(filled[:, 0]):
+        return None
+    if span[1] < records.dtype.itemsize and not np.all(_record_bytes(records)[:, span[1]] <= ord(" ")):
+        return None
+    return np.fromstring(raw.tobytes().decode("ascii"), dtype=float, sep=" ")
+
+
+def parse_format5_records(records, columns=None):
+    """
+    Parses the channel values of format5 records into a float array with one row
+    per record and one column per channel, in header["chids"] order.
+
+    If columns (channel indices) is given, only those channels are returned.
+    When the values sit at the same byte positions on every line, only the
+    requested channels are converted; otherwise all of them are parsed.
+    """
+    if len(records) == 0:
+        return np.zeros((0, 0 if columns is None else len(columns)))
+
+    if columns is not None:
+        spans = format5_field_spans(records)
+        if all(c < len(spans) for c in columns):
+            fields = [_parse_field(records, spans[c]) for c in columns]
+            if all(field is not None for field in fields):
+                return np.column_stack(fields) if fields else np.zeros((len(records), 0))
+
+    text = _record_bytes(records)[:, TIME_WIDTH:].tobytes().decode("ascii")
+    values = np.fromstring(text, dtype=float, sep=" ")
+    if values.size % len(records) != 0:
+        raise ValueError(f"Format5 records do not all hold the same number of values ({values.size} values in {len(records)} records)")
+
+    values = values.reshape(len(records), -1)
+    if columns is not None:
+        values = values[:, columns]
+    return values
+
+
+def read_format5_window(path_file, header, start=None, end=None, columns=None):
+    """
+    Reads the records of a format5 file with start < timestamp <= end.
+
+    Only the records inside the window are parsed. If the data lines
+    are not all dataline_size bytes long, the whole file is parsed line by line
+    instead (as read_format5_content does) and the window applied to it.
+    Returns (times, values): datetime64[s] timestamps and a float array with
+    the requested channels (see parse_format5_records).
+    """
+    year = int(path_file[-10:-8]) + 2000
+    records = map_format5_records(path_file, header)
+
+    # The binary search needs every record in place, not only those in the window
+    if not is_fixed_length(records):
+        return _read_format5_window_by_lines(path_file, header, year, start, end, columns)
+
+    records = records[format5_time_slice(records, year, start, end)]
+    return format5_record_times(records, year), parse_format5_records(records, columns)
+
+
+def _read_format5_window_by_lines(path_file, header, year, start, end, columns):
+    """
+    Reads the records with start < timestamp <= end from a file whose data lines
+    vary in length, parsing all of its lines.
+    """
+    import read_format5_content  # Imported here as it imports this module
+
+    content = read_format5_content.read_format5_block(path_file, header)
+    times = read_format5_content.format5_timestamps(year, content[:, :read_format5_content.TIME_COLUMNS]).astype("datetime64[s]")
+    values = content[:, read_format5_content.TIME_COLUMNS:]
+
+    in_window = np.ones(len(times), dtype=bool)
+    if start is not None:
+        in_window &= times > np.datetime64(start, "s")
+    if end is not None:
+        in_window &= times <= np.datetime64(end, "s")
+    values = values[in_window]
+    if columns is not None:
+        values = values[:, columns]
+    return times[in_window], values
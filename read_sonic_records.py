@@ -0,0 +1,102 @@
+import numpy as np
+
+# Byte spans of the hour, minute, whole second and second (with fraction) in a data line
+HOUR_SPAN = (9, 11)
+MINUTE_SPAN = (12, 14)
+WHOLE_SECOND_SPAN = (15, 17)
+SECOND_SPAN = (15, 21)
+# Byte spans of the northward, eastward and upward wind and the temperature (degC)
+VALUE_SPANS = ((24, 32), (35, 43), (46, 54), (57, 65))
+MIN_DATA_LENGTH = 66  # Lines (with their newline) no longer than this hold no values
+KELVIN = 273.15
+
+
+def sonic_line_spans(raw):
+    """
+    Returns (starts, content_lengths, lengths) of the lines in the bytes of a
+    file: the offset of each line, its length without the line ending and its
+    length as text-mode reading gives it, i.e. with one newline character and no
+    carriage return.
+    """
+    newlines = np.flatnonzero(raw == ord("\n"))
+    ends = newlines
+    if len(raw) > 0 and raw[-1] != ord("\n"):
+        ends = np.append(newlines, len(raw))  # Last line without a newline
+    starts = np.concatenate(([0], ends[:-1] + 1))[:len(ends)].astype(np.int64)
+    has_newline = ends < len(raw)
+
+    content_ends = ends.copy()
+    carriage_return = has_newline & (ends > starts)
+    carriage_return[carriage_return] = raw[ends[carriage_return] - 1] == ord("\r")
+    content_ends[carriage_return] -= 1
+    content_lengths = content_ends - starts
+    return starts, content_lengths, content_lengths + has_newline
+
+
+def _field_bytes(raw, starts, span):
+    """
+    Returns a (lines, width) uint8 array of the bytes in a fixed span of each line.
+    """
+    return raw[starts[:, None] + np.arange(span[0], span[1])]
+
+
+def _parse_fields(raw, starts, spans):
+    """
+    Parses fixed-span fields, each holding one number, of many lines at once.
+    Returns a (lines, fields) float array.
+    """
+    if len(starts) == 0:
+        return np.zeros((0, len(spans)))
+    separator = np.full((len(starts), 1), ord(" "), dtype=np.uint8)
+    fields = []
+    for span in spans:
+        fields.extend((_field_bytes(raw, starts, span), separator))
+    text = np.hstack(fields).tobytes().decode("ascii")
+    values = np.fromstring(text, dtype=float, sep=" ")
+    if values.size != len(starts) * len(spans):
+        raise ValueError(f"Sonic fields at {spans} do not all hold one number")
+    return values.reshape(len(starts), len(spans))
+
+
+def read_sonic_file(path_file, nday, nday_file, missing_value):
+    """
+    Reads the records of an hourly Metek USA-1 file (usa_YYYYMMDDHH.dat) that
+    belong to day nday, i.e. nday < time <= nday + 1 to the whole second, the
+    file's records all being on day nday_file. The file is parsed in bulk from
+    its bytes.
+
+    Returns:
+        tuple: (timesecs, vals, input_missing): seconds since midnight of nday
+        (86400 for the following midnight); northward, eastward and upward wind
+        and temperature (K), missing_value where not given; and an int8 array
+        set to 1 for records with any of the four values blank.
+    """
+    raw = np.fromfile(path_file, dtype=np.uint8)
+    starts, content_lengths, lengths = sonic_line_spans(raw)
+
+    # Lines too short to hold a timestamp are left out
+    timed = content_lengths >= SECOND_SPAN[1]
+    starts, lengths = starts[timed], lengths[timed]
+
+    hour, minute, whole_second, second = _parse_fields(raw, starts, [HOUR_SPAN, MINUTE_SPAN, WHOLE_SECOND_SPAN, SECOND_SPAN]).T
+    day_secs = 86400 * (int(nday_file) - int(nday)) + 3600 * hour + 60 * minute + whole_second
+    in_day = (day_secs > 0) & (day_secs <= 86400)
+    starts, lengths = starts[in_day], lengths[in_day]
+
+    timesecs = 3600.0 * hour[in_day] + 60.0 * minute[in_day] + second[in_day]
+    timesecs[day_secs[in_day] == 86400] += 86400.0  #The first timestamp from the next day would otherwise be zero
+
+    n = len(starts)
+    vals = missing_value * np.ones((n, len(VALUE_SPANS)))
+    input_missing = np.zeros((n, len(VALUE_SPANS)), dtype=np.int8)
+
+    long_enough = lengths > MIN_DATA_LENGTH
+    blank = np.zeros(n, dtype=bool)
+    for span in VALUE_SPANS:
+        blank[long_enough] |= np.all(_field_bytes(raw, starts[long_enough], span) == ord(" "), axis=1)
+    input_missing[long_enough & blank, :] = 1
+
+    given = long_enough & ~blank
+    vals[given] = _parse_fields(raw, starts[given], VALUE_SPANS)
+    vals[given, 3] += KELVIN
+    return timesecs, vals, input_missing
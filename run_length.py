@@ -0,0 +1,98 @@
+"""
+# Run-length operations on boolean masks, used by the purge and recovery detectors
+
+Runs are held as two integer arrays, starts and ends, with ends exclusive, so
+run k covers mask[starts[k]:ends[k]].
+"""
+
+import numpy as np
+
+CHUNK_SIZE = 65536  # Windows per chunk of cumulative sums in rolling_std
+
+
+def true_runs(mask):
+    """
+    Finds the contiguous runs of True in a boolean mask.
+
+    Returns:
+        (starts, ends): int64 arrays, ends exclusive.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    edges = np.diff(np.concatenate(([0], mask.view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return starts, ends
+
+
+def expand_runs(starts, ends, before, after, n):
+    """
+    Extends each run by before samples at the start and after samples at the
+    end, clipped to [0, n].
+    """
+    return np.clip(starts - before, 0, n), np.clip(ends + after, 0, n)
+
+
+def long_runs(starts, ends, min_samples):
+    """
+    Keeps only the runs lasting at least min_samples.
+    """
+    keep = (ends - starts) >= min_samples
+    return starts[keep], ends[keep]
+
+
+def runs_to_mask(starts, ends, n):
+    """
+    Builds a boolean mask of length n that is True inside the runs. Runs may overlap.
+    """
+    counts = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(counts, starts, 1)
+    np.add.at(counts, ends, -1)
+    return np.cumsum(counts[:-1]) > 0
+
+
+def _window_std(values, window):
+    """
+    Standard deviation (ddof=0) of every full window values[k:k + window], NaN
+    where the window holds a NaN.
+    """
+    nans = np.isnan(values)
+    if nans.all():
+        return np.full(len(values) - window + 1, np.nan)
+    shifted = np.where(nans, 0.0, values - values[~nans].mean())
+
+    c1 = np.concatenate(([0.0], np.cumsum(shifted)))
+    c2 = np.concatenate(([0.0], np.cumsum(shifted * shifted)))
+    cn = np.concatenate(([0], np.cumsum(nans)))
+
+    s1 = c1[window:] - c1[:-window]
+    s2 = c2[window:] - c2[:-window]
+    mean = s1 / window
+    std = np.sqrt(np.maximum(s2 / window - mean * mean, 0.0))
+    std[(cn[window:] - cn[:-window]) > 0] = np.nan
+    return std
+
+
+def rolling_std(values, window, chunk_size=CHUNK_SIZE):
+    """
+    Centred rolling standard deviation (ddof=0) in O(n) from cumulative sums.
+
+    Matches xarray's rolling(time=window, center=True).std(): the window for
+    sample i is values[i - window//2 : i - window//2 + window], and the result is
+    NaN where the window runs off either end or holds a NaN.
+
+    The sums are taken over chunks of chunk_size windows, each shifted by its own
+    mean, so the sums of squares stay small and the variance keeps its precision
+    however long the series is (e.g. several years concatenated).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    std = np.full(n, np.nan)
+    if window < 1 or window > n:
+        return std
+
+    n_windows = n - window + 1
+    offset = window // 2
+    for first in range(0, n_windows, chunk_size):
+        last = min(first + chunk_size, n_windows)
+        std[offset + first:offset + last] = _window_std(values[first:last + window - 1], window)
+    return std
@@ -0,0 +1,123 @@
+"""
+Regression test: the vectorised detect_rh_dips returns the same (start, end)
+pairs as the original loop.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from flag_purge_times import detect_flat, detect_rh_dips
+
+
+def legacy_detect_rh_dips(rh_data, time_data, drop_thresh=3.0, recovery_time=360, flat_window=5, flat_threshold=0.1):
+    """
+    The loop detect_rh_dips was vectorised from, kept as the reference.
+    """
+    rh = rh_data.values
+    time = pd.to_datetime(time_data.values)
+    dips = []
+
+    # Detect flat regions with a less strict criterion
+    flat_mask = detect_flat(rh_data, flat_window, flat_threshold).values
+
+    for i in range(3, len(rh) - 10):
+        # Check if there is a preceding flat region
+        if not np.any(flat_mask[max(0, i - flat_window):i]):
+            continue
+
+        # Detect RH dip
+        max_before = max(rh[i - 3:i])
+        delta_down = max_before - rh[i]
+        if delta_down >= drop_thresh:
+            for j in range(i + 1, min(i + 20, len(rh))):
+                delta_up = rh[j] - rh[i]
+                t_elapsed = (time[j] - time[i]).total_seconds()
+                if delta_up >= delta_down and t_elapsed <= recovery_time:
+                    dips.append((i, j))  # Dip starts at i, not earlier
+                    break
+
+    return dips
+
+
+def as_dataarrays(rh, seconds):
+    times = np.datetime64("2024-06-01T00:00:00", "ns") + (np.asarray(seconds) * 1e9).astype("timedelta64[ns]")
+    time = xr.DataArray(times, dims="time")
+    return xr.DataArray(np.asarray(rh, dtype=np.float64), dims="time", coords={"time": times}), time
+
+
+def check_same(rh, seconds, **kwargs):
+    rh_data, time_data = as_dataarrays(rh, seconds)
+    expected = legacy_detect_rh_dips(rh_data, time_data, **kwargs)
+    assert detect_rh_dips(rh_data, time_data, **kwargs) == expected
+    return expected
+
+
+def purge_like_series(rng, n, n_dips, noise=0.02):
+    """
+    RH with flat stretches and sharp dips that recover after a few samples.
+    """
+    rh = 80 + np.cumsum(rng.normal(0, 0.3, n))
+    flat = rng.random(n) < 0.5
+    rh[flat] = np.round(rh[flat])  # Flat stretches
+    rh += rng.normal(0, noise, n)
+    for i in rng.integers(0, n, n_dips):
+        depth = rng.uniform(1, 10)
+        width = rng.integers(1, 15)
+        rh[i:i + width] -= depth
+    return rh
+
+
+def test_fixed_series():
+    rh = np.full(60, 90.0)
+    rh[20:24] = [84.0, 83.0, 85.0, 89.0]
+    rh[40] = 86.5
+    rh[41:] = 91.0
+    dips = check_same(rh, np.arange(60) * 10.0)
+    assert dips  # The series is built to hold dips
+
+
+def test_dips_at_edges():
+    n = 40
+    rh = np.full(n, 90.0)
+    rh[3] = 80.0   # First candidate sample
+    rh[4:6] = 95.0
+    rh[n - 11:n - 1] = 80.0  # Last candidate sample, recovering only at the last sample
+    rh[n - 1] = 99.0
+    dips = check_same(rh, np.arange(n) * 10.0, flat_window=3)
+    assert dips[0] == (3, 4) and dips[-1] == (n - 11, n - 1)
+
+
+@pytest.mark.parametrize("n", [0, 5, 13, 14, 15])
+def test_short_series(n):
+    check_same(np.full(n, 90.0), np.arange(n) * 10.0)
+
+
+def test_nans():
+    rng = np.random.default_rng(1)
+    rh = purge_like_series(rng, 2000, 80)
+    rh[rng.integers(0, 2000, 100)] = np.nan
+    rh[100:110] = np.nan
+    rh[0] = np.nan
+    rh[-1] = np.nan
+    check_same(rh, np.arange(2000) * 10.0)
+
+
+def test_uneven_time_steps():
+    rng = np.random.default_rng(2)
+    n = 3000
+    seconds = np.cumsum(rng.choice([1.0, 5.0, 10.0, 60.0, 400.0], n, p=[0.3, 0.3, 0.3, 0.08, 0.02]))
+    check_same(purge_like_series(rng, n, 120), seconds, recovery_time=120)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_series(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(20, 3000))
+    rh = purge_like_series(rng, n, int(rng.integers(0, 100)), noise=rng.choice([0.0, 0.02, 0.2]))
+    if rng.random() < 0.3:
+        rh[rng.integers(0, n, n // 50 + 1)] = np.nan
+    kwargs = {"drop_thresh": rng.uniform(1, 5), "recovery_time": int(rng.integers(30, 600)),
+              "flat_window": int(rng.integers(2, 10)), "flat_threshold": rng.uniform(0.01, 0.3)}
+    check_same(rh, np.arange(n) * rng.choice([1.0, 10.0, 60.0]), **kwargs)
@@ -0,0 +1,64 @@
+"""
+read_format5_window returns the same records as parsing the file line by line,
+including when a short line shifts the fixed-length records after it.
+"""
+
+import numpy as np
+import pytest
+
+from read_format5_header import read_format5_header
+from read_format5_records import read_format5_window
+
+N_CHANNELS = 3
+START = np.datetime64("2024-02-28T13:00:00")
+END = START + np.timedelta64(550, "s")
+
+
+def write_format5(path, short_row=None):
+    """
+    Writes a day of 10 s format5 data lines from 12:00 on 28 Feb 2024, one of
+    them (short_row) with a value written narrower than the rest.
+    """
+    lines = ["# comment\n", "* descriptor test\n",
+             "* chids " + " ".join(f"c{i}_ch" for i in range(N_CHANNELS)) + "\n",
+             "* chstat " + " ".join("1" * N_CHANNELS) + "\n",
+             "* sample_interval 10\n"]
+    times = np.datetime64("2024-02-28T12:00:00") + np.arange(8640) * np.timedelta64(10, "s")
+    rng = np.random.default_rng(1)
+    values = rng.uniform(0, 900, (len(times), N_CHANNELS)).round(4)
+    for row, (t, v) in enumerate(zip(times.astype(object), values)):
+        fields = "".join(f" {x:10.4f}" for x in v)
+        if row == short_row:
+            fields = "".join(f" {x:.4f}" for x in v)
+        lines.append(t.strftime("%m,%d,%H,%M,%S") + fields + "\n")
+    path.write_text("".join(lines))
+    return times, values
+
+
+def expected_window(times, values):
+    in_window = (times > START) & (times <= END)
+    return times[in_window], values[in_window]
+
+
+@pytest.mark.parametrize("short_row", [None, 10, 8000])
+def test_window_matches_lines(tmp_path, short_row):
+    path = tmp_path / "test240228.000"
+    times, values = write_format5(path, short_row)
+    header = read_format5_header(str(path))
+
+    got_times, got_values = read_format5_window(str(path), header, START, END)
+    want_times, want_values = expected_window(times, values)
+    assert len(want_times) == 55
+    np.testing.assert_array_equal(got_times, want_times)
+    np.testing.assert_array_equal(got_values, want_values)
+
+
+def test_window_columns_after_short_line(tmp_path):
+    path = tmp_path / "test240228.000"
+    times, values = write_format5(path, short_row=10)
+    header = read_format5_header(str(path))
+
+    got_times, got_values = read_format5_window(str(path), header, START, END, columns=[2, 0])
+    want_times, want_values = expected_window(times, values)
+    np.testing.assert_array_equal(got_times, want_times)
+    np.testing.assert_array_equal(got_values, want_values[:, [2, 0]])